@@ -9,19 +9,20 @@ import pylons
 from paste.deploy.converters import asbool
 import sqlalchemy
 from pylons import config
-from genshi.template import TemplateLoader
-from genshi.filters.i18n import Translator
 
 import ckan.config.routing as routing
 import ckan.model as model
+import ckan.model.license as license
 import ckan.plugins as p
-import ckan.lib.helpers as h
 import ckan.lib.app_globals as app_globals
+import ckan.lib.engines as engines
 import ckan.lib.render as render
+import ckan.lib.fragment_cache as fragment_cache
+import ckan.lib.instrumentation as instrumentation
 import ckan.lib.search as search
+import ckan.lib.startup as startup
 import ckan.logic as logic
 import ckan.new_authz as new_authz
-import ckan.lib.jinja_extensions as jinja_extensions
 
 from ckan.common import _, ungettext
 
@@ -99,10 +100,20 @@ class _Helpers(object):
             return self.null_function
 
 
-def load_environment(global_conf, app_conf):
+# whether update_config() sets up the template helpers and environments
+_templates = True
+
+
+def load_environment(global_conf, app_conf, templates=True):
     """Configure the Pylons environment via the ``pylons.config``
     object.  This code should only need to be run once.
+
+    Commands that don't render pages pass ``templates=False`` to skip
+    importing the template helpers and setting up the Genshi and Jinja2
+    environments.
     """
+    global _templates
+    _templates = templates
 
     ######  Pylons monkey-patch
     # this must be run at a time when the env is semi-setup, thus inlined here.
@@ -236,10 +247,11 @@ def update_config():
     ''' This code needs to be run when the config is changed to take those
     changes into account. '''
 
-    for plugin in p.PluginImplementations(p.IConfigurer):
-        # must do update in place as this does not work:
-        # config = plugin.update_config(config)
-        plugin.update_config(config)
+    with startup.phase('IConfigurer plugins'):
+        for plugin in p.PluginImplementations(p.IConfigurer):
+            # must do update in place as this does not work:
+            # config = plugin.update_config(config)
+            plugin.update_config(config)
 
     root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     # This is set up before globals are initialized
@@ -267,9 +279,21 @@ def update_config():
     search.SolrSettings.init(config.get('solr_url'),
                              config.get('solr_user'),
                              config.get('solr_password'))
-    search.check_solr_schema_version()
+    if startup.fast_start():
+        startup.in_background('solr schema check',
+                              search.check_solr_schema_version)
+    else:
+        with startup.phase('solr schema check'):
+            search.check_solr_schema_version()
+
+    # forget the licenses in case licenses_group_url has changed, and fetch
+    # a remote license list now rather than on the first request
+    license.reset_license_register()
+    if startup.fast_start() and config.get('licenses_group_url'):
+        startup.in_background('licenses', model.Package.get_license_register)
 
-    routes_map = routing.make_map()
+    with startup.phase('routes'):
+        routes_map = routing.make_map()
     config['routes.map'] = routes_map
     # The RoutesMiddleware needs its mapper updating if it exists
     if 'routes.middleware' in config:
@@ -277,7 +301,76 @@ def update_config():
     config['routes.named_routes'] = routing.named_routes
     config['pylons.app_globals'] = app_globals.app_globals
     # initialise the globals
-    config['pylons.app_globals']._init()
+    with startup.phase('app globals'):
+        config['pylons.app_globals']._init()
+
+    if _templates:
+        with startup.phase('templates'):
+            _setup_templates(root)
+
+    # CONFIGURATION OPTIONS HERE (note: all config options will override
+    # any Pylons config options)
+
+    ckan_db = os.environ.get('CKAN_DB')
+    if ckan_db:
+        config['sqlalchemy.url'] = ckan_db
+
+    # for postgresql we want to enforce utf-8
+    sqlalchemy_url = config.get('sqlalchemy.url', '')
+    if sqlalchemy_url.startswith('postgresql://'):
+        extras = {'client_encoding': 'utf8'}
+    else:
+        extras = {}
+
+    engine = engines.engine_from_config(config, 'sqlalchemy.', **extras)
+
+    if not model.meta.engine:
+        model.init_model(engine)
+    instrumentation.instrument_engine(model.meta.engine)
+
+    with startup.phase('IConfigurable plugins'):
+        for plugin in p.PluginImplementations(p.IConfigurable):
+            plugin.configure(config)
+
+    # reset the template cache - we do this here so that when we load the
+    # environment it is clean
+    render.reset_template_info_cache()
+
+    # clear other caches
+    logic.clear_actions_cache()
+    new_authz.clear_auth_functions_cache()
+    instrumentation.reset()
+    fragment_cache.reset()
+
+    # Here we create the site user if they are not already in the database.
+    # In fast start mode get_site_user creates it when it is first needed.
+    if not startup.fast_start():
+        try:
+            with startup.phase('site user'):
+                logic.get_action('get_site_user')({'ignore_auth': True},
+                                                  None)
+        except (sqlalchemy.exc.ProgrammingError,
+                sqlalchemy.exc.OperationalError):
+            # (ProgrammingError for Postgres, OperationalError for SQLite)
+            # The database is not initialised.  This is a bit dirty.  This
+            # occurs when running tests.
+            pass
+        except sqlalchemy.exc.InternalError:
+            # The database is not initialised.  Travis hits this
+            pass
+    # if an extension or our code does not finish
+    # transaction properly db cli commands can fail
+    model.Session.remove()
+
+
+def _setup_templates(root):
+    '''Set up the template helpers and the Genshi and Jinja2 environments.'''
+    # imported here because they are slow to import and only needed for
+    # rendering pages
+    from genshi.template import TemplateLoader
+    from genshi.filters.i18n import Translator
+    import ckan.lib.helpers as h
+    import ckan.lib.jinja_extensions as jinja_extensions
 
     # add helper functions
     helpers = _Helpers(h)
@@ -319,9 +412,15 @@ def update_config():
     env = jinja_extensions.Environment(
         loader=jinja_extensions.CkanFileSystemLoader(template_paths),
         autoescape=True,
+        # only check whether templates have changed on disk when debugging
+        auto_reload=asbool(config.get('ckan.jinja2.auto_reload',
+                                      config.get('debug', False))),
+        cache_size=int(config.get('ckan.jinja2.cache_size', 400)),
+        bytecode_cache=jinja_extensions.get_bytecode_cache(config),
         extensions=['jinja2.ext.do', 'jinja2.ext.with_',
                     jinja_extensions.SnippetExtension,
                     jinja_extensions.CkanExtend,
+                    jinja_extensions.FragmentCacheExtension,
                     jinja_extensions.CkanInternationalizationExtension,
                     jinja_extensions.LinkForExtension,
                     jinja_extensions.ResourceExtension,
@@ -333,48 +432,3 @@ def update_config():
     env.filters['empty_and_escape'] = jinja_extensions.empty_and_escape
     env.filters['truncate'] = jinja_extensions.truncate
     config['pylons.app_globals'].jinja_env = env
-
-    # CONFIGURATION OPTIONS HERE (note: all config options will override
-    # any Pylons config options)
-
-    ckan_db = os.environ.get('CKAN_DB')
-    if ckan_db:
-        config['sqlalchemy.url'] = ckan_db
-
-    # for postgresql we want to enforce utf-8
-    sqlalchemy_url = config.get('sqlalchemy.url', '')
-    if sqlalchemy_url.startswith('postgresql://'):
-        extras = {'client_encoding': 'utf8'}
-    else:
-        extras = {}
-
-    engine = sqlalchemy.engine_from_config(config, 'sqlalchemy.', **extras)
-
-    if not model.meta.engine:
-        model.init_model(engine)
-
-    for plugin in p.PluginImplementations(p.IConfigurable):
-        plugin.configure(config)
-
-    # reset the template cache - we do this here so that when we load the
-    # environment it is clean
-    render.reset_template_info_cache()
-
-    # clear other caches
-    logic.clear_actions_cache()
-    new_authz.clear_auth_functions_cache()
-
-    # Here we create the site user if they are not already in the database
-    try:
-        logic.get_action('get_site_user')({'ignore_auth': True}, None)
-    except (sqlalchemy.exc.ProgrammingError, sqlalchemy.exc.OperationalError):
-        # (ProgrammingError for Postgres, OperationalError for SQLite)
-        # The database is not initialised.  This is a bit dirty.  This occurs
-        # when running tests.
-        pass
-    except sqlalchemy.exc.InternalError:
-        # The database is not initialised.  Travis hits this
-        pass
-    # if an extension or our code does not finish
-    # transaction properly db cli commands can fail
-    model.Session.remove()
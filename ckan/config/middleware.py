@@ -5,8 +5,8 @@ import logging
 import json
 import hashlib
 import os
+import time
 
-import sqlalchemy as sa
 from beaker.middleware import CacheMiddleware, SessionMiddleware
 from paste.cascade import Cascade
 from paste.registry import RegistryManager
@@ -24,7 +24,10 @@ from fanstatic import Fanstatic
 from ckan.plugins import PluginImplementations
 from ckan.plugins.interfaces import IMiddleware
 from ckan.lib.i18n import get_locales_from_config
+import ckan.lib.engines as engines
 import ckan.lib.uploader as uploader
+import ckan.lib.profiling as profiling
+import ckan.lib.startup as startup
 
 from ckan.config.environment import load_environment
 import ckan.lib.app_globals as app_globals
@@ -54,6 +57,9 @@ def make_app(conf, full_stack=True, static_files=True, **app_conf):
         defaults to main).
 
     """
+    start = time.time()
+    startup.reset()
+
     # Configure the Pylons environment
     load_environment(conf, app_conf)
 
@@ -77,6 +83,9 @@ def make_app(conf, full_stack=True, static_files=True, **app_conf):
     #app = QueueLogMiddleware(app)
 
     # Fanstatic
+    # the resource libraries are created when this module is imported, which
+    # must happen before fanstatic serves them, not on the first page render
+    import ckan.lib.fanstatic_resources
     if asbool(config.get('debug', False)):
         fanstatic_config = {
             'versioning': True,
@@ -190,6 +199,12 @@ def make_app(conf, full_stack=True, static_files=True, **app_conf):
     if asbool(config.get('ckan.tracking_enabled', 'false')):
         app = TrackingMiddleware(app, config)
 
+    # Profiling
+    if (float(config.get('ckan.profiling.sample_rate', 0)) or
+            float(config.get('ckan.profiling.slow_threshold', 0))):
+        app = profiling.ProfilingMiddleware(app, config)
+
+    startup.report((time.time() - start) * 1000)
     return app
 
 def ckan_auth_tkt_make_app(**kw):
@@ -349,7 +364,8 @@ class TrackingMiddleware(object):
 
     def __init__(self, app, config):
         self.app = app
-        self.engine = sa.create_engine(config.get('sqlalchemy.url'))
+        # shares the pool of connections to the CKAN database
+        self.engine = engines.engine_from_config(config, 'sqlalchemy.')
 
     def __call__(self, environ, start_response):
         path = environ['PATH_INFO']
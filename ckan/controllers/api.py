@@ -16,6 +16,7 @@ import ckan.lib.search as search
 import ckan.lib.navl.dictization_functions
 import ckan.lib.jsonp as jsonp
 import ckan.lib.munge as munge
+import ckan.lib.raw_json as raw_json
 
 from ckan.common import _, c, request, response
 
@@ -83,7 +84,7 @@ class ApiController(base.BaseController):
         if response_data is not None:
             response.headers['Content-Type'] = CONTENT_TYPES[content_type]
             if content_type == 'json':
-                response_msg = h.json.dumps(response_data)
+                response_msg = raw_json.dumps(response_data)
             else:
                 response_msg = response_data
             # Support "JSONP" callback.
@@ -58,54 +58,16 @@ class RevisionController(base.BaseController):
                 model.Revision.timestamp >= since_when).filter(
                     model.Revision.id != None)
             revision_query = revision_query.limit(maxresults)
-            for revision in revision_query:
+            revisions = revision_query.all()
+            # how each revision changed each dataset, in one query rather
+            # than by walking the revisions of every dataset
+            package_changes = model.revision_package_changes(
+                [revision.id for revision in revisions])
+            for revision in revisions:
                 package_indications = []
-                revision_changes = model.repo.list_changes(revision)
-                resource_revisions = revision_changes[model.Resource]
-                resource_group_revisions = \
-                    revision_changes[model.ResourceGroup]
-                package_extra_revisions = revision_changes[model.PackageExtra]
-                for package in revision.packages:
-                    if not package:
-                        # package is None sometimes - I don't know why,
-                        # but in the meantime while that is fixed,
-                        # avoid an exception here
-                        continue
+                for package, transition in package_changes[revision.id]:
                     if package.private:
                         continue
-                    number = len(package.all_revisions)
-                    package_revision = None
-                    count = 0
-                    for pr in package.all_revisions:
-                        count += 1
-                        if pr.revision.id == revision.id:
-                            package_revision = pr
-                            break
-                    if package_revision and package_revision.state == \
-                            model.State.DELETED:
-                        transition = 'deleted'
-                    elif package_revision and count == number:
-                        transition = 'created'
-                    else:
-                        transition = 'updated'
-                        for resource_revision in resource_revisions:
-                            if resource_revision.continuity.resource_group.\
-                                    package_id == package.id:
-                                transition += ':resources'
-                                break
-                        for resource_group_revision in \
-                                resource_group_revisions:
-                            if resource_group_revision.package_id == \
-                                    package.id:
-                                transition += ':resource_group'
-                                break
-                        for package_extra_revision in package_extra_revisions:
-                            if package_extra_revision.package_id == \
-                                    package.id:
-                                if package_extra_revision.key == \
-                                        'date_updated':
-                                    transition += ':date_updated'
-                                    break
                     indication = "%s:%s" % (package.name, transition)
                     package_indications.append(indication)
                 pkgs = u'[%s]' % ' '.join(package_indications)
@@ -0,0 +1,125 @@
+'''In-memory indexes used to answer autocomplete requests without scanning
+database tables on every keystroke.'''
+import bisect
+import copy
+import heapq
+import logging
+import threading
+import time
+
+from pylons import config
+from repoze.lru import ExpiringLRUCache
+import sqlalchemy
+
+log = logging.getLogger(__name__)
+
+
+class PrefixIndex(object):
+    '''A sorted list of names supporting case-insensitive prefix lookups,
+    with the matches ranked by a popularity count.
+
+    :param items: (name, count) pairs
+    :type items: iterable of tuples
+
+    '''
+    def __init__(self, items):
+        entries = sorted((name.lower(), name, count) for name, count in items)
+        self._keys = [key for key, name, count in entries]
+        self._entries = [(name, count) for key, name, count in entries]
+        self.created = time.time()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def search(self, prefix, limit=None):
+        '''Return the names starting with `prefix`, most popular first.'''
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, prefix + u'\uffff', start)
+        matches = self._entries[start:end]
+        # sort on name too so that equally popular names have a stable order
+        key = lambda entry: (-entry[1], entry[0])
+        if limit is None:
+            matches = sorted(matches, key=key)
+        else:
+            matches = heapq.nsmallest(limit, matches, key=key)
+        return [name for name, count in matches]
+
+
+_tag_indexes = {}
+_tag_indexes_lock = threading.Lock()
+
+
+def _build_tag_index(vocabulary_id):
+    # have to import here to avoid circular imports
+    import ckan.model as model
+    count = sqlalchemy.func.sum(sqlalchemy.case(
+        [(model.PackageTag.state == 'active', 1)], else_=0))
+    query = model.Session.query(model.Tag.name, count).outerjoin(
+        model.PackageTag, model.PackageTag.tag_id == model.Tag.id)
+    query = query.filter(model.Tag.vocabulary_id == vocabulary_id)
+    query = query.group_by(model.Tag.name)
+    if vocabulary_id is None:
+        # free tags are only offered once they are applied to a dataset
+        query = query.having(count > 0)
+    return PrefixIndex(query)
+
+
+def get_tag_index(vocabulary_id=None):
+    '''Return the PrefixIndex of the names of the tags in a vocabulary
+    (or of the free tags), ranked by the number of datasets using them.
+
+    Indexes are built on first use and rebuilt once they are older than
+    ``ckan.tag_autocomplete.index_ttl`` seconds or after tags have been
+    changed by this process (see ``clear_tag_indexes()``).
+
+    '''
+    ttl = int(config.get('ckan.tag_autocomplete.index_ttl', 300))
+    index = _tag_indexes.get(vocabulary_id)
+    if index is None or time.time() - index.created > ttl:
+        with _tag_indexes_lock:
+            index = _build_tag_index(vocabulary_id)
+            _tag_indexes[vocabulary_id] = index
+        log.debug('Built tag autocomplete index for vocabulary %r '
+                  '(%i tags)', vocabulary_id, len(index))
+    return index
+
+
+def clear_tag_indexes():
+    _tag_indexes.clear()
+
+
+_results_cache = None
+
+
+def _get_results_cache():
+    global _results_cache
+    if _results_cache is None:
+        _results_cache = ExpiringLRUCache(
+            int(config.get('ckan.autocomplete.cache_size', 1000)),
+            default_timeout=int(config.get('ckan.autocomplete.cache_ttl',
+                                           60)))
+    return _results_cache
+
+
+def get_cached_results(key, create):
+    '''Return the autocomplete results cached under `key`, calling
+    `create()` to compute (and cache) them if they aren't cached.
+
+    Results are kept in a bounded LRU cache of
+    ``ckan.autocomplete.cache_size`` entries for
+    ``ckan.autocomplete.cache_ttl`` seconds, or until this process changes a
+    dataset or resource (see ``clear_results_cache()``).
+
+    '''
+    cache = _get_results_cache()
+    results = cache.get(key)
+    if results is None:
+        results = create()
+        cache.put(key, results)
+    return copy.deepcopy(results)
+
+
+def clear_results_cache():
+    if _results_cache is not None:
+        _results_cache.clear()
@@ -26,6 +26,7 @@ import ckan.lib.app_globals as app_globals
 import ckan.plugins as p
 import ckan.model as model
 import ckan.lib.maintain as maintain
+import ckan.lib.profiling as profiling
 
 # These imports are for legacy usages and will be removed soon these should
 # be imported directly from ckan.common for internal ckan code and via the
@@ -219,6 +220,7 @@ def render(template_name, extra_vars=None, cache_key=None, cache_type=None,
     log.debug('Template cache-control: %s' % response.headers["Cache-Control"])
 
     # Render Time :)
+    start = time.time()
     try:
         return cached_template(template_name, render_template,
                                loader_class=loader_class)
@@ -228,6 +230,8 @@ def render(template_name, extra_vars=None, cache_key=None, cache_type=None,
             (template_name, e.message))
     except render_.TemplateNotFound:
         raise
+    finally:
+        profiling.record_template(template_name, time.time() - start)
 
 
 class ValidationException(Exception):
@@ -8,9 +8,6 @@ from pprint import pprint
 import re
 import ckan.logic as logic
 import ckan.model as model
-import ckan.include.rjsmin as rjsmin
-import ckan.include.rcssmin as rcssmin
-import ckan.lib.fanstatic_resources as fanstatic_resources
 import ckan.plugins as p
 import sqlalchemy as sa
 import urlparse
@@ -113,6 +110,10 @@ class CkanCommand(paste.script.command.Command):
         help="File to dump results to (if needed)")
     default_verbosity = 1
     group_name = 'ckan'
+    # commands that only need the database or the search index set this, to
+    # start without the template helpers and environments (and without
+    # importing every action to get the site user)
+    light_environment = False
 
     def _get_config(self):
         from paste.deploy import appconfig
@@ -131,7 +132,8 @@ class CkanCommand(paste.script.command.Command):
         # We have now loaded the config. Now we can import ckan for the
         # first time.
         from ckan.config.environment import load_environment
-        load_environment(conf.global_conf, conf.local_conf)
+        load_environment(conf.global_conf, conf.local_conf,
+                         templates=not self.light_environment)
 
         self.registry=Registry()
         self.registry.prepare()
@@ -147,8 +149,7 @@ class CkanCommand(paste.script.command.Command):
 
             self.registry.register(pylons.c, c)
 
-            self.site_user = logic.get_action('get_site_user')({'ignore_auth': True,
-                'defer_commit': True}, {})
+            self.site_user = self._get_site_user()
 
             pylons.c.user = self.site_user['name']
             pylons.c.userobj = model.User.get(self.site_user['name'])
@@ -160,6 +161,18 @@ class CkanCommand(paste.script.command.Command):
         request_config.host = parsed.netloc + parsed.path
         request_config.protocol = parsed.scheme
 
+    def _get_site_user(self):
+        if self.light_environment:
+            # get_site_user is the only action these commands need, so look
+            # the user up directly rather than importing all the actions
+            from pylons import config
+            user = model.User.get(config.get('ckan.site_id',
+                                             'ckan_site_user'))
+            if user:
+                return {'name': user.name, 'apikey': user.apikey}
+        return logic.get_action('get_site_user')({'ignore_auth': True,
+            'defer_commit': True}, {})
+
     def _setup_app(self):
         cmd = paste.script.appinstall.SetupCommand('setup-app')
         cmd.run([self.filename])
@@ -177,6 +190,13 @@ class ManageDb(CkanCommand):
     db dump-rdf DATASET_NAME FILE_PATH
     db simple-dump-csv FILE_PATH   - dump just datasets in CSV format
     db simple-dump-json FILE_PATH  - dump just datasets in JSON format
+    db export FILE_PATH            - export the public datasets as JSON lines,
+                                     or as CSV with --format csv, gzipped if
+                                     FILE_PATH ends with .gz. Takes:
+           --since TIMESTAMP       - only datasets modified since TIMESTAMP (UTC),
+                                     including the deleted ones
+           --processes N           - export with N processes in parallel
+           --batch-size N          - read N datasets at a time (default 100)
     db user-dump-csv FILE_PATH     - dump user information to a CSV file
     db send-rdf TALIS_STORE USERNAME PASSWORD
     db load FILE_PATH              - load a pg_dump from a file
@@ -190,6 +210,24 @@ class ManageDb(CkanCommand):
     max_args = None
     min_args = 1
 
+    def __init__(self, name):
+
+        super(ManageDb, self).__init__(name)
+
+        self.parser.add_option('--format', dest='format', default='jsonl',
+            help='Format of db export: jsonl or csv')
+        self.parser.add_option('--since', dest='since', default=None,
+            help='Only export the datasets modified since this timestamp')
+        # the parser is shared by all of the commands
+        if not self.parser.has_option('--processes'):
+            self.parser.add_option('--processes', dest='processes',
+                type='int', default=1,
+                help='Number of processes to run in parallel')
+        if not self.parser.has_option('--batch-size'):
+            self.parser.add_option('--batch-size', dest='batch_size',
+                type='int', default=100,
+                help='Number of records to handle at a time')
+
     def command(self):
         self._load_config()
         import ckan.model as model
@@ -232,6 +270,8 @@ class ManageDb(CkanCommand):
             self.simple_dump_csv()
         elif cmd == 'simple-dump-json':
             self.simple_dump_json()
+        elif cmd == 'export':
+            self.export()
         elif cmd == 'dump-rdf':
             self.dump_rdf()
         elif cmd == 'user-dump-csv':
@@ -339,6 +379,32 @@ class ManageDb(CkanCommand):
         dump_file = open(dump_filepath, 'w')
         dumper.SimpleDumper().dump(dump_file, format='json')
 
+    def export(self):
+        if len(self.args) < 2:
+            print 'Need export file path'
+            return
+        export_path = self.args[1]
+        import ckan.lib.dumper as dumper
+        import ckan.lib.helpers as h
+        since = None
+        if self.options.since:
+            try:
+                since = h.date_str_to_datetime(self.options.since)
+            except (TypeError, ValueError), e:
+                print 'Bad --since timestamp %r: %s' % (self.options.since, e)
+                return
+        try:
+            exporter = dumper.PackageExporter(
+                format=self.options.format, since=since,
+                batch_size=self.options.batch_size,
+                compress=export_path.endswith('.gz'))
+        except ValueError, e:
+            print e
+            return
+        count = exporter.export(export_path, processes=self.options.processes)
+        if self.verbose:
+            print 'Exported %i datasets to %s' % (count, export_path)
+
     def dump_rdf(self):
         if len(self.args) < 3:
             print 'Need dataset name and rdf file path'
@@ -439,6 +505,7 @@ class SearchIndexCommand(CkanCommand):
     usage = __doc__
     max_args = 2
     min_args = 0
+    light_environment = True
 
     def __init__(self,name):
 
@@ -665,6 +732,7 @@ class Sysadmin(CkanCommand):
     usage = __doc__
     max_args = 2
     min_args = 0
+    light_environment = True
 
     def command(self):
         self._load_config()
@@ -748,6 +816,8 @@ class UserCmd(CkanCommand):
       user setpass USERNAME           - set user password (prompts)
       user remove USERNAME            - removes user from users
       user search QUERY               - searches for a user name
+      user refresh-stats              - recalculates the number of edits and
+                                        administered datasets of every user
     '''
     summary = __doc__.split('\n')[0]
     usage = __doc__
@@ -772,6 +842,8 @@ class UserCmd(CkanCommand):
                 self.setpass()
             elif cmd == 'list':
                 self.list()
+            elif cmd == 'refresh-stats':
+                self.refresh_stats()
             else:
                 self.show()
 
@@ -789,6 +861,11 @@ class UserCmd(CkanCommand):
         for user in users:
             print self.get_user_str(user)
 
+    def refresh_stats(self):
+        import ckan.model as model
+        model.UserStats.refresh()
+        print 'User stats refreshed'
+
     def show(self):
         import ckan.model as model
 
@@ -1051,6 +1128,7 @@ class Ratings(CkanCommand):
     usage = __doc__
     max_args = 1
     min_args = 1
+    light_environment = True
 
     def command(self):
         self._load_config()
@@ -1102,6 +1180,7 @@ class Tracking(CkanCommand):
     usage = __doc__
     max_args = 3
     min_args = 1
+    light_environment = True
 
     def command(self):
         self._load_config()
@@ -1482,6 +1561,367 @@ class Profile(CkanCommand):
         print 'Written profile to: %s' % output_filename
 
 
+class ProfilingCommand(CkanCommand):
+    '''Show the profiles of live requests
+
+    Profiles are taken by the site itself when ckan.profiling.sample_rate or
+    ckan.profiling.slow_threshold is set in the config file.
+
+    Usage:
+      profiling list                  - list the stored profiles, most
+                                        recent first
+      profiling show ID [N]           - show a profile, with its N (default
+                                        30) most costly functions or stacks
+      profiling clear                 - delete all the stored profiles
+    '''
+    summary = __doc__.split('\n')[0]
+    usage = __doc__
+    max_args = 3
+    min_args = 1
+
+    def command(self):
+        self._load_config()
+        from pylons import config
+        import ckan.lib.profiling as profiling
+        self.store = profiling.get_store(config)
+
+        cmd = self.args[0]
+        if cmd == 'list':
+            self.list()
+        elif cmd == 'show':
+            if len(self.args) < 2:
+                print self.usage
+                return
+            limit = int(self.args[2]) if len(self.args) > 2 else 30
+            self.show(self.args[1], limit)
+        elif cmd == 'clear':
+            self.store.clear()
+            print 'Deleted all profiles from %s' % self.store.directory
+        else:
+            print 'Command %s not recognized' % cmd
+
+    def list(self):
+        profiles = self.store.list()
+        for profile in profiles:
+            print '%s  %-7s %8.0f ms  %4i SQL  %s %s' % (
+                profile['id'], profile['reason'], profile['time'],
+                profile['sql_count'], profile['method'], profile['url'])
+        print '%i profiles in %s' % (len(profiles), self.store.directory)
+
+    def show(self, profile_id, limit):
+        import pstats
+        profile = self.store.get(profile_id)
+        if profile is None:
+            print 'Profile %s not found' % profile_id
+            sys.exit(1)
+
+        print '%s %s' % (profile['method'], profile['url'])
+        print 'Status: %s' % profile['status']
+        print 'Time: %.0f ms (%s)' % (profile['time'], profile['reason'])
+        print 'SQL: %i statements, %.0f ms' % (profile['sql_count'],
+                                               profile['sql_time'])
+        print
+        print 'Templates:'
+        for template in profile['templates']:
+            print '  %8.1f ms  %s' % (template['time'], template['template'])
+        print
+        print 'Slowest SQL statements:'
+        statements = sorted(profile['sql'], key=lambda s: -s['time'])
+        for statement in statements[:limit]:
+            print '  %8.1f ms  %s' % (statement['time'],
+                                      ' '.join(statement['statement'].split()))
+        print
+
+        stats_path = self.store.stats_path(profile_id)
+        if stats_path:
+            print 'Functions (stats are in %s):' % stats_path
+            stats = pstats.Stats(stats_path)
+            stats.sort_stats('cumulative').print_stats(limit)
+        else:
+            print 'Most sampled stacks, innermost call last:'
+            for stack, count in profile['stacks'][:limit]:
+                print '  %i samples:' % count
+                for call in stack.split(';')[-10:]:
+                    print '    %s' % call
+
+
+class BenchmarkCommand(CkanCommand):
+    '''Time some of CKAN's hot code paths
+
+    Benchmarks that need data create it, so only run them against a scratch
+    database (e.g. the one in test-core.ini), never a production one.
+
+    Usage:
+      benchmark autocomplete [N]      - create N synthetic datasets (default
+                                        10000) and time the package, format
+                                        and tag autocomplete actions
+      benchmark imports [MODULE]      - show the slowest imports made when
+                                        importing MODULE (default
+                                        ckan.lib.helpers) in a new process
+      benchmark resources [N]         - time adding and updating resources
+                                        as a dataset grows to N resources
+                                        (default 2000)
+      benchmark startup               - time starting new processes that
+                                        load the CLI, the environment with
+                                        and without templates, and the app
+      benchmark templates             - time loading every template from
+                                        source and from a bytecode cache
+      benchmark validate [N]          - time validating a dataset with N
+                                        resources (default 100) against the
+                                        default dataset schema
+    '''
+    summary = __doc__.split('\n')[0]
+    usage = __doc__
+    max_args = 2
+    min_args = 1
+
+    WORDS = [u'air', u'budget', u'census', u'crime', u'economy', u'energy',
+             u'health', u'housing', u'schools', u'spending', u'transport',
+             u'water']
+    FORMATS = [u'CSV', u'JSON', u'XLS', u'PDF', u'XML', u'HTML', u'SHP']
+
+    STARTUP_SCRIPTS = [
+        ('import ckan.lib.cli', 'import ckan.lib.cli'),
+        ('environment without templates',
+         'from paste.deploy import appconfig\n'
+         'from ckan.config.environment import load_environment\n'
+         'conf = appconfig("config:%s")\n'
+         'load_environment(conf.global_conf, conf.local_conf, '
+         'templates=False)'),
+        ('environment with templates',
+         'from paste.deploy import appconfig\n'
+         'from ckan.config.environment import load_environment\n'
+         'conf = appconfig("config:%s")\n'
+         'load_environment(conf.global_conf, conf.local_conf)'),
+        ('web app',
+         'from paste.deploy import loadapp\n'
+         'loadapp("config:%s")'),
+    ]
+
+    def command(self):
+        cmd = self.args[0]
+        if cmd not in ('imports', 'startup'):
+            # those run in new processes, where nothing has been imported
+            self._load_config()
+        if cmd == 'autocomplete':
+            self.autocomplete()
+        elif cmd == 'imports':
+            self.imports()
+        elif cmd == 'resources':
+            self.resources()
+        elif cmd == 'startup':
+            self.startup()
+        elif cmd == 'templates':
+            self.templates()
+        elif cmd == 'validate':
+            self.validate()
+        else:
+            print 'Command %s not recognized' % cmd
+
+    def _get_count(self, default):
+        return int(self.args[1]) if len(self.args) > 1 else default
+
+    def _time(self, func, repeat=20):
+        '''Call func() `repeat` times and return the median time in ms.'''
+        import time
+        timings = []
+        for i in range(repeat):
+            start = time.time()
+            func()
+            timings.append((time.time() - start) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2]
+
+    def _report(self, name, timing):
+        print '%-40s %10.2f ms' % (name, timing)
+
+    def create_synthetic_datasets(self, count, batch_size=500):
+        '''Create `count` datasets, each with one resource and two tags.'''
+        import ckan.model as model
+        print 'Creating %i synthetic datasets...' % count
+        for start in range(0, count, batch_size):
+            rev = model.repo.new_revision()
+            rev.author = u'benchmark'
+            for i in range(start, min(start + batch_size, count)):
+                word = self.WORDS[i % len(self.WORDS)]
+                pkg = model.Package(name=u'benchmark-%s-%i' % (word, i),
+                                    title=u'%s statistics %i' % (
+                                        word.capitalize(), i))
+                model.Session.add(pkg)
+                pkg.add_resource(
+                    url=u'http://example.com/%i' % i,
+                    format=self.FORMATS[i % len(self.FORMATS)])
+                pkg.add_tag_by_name(word)
+                pkg.add_tag_by_name(u'%s-%i' % (word, i % 100))
+            model.repo.commit_and_remove()
+
+    def autocomplete(self):
+        import ckan.model as model
+        import ckan.logic as logic
+        import ckan.lib.autocomplete as autocomplete
+
+        self.create_synthetic_datasets(self._get_count(10000))
+        context = {'model': model, 'session': model.Session,
+                   'ignore_auth': True}
+        calls = [
+            ('package_autocomplete', {'q': u'hea', 'limit': 10}),
+            ('package_autocomplete', {'q': u'transport stat', 'limit': 10}),
+            ('format_autocomplete', {'q': u'cs', 'limit': 5}),
+            ('tag_autocomplete', {'q': u'hou', 'limit': 10}),
+        ]
+        for action, data_dict in calls:
+            func = lambda: logic.get_action(action)(dict(context),
+                                                    dict(data_dict))
+
+            def uncached():
+                autocomplete.clear_results_cache()
+                autocomplete.clear_tag_indexes()
+                func()
+            name = '%s %r' % (action, data_dict['q'])
+            self._report(name + ' (cold)', self._time(uncached))
+            self._report(name + ' (cached)', self._time(func))
+
+    def imports(self):
+        import subprocess
+        module = self.args[1] if len(self.args) > 1 else 'ckan.lib.helpers'
+        subprocess.check_call([sys.executable, '-m',
+                               'ckan.lib.import_profile', module, '40'])
+
+    def startup(self):
+        import subprocess
+        config_path = os.path.abspath(self.options.config)
+        for name, script in self.STARTUP_SCRIPTS:
+            if '%s' in script:
+                script = script % config_path
+            self._report(name, self._time(
+                lambda: subprocess.check_call([sys.executable, '-c', script]),
+                repeat=3))
+
+    def resources(self):
+        import ckan.model as model
+        import ckan.logic as logic
+
+        count = self._get_count(2000)
+        context = {'model': model, 'session': model.Session,
+                   'user': u'benchmark', 'ignore_auth': True}
+        dataset = logic.get_action('package_create')(
+            dict(context), {'name': u'benchmark-resources'})
+        pkg = model.Package.get(dataset['id'])
+
+        size = 0
+        for checkpoint in [0, 10, 100, 500, 1000, 2000, 5000, 10000]:
+            if checkpoint > count:
+                break
+            # grow the dataset without going through the actions
+            rev = model.repo.new_revision()
+            rev.author = u'benchmark'
+            for i in range(size, checkpoint):
+                pkg.add_resource(url=u'http://example.com/%i.csv' % i,
+                                 format=u'CSV')
+            model.repo.commit_and_remove()
+            pkg = model.Package.get(dataset['id'])
+            size = checkpoint
+
+            def create():
+                return logic.get_action('resource_create')(
+                    dict(context), {'package_id': dataset['id'],
+                                    'url': u'http://example.com/new.csv'})
+            resource = create()
+            self._report('resource_create (%i resources)' % size,
+                         self._time(create, repeat=5))
+            self._report('resource_update (%i resources)' % size,
+                         self._time(lambda: logic.get_action(
+                             'resource_update')(dict(context), {
+                                 'id': resource['id'],
+                                 'url': u'http://example.com/changed.csv'}),
+                             repeat=5))
+            size += 6
+
+    def templates(self):
+        import shutil
+        import tempfile
+        from jinja2 import bccache
+        from pylons import config
+        import ckan.lib.jinja_extensions as jinja_extensions
+
+        env = config['pylons.app_globals'].jinja_env
+        names = jinja_extensions.template_names(env.loader.searchpath)
+        print 'Loading %i templates' % len(names)
+
+        def load_all(env):
+            for name, filename in names:
+                env.get_template(name)
+
+        directory = tempfile.mkdtemp()
+        try:
+            # cache_size=0 so that every load goes to the loader
+            from_source = env.overlay(cache_size=0, bytecode_cache=None)
+            from_cache = env.overlay(
+                cache_size=0,
+                bytecode_cache=bccache.FileSystemBytecodeCache(directory))
+            load_all(from_cache)
+            self._report('all templates from source',
+                         self._time(lambda: load_all(from_source), repeat=3))
+            self._report('all templates from bytecode cache',
+                         self._time(lambda: load_all(from_cache), repeat=3))
+            # the templates that the front page needs
+            page = ['home/index.html', 'home/layout1.html', 'page.html',
+                    'base.html']
+            self._report('front page templates from source',
+                         self._time(lambda: [from_source.get_template(name)
+                                             for name in page]))
+            self._report('front page templates from bytecode cache',
+                         self._time(lambda: [from_cache.get_template(name)
+                                             for name in page]))
+        finally:
+            shutil.rmtree(directory)
+
+    def validate(self):
+        import ckan.model as model
+        import ckan.logic.schema as schema
+        import ckan.lib.navl.dictization_functions as df
+
+        count = self._get_count(100)
+        data_dict = {
+            'name': u'benchmark-validate',
+            'title': u'Validation benchmark',
+            'notes': u'A dataset to validate',
+            'tags': [{'name': u'tag-%i' % i} for i in range(10)],
+            'extras': [{'key': u'key-%i' % i, 'value': u'value'}
+                       for i in range(10)],
+            'resources': [{'url': u'http://example.com/%i.csv' % i,
+                           'format': u'CSV', 'name': u'Resource %i' % i}
+                          for i in range(count)],
+        }
+        context = {'model': model, 'session': model.Session}
+        package_schema = schema.default_create_package_schema()
+        flattened = df.flatten_dict(data_dict)
+        print 'Validating a dataset with %i resources' % count
+
+        def uncompiled():
+            # how the data was expanded before schemas were compiled
+            df.augment_data(flattened, package_schema)
+            full_schema = df.make_full_schema(flattened, package_schema)
+            for i in range(4):
+                sorted(full_schema, key=df.flattened_order_key)
+
+        def compiled():
+            compiled_schema = df.compile_schema(package_schema)
+            combinations = compiled_schema.get_all_key_combinations(
+                flattened)
+            full_schema = compiled_schema.make_full_schema(package_schema,
+                                                           combinations)
+            compiled_schema.augment_data(flattened, full_schema,
+                                         combinations)
+            for phase in ('before', 'main', 'extras', 'after'):
+                compiled_schema.run_order(combinations, phase)
+
+        self._report('schema expansion (uncompiled)', self._time(uncompiled))
+        self._report('schema expansion (compiled)', self._time(compiled))
+        self._report('validate', self._time(
+            lambda: df.validate(data_dict, package_schema, dict(context))))
+
+
 class CreateColorSchemeCommand(CkanCommand):
     '''Create or remove a color scheme.
 
@@ -1976,6 +2416,10 @@ class MinifyCommand(CkanCommand):
             # This is not a js or css file.
             return
 
+        import ckan.include.rjsmin as rjsmin
+        import ckan.include.rcssmin as rcssmin
+        import ckan.lib.fanstatic_resources as fanstatic_resources
+
         path_min = fanstatic_resources.min_path(path)
 
         source = open(path, 'r').read()
@@ -2112,6 +2556,122 @@ class FrontEndBuildCommand(CkanCommand):
         cmd.args = (root, ckanext)
         cmd.command()
 
+
+class TemplatesCommand(CkanCommand):
+    '''Compile the Jinja2 templates into the bytecode cache
+
+    Compiles the templates of CKAN and of the enabled plugins into the cache
+    set by ckan.jinja2.bytecode_cache, so that the first requests after a
+    deployment don't have to compile them. Run it after each deployment.
+
+    Usage:
+      templates compile               - compile all the templates
+    '''
+    summary = __doc__.split('\n')[0]
+    usage = __doc__
+    max_args = 1
+    min_args = 1
+
+    def command(self):
+        self._load_config()
+        cmd = self.args[0]
+        if cmd == 'compile':
+            self.compile()
+        else:
+            print 'Command %s not recognized' % cmd
+
+    def compile(self):
+        import time
+        import jinja2
+        from pylons import config
+        import ckan.lib.jinja_extensions as jinja_extensions
+
+        env = config['pylons.app_globals'].jinja_env
+        if env.bytecode_cache is None:
+            print 'ckan.jinja2.bytecode_cache is not set in the config file'
+            sys.exit(1)
+
+        start = time.time()
+        names = jinja_extensions.template_names(env.loader.searchpath)
+        errors = 0
+        for name, filename in names:
+            try:
+                env.get_template(name)
+            except jinja2.TemplateError, e:
+                print 'Could not compile %s: %s' % (filename, e)
+                errors += 1
+        print 'Compiled %i templates in %.1f s' % (len(names) - errors,
+                                                   time.time() - start)
+        if errors:
+            sys.exit(1)
+
+
+def _resources_without_views(formats, shard=0, shards=1):
+    '''Return a query of the ids and formats of the resources in `formats`
+    that have no views, or of one of `shards` shards of them.'''
+    query = model.Session.query(model.Resource.id, model.Resource.format) \
+        .outerjoin(model.ResourceView) \
+        .filter(model.ResourceView.id == None) \
+        .filter(sa.func.lower(model.Resource.format).in_(
+            [f.lower() for f in formats]))
+    if shards > 1:
+        # the first byte of the md5 of the id spreads the resources evenly
+        first_byte = sa.func.get_byte(
+            sa.func.decode(sa.func.md5(model.Resource.id), 'hex'), 0)
+        query = query.filter(first_byte % shards == shard)
+    return query
+
+
+def _create_views_shard(args):
+    '''Create the views `view` for a shard of the resources in `formats`
+    that have no views, `batch_size` resources at a time, and return how many
+    were created.
+
+    Each batch is committed once it is created, so if this is stopped it
+    carries on from the resources still without views when it is run again.
+
+    '''
+    view, formats, batch_size, shard, shards = args
+    user = logic.get_action('get_site_user')(
+        {'model': model, 'ignore_auth': True}, {})
+    create_many = logic.get_action('resource_view_create_many')
+    query = _resources_without_views(formats, shard, shards).order_by(
+        model.Resource.id)
+
+    count = 0
+    last_id = None
+    while True:
+        batch_query = query
+        if last_id is not None:
+            batch_query = batch_query.filter(model.Resource.id > last_id)
+        batch = batch_query.limit(batch_size).all()
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        # the description may name the format, so the views are created
+        # for the resources of each format together
+        by_format = {}
+        for resource_id, resource_format in batch:
+            by_format.setdefault(resource_format.upper(), []).append(
+                resource_id)
+        for resource_format, resource_ids in by_format.items():
+            context = {'model': model, 'session': model.Session,
+                       'user': user['name'], 'defer_commit': True}
+            data_dict = dict(view, resource_ids=resource_ids,
+                             description=view['description'].format(
+                                 format=resource_format))
+            count += len(create_many(context, data_dict))
+        model.repo.commit()
+
+        if shards > 1:
+            print 'Process %s of %s: %s %s views created' % (
+                shard + 1, shards, count, view['view_type'])
+        else:
+            print '%s %s views created' % (count, view['view_type'])
+    return count
+
+
 class ViewsCommand(CkanCommand):
     '''Manage resource views.
 
@@ -2121,6 +2681,15 @@ class ViewsCommand(CkanCommand):
         paster views create [type1] [type2] ... - Create views for specified types.
         paster views clean                      - Permanently delete views for all types no longer in the configuration file.
 
+    Takes:
+        --processes N           - create the views with N processes in parallel
+        --batch-size N          - create the views of N resources at a time
+                                  (default 100)
+
+    The views are committed a batch at a time, so if "paster views create"
+    is stopped, running it again carries on with the resources that still
+    have no views.
+
     Supported types are "pdf", "text", "webpage", "image" and "grid".  Make
     sure the relevant plugins are loaded for the following types, otherwise
     an error will be raised:
@@ -2133,6 +2702,20 @@ class ViewsCommand(CkanCommand):
     usage = __doc__
     min_args = 1
 
+    def __init__(self, name):
+
+        super(ViewsCommand, self).__init__(name)
+
+        # the parser is shared by all of the commands
+        if not self.parser.has_option('--processes'):
+            self.parser.add_option('--processes', dest='processes',
+                type='int', default=1,
+                help='Number of processes to run in parallel')
+        if not self.parser.has_option('--batch-size'):
+            self.parser.add_option('--batch-size', dest='batch_size',
+                type='int', default=100,
+                help='Number of records to handle at a time')
+
     def command(self):
         self._load_config()
         if not self.args:
@@ -2187,6 +2770,35 @@ class ViewsCommand(CkanCommand):
         model.Session.commit()
         print 'Deleted resource views.'
 
+    def _create_views(self, view, formats):
+        '''Create the views `view` for the resources in `formats` that have
+        no views, and return how many were created.
+
+        With ``--processes`` the resources are split into that many shards,
+        each given its views by a process of its own.
+
+        '''
+        total = _resources_without_views(formats).count()
+        print '%s resources need views' % total
+
+        processes = self.options.processes
+        batch_size = self.options.batch_size
+        if processes <= 1:
+            return _create_views_shard((view, formats, batch_size, 0, 1))
+
+        # the processes mustn't share the connections of this one
+        model.Session.remove()
+        model.meta.engine.dispose()
+        pool = mp.Pool(processes)
+        try:
+            counts = pool.map(_create_views_shard, [
+                (view, formats, batch_size, shard, processes)
+                for shard in range(processes)])
+        finally:
+            pool.close()
+            pool.join()
+        return sum(counts)
+
     def create_text_views(self):
         if not p.plugin_loaded('text_view'):
             print 'Please enable the text_view plugin to make the text views.'
@@ -2203,45 +2815,21 @@ class ViewsCommand(CkanCommand):
         formats = tuple(textplugin.DEFAULT_TEXT_FORMATS + textplugin.DEFAULT_XML_FORMATS +
                         textplugin.DEFAULT_JSON_FORMATS + textplugin.DEFAULT_JSONP_FORMATS)
 
-        resources = model.Resource.get_all_without_views(formats)
-
-        user = logic.get_action('get_site_user')({'model': model, 'ignore_auth': True}, {})
-        context = {'model': model, 'session': model.Session, 'user': user['name']}
-
-        count = 0
-        for resource in resources:
-            count += 1
-            resource_view = {'title': 'Text View',
-                             'description': 'View of the {format} file'.format(
-                              format=resource.format.upper()),
-                             'resource_id': resource.id,
-                             'view_type': 'text'}
-
-            logic.get_action('resource_view_create')(context, resource_view)
+        count = self._create_views({'title': 'Text View',
+                                    'description': 'View of the {format} file',
+                                    'view_type': 'text'}, formats)
 
         print '%s text resource views created!' % count
 
-
     def create_image_views(self):
         import ckanext.imageview.plugin as imagevewplugin
         formats = tuple(imagevewplugin.DEFAULT_IMAGE_FORMATS)
 
         print 'Image resource views are being created'
 
-        resources = model.Resource.get_all_without_views(formats)
-
-        user = logic.get_action('get_site_user')({'model': model, 'ignore_auth': True}, {})
-        context = {'model': model, 'session': model.Session, 'user': user['name']}
-
-        count = 0
-        for resource in resources:
-            count += 1
-            resource_view = {'title': 'Resource Image',
-                             'description': 'View of the Image',
-                             'resource_id': resource.id,
-                             'view_type': 'image'}
-
-            logic.get_action('resource_view_create')(context, resource_view)
+        count = self._create_views({'title': 'Resource Image',
+                                    'description': 'View of the Image',
+                                    'view_type': 'image'}, formats)
 
         print '%s image resource views created!' % count
 
@@ -2250,20 +2838,9 @@ class ViewsCommand(CkanCommand):
 
         print 'Web page resource views are being created'
 
-        resources = model.Resource.get_all_without_views(formats)
-
-        user = logic.get_action('get_site_user')({'model': model, 'ignore_auth': True}, {})
-        context = {'model': model, 'session': model.Session, 'user': user['name']}
-
-        count = 0
-        for resource in resources:
-            count += 1
-            resource_view = {'title': 'Web Page View',
-                             'description': 'View of the webpage',
-                             'resource_id': resource.id,
-                             'view_type': 'webpage'}
-
-            logic.get_action('resource_view_create')(context, resource_view)
+        count = self._create_views({'title': 'Web Page View',
+                                    'description': 'View of the webpage',
+                                    'view_type': 'webpage'}, formats)
 
         print '%s webpage resource views created!' % count
 
@@ -2278,25 +2855,13 @@ class ViewsCommand(CkanCommand):
 
         print 'PDF resource views are being created'
 
-        resources = model.Resource.get_all_without_views(['pdf'])
-
-        user = logic.get_action('get_site_user')({'model': model, 'ignore_auth': True}, {})
-        context = {'model': model, 'session': model.Session, 'user': user['name']}
-
-        count = 0
-        for resource in resources:
-            count += 1
-            resource_view = {'title': 'PDF View',
-                             'description': 'PDF view of the resource.',
-                             'resource_id': resource.id,
-                             'view_type': 'pdf'}
-
-            logic.get_action('resource_view_create')(context, resource_view)
+        count = self._create_views({'title': 'PDF View',
+                                    'description': 'PDF view of the resource.',
+                                    'view_type': 'pdf'}, ['pdf'])
 
         print '%s pdf resource views created!' % count
 
     def create_grid_views(self):
-        import ckan.plugins.toolkit as toolkit
         import ckanext.datastore.db as db
         import pylons
 
@@ -2319,20 +2884,27 @@ class ViewsCommand(CkanCommand):
         resources_sql = sa.text(u'''SELECT name FROM "_table_metadata"
                                     WHERE alias_of is null''')
         results = db._get_engine(data_dict).execute(resources_sql)
+        names = [row[0] for row in results]
 
+        batch_size = self.options.batch_size
         count = 0
-        for row in results:
-            try:
-                res = logic.get_action('resource_view_list')(context, {'id': row[0]})
-            except toolkit.ObjectNotFound:
-                continue
-            if res:
+        for i in range(0, len(names), batch_size):
+            # the DataStore tables of resources that exist and have no views
+            resource_ids = [resource_id for resource_id, in
+                            model.Session.query(model.Resource.id)
+                            .outerjoin(model.ResourceView)
+                            .filter(model.ResourceView.id == None)
+                            .filter(model.Resource.id.in_(
+                                names[i:i + batch_size]))]
+            if not resource_ids:
                 continue
-            count += 1
-            resource_view = {'resource_id': row[0],
+            resource_view = {'resource_ids': resource_ids,
                              'view_type': 'recline_grid_view',
                              'title': 'Grid view',
                              'description': 'View of data within the DataStore'}
-            logic.get_action('resource_view_create')(context, resource_view)
+            count += len(logic.get_action('resource_view_create_many')(
+                context.copy(), resource_view))
+            print '%s of %s DataStore tables looked at' % (
+                min(i + batch_size, len(names)), len(names))
 
         print '%s grid resource views created!' % count
@@ -279,11 +279,12 @@ def package_dictize(pkg, context):
     result_dict['type']= pkg.type or u'dataset'
 
     # license
-    if pkg.license and pkg.license.url:
-        result_dict['license_url']= pkg.license.url
-        result_dict['license_title']= pkg.license.title.split('::')[-1]
-    elif pkg.license:
-        result_dict['license_title']= pkg.license.title
+    license = pkg.license
+    if license and license.url:
+        result_dict['license_url']= license.url
+        result_dict['license_title']= license.title.split('::')[-1]
+    elif license:
+        result_dict['license_title']= license.title
     else:
         result_dict['license_title']= pkg.license_id
 
@@ -311,12 +312,22 @@ def _get_members(context, group, member_type):
 
 
 def get_group_dataset_counts():
-    '''For all public groups, return their dataset counts, as a SOLR facet'''
+    '''For all public groups, return their dataset counts, as a SOLR facet
+
+    The facets are kept as a snapshot for ``ckan.search.facet_snapshot_ttl``
+    seconds (or until this process next updates the search index), so
+    callers must not modify the returned dict.
+    '''
+    ttl = int(config.get('ckan.search.facet_snapshot_ttl', 60))
+    facets = search.get_facet_snapshot('group_dataset_counts', ttl)
+    if facets is not None:
+        return facets
     query = search.PackageSearchQuery()
     q = {'q': '+capacity:public',
          'fl': 'groups', 'facet.field': ['groups', 'owner_org'],
          'facet.limit': -1, 'rows': 1}
     query.run(q)
+    search.set_facet_snapshot('group_dataset_counts', query.facets)
     return query.facets
 
 
@@ -518,7 +529,14 @@ def user_list_dictize(obj_list, context,
 def member_dictize(member, context):
     return d.table_dictize(member, context)
 
-def user_dictize(user, context):
+def user_dictize(user, context, number_of_edits=None,
+                 number_administered_packages=None):
+    '''Turns a User object into a dictionary.
+
+    The user's edit and administered package counts are looked up unless
+    they are passed in (e.g. when they have already been queried by
+    user_list).
+    '''
 
     if context.get('with_capacity'):
         user, capacity = user
@@ -531,8 +549,12 @@ def user_dictize(user, context):
 
     result_dict['display_name'] = user.display_name
     result_dict['email_hash'] = user.email_hash
-    result_dict['number_of_edits'] = user.number_of_edits()
-    result_dict['number_administered_packages'] = user.number_administered_packages()
+    if number_of_edits is None:
+        number_of_edits = user.number_of_edits()
+    if number_administered_packages is None:
+        number_administered_packages = user.number_administered_packages()
+    result_dict['number_of_edits'] = number_of_edits
+    result_dict['number_administered_packages'] = number_administered_packages
 
     requester = context.get('user')
 
@@ -1,11 +1,42 @@
+import cPickle as pickle
 import csv
 import datetime
-from sqlalchemy import orm
+import gzip
+import os
+import shutil
+import tempfile
+
+from sqlalchemy import orm, func, select, and_, or_
 
 import ckan.model as model
 import ckan.model
 from ckan.common import json, OrderedDict
 
+# how many packages are read from the database at a time by the dumps
+BATCH_SIZE = 100
+
+
+def package_batches(query, batch_size=BATCH_SIZE):
+    '''Yield the packages of `query` in lists of `batch_size`, ordered by
+    id.
+
+    Each batch is read with its own query, starting after the last id of the
+    batch before, so the packages that have been yielded don't stay in
+    memory and paging through them doesn't get slower as it goes on.
+
+    '''
+    last_id = None
+    while True:
+        batch_query = query
+        if last_id is not None:
+            batch_query = batch_query.filter(model.Package.id > last_id)
+        batch = batch_query.order_by(model.Package.id).limit(batch_size).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
 class SimpleDumper(object):
     '''Dumps just package data but including tags, groups, license text etc'''
     def dump(self, dump_file_obj, format='json', query=None):
@@ -20,9 +51,18 @@ class SimpleDumper(object):
         else:
             raise Exception('Unknown format: %s' % format)
 
+    def _packages(self, query):
+        for batch in package_batches(query):
+            for pkg in batch:
+                yield pkg
+
     def dump_csv(self, dump_file_obj, query):
-        row_dicts = []
-        for pkg in query:
+        # the columns are only known once every package has been seen, so
+        # the rows are spooled to a temporary file rather than kept in memory
+        col_titles = []
+        titles_set = set()
+        rows_file = tempfile.TemporaryFile()
+        for pkg in self._packages(query):
             pkg_dict = pkg.as_dict()
             # flatten dict
             for name, value in pkg_dict.items()[:]:
@@ -39,16 +79,207 @@ class SimpleDumper(object):
                     for name_, value_ in value.items():
                         pkg_dict[name_] = value_
                     del pkg_dict[name]
-            row_dicts.append(pkg_dict)
-        writer = CsvWriter(row_dicts)
-        writer.save(dump_file_obj)
+            for key in pkg_dict.keys():
+                if key not in titles_set:
+                    titles_set.add(key)
+                    col_titles.append(key)
+            # pickled, so that the values come back exactly as they were
+            pickle.dump(pkg_dict, rows_file, pickle.HIGHEST_PROTOCOL)
+
+        rows_file.seek(0)
+        writer = csv.writer(dump_file_obj, quotechar='"',
+                            quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerow(col_titles)
+        while True:
+            try:
+                pkg_dict = pickle.load(rows_file)
+            except EOFError:
+                break
+            writer.writerow(_csv_row(col_titles, pkg_dict))
+        rows_file.close()
 
     def dump_json(self, dump_file_obj, query):
-        pkgs = []
-        for pkg in query:
-            pkg_dict = pkg.as_dict()
-            pkgs.append(pkg_dict)
-        json.dump(pkgs, dump_file_obj, indent=4)
+        dump_file_obj.write('[')
+        for i, pkg in enumerate(self._packages(query)):
+            if i:
+                dump_file_obj.write(', ')
+            json.dump(pkg.as_dict(), dump_file_obj, indent=4)
+        dump_file_obj.write(']')
+
+
+def _export_shard(args):
+    exporter, path, shard, shards = args
+    return exporter.export_shard(path, shard, shards)
+
+
+class PackageExporter(object):
+    '''Exports the public datasets, dictized as ``package_show`` shows
+    them, as JSON lines or CSV.
+
+    The datasets are read and written in batches, so the export takes the
+    same memory however many datasets there are. With `since`, only the
+    datasets modified since then are exported, including the deleted ones,
+    so that an earlier export can be brought up to date.
+
+    '''
+    formats = ('jsonl', 'csv')
+
+    # the CSV columns, which are fixed so that the rows can be written as
+    # they are read
+    csv_columns = ('id', 'name', 'title', 'version', 'url', 'notes',
+                   'author', 'author_email', 'maintainer',
+                   'maintainer_email', 'license_id', 'license_title',
+                   'state', 'type', 'organization', 'metadata_created',
+                   'metadata_modified', 'tags', 'groups', 'resource_urls',
+                   'resource_formats', 'extras')
+
+    def __init__(self, format='jsonl', since=None, batch_size=BATCH_SIZE,
+                 compress=False):
+        if format not in self.formats:
+            raise ValueError('Unknown format: %s' % format)
+        self.format = format
+        self.since = since
+        self.batch_size = batch_size
+        self.compress = compress
+
+    def query(self, shard=0, shards=1):
+        query = model.Session.query(model.Package) \
+            .filter(model.Package.private == False)
+        if self.since is not None:
+            # deleting a dataset doesn't change its metadata_modified, so
+            # the datasets with revisions since then are exported too
+            revisions = model.package_revision_table
+            revised = select(
+                [revisions.c.id],
+                and_(revisions.c.revision_id == model.revision_table.c.id,
+                     model.revision_table.c.timestamp >= self.since))
+            query = query.filter(or_(
+                model.Package.metadata_modified >= self.since,
+                model.Package.id.in_(revised)))
+            query = query.filter(model.Package.state.in_(
+                [model.State.ACTIVE, model.State.DELETED]))
+        else:
+            query = query.filter(model.Package.state == model.State.ACTIVE)
+        if shards > 1:
+            # the first byte of the md5 of the id spreads the packages evenly
+            first_byte = func.get_byte(
+                func.decode(func.md5(model.Package.id), 'hex'), 0)
+            query = query.filter(first_byte % shards == shard)
+        return query
+
+    def package_dicts(self, shard=0, shards=1):
+        '''Yield the dictized packages of the shard `shard` of `shards`.'''
+        import ckan.lib.dictization.model_dictize as model_dictize
+        context = {'model': model, 'session': model.Session}
+        for batch in package_batches(self.query(shard, shards),
+                                     self.batch_size):
+            for pkg in batch:
+                yield model_dictize.package_dictize(pkg, context)
+            model.Session.expunge_all()
+
+    def csv_row(self, pkg_dict):
+        organization = pkg_dict.get('organization')
+        resources = pkg_dict.get('resources', [])
+        row = dict(pkg_dict)
+        row.update({
+            'organization': organization['name'] if organization else None,
+            'tags': ' '.join(tag['name'] for tag in pkg_dict.get('tags', [])),
+            'groups': ' '.join(group['name']
+                               for group in pkg_dict.get('groups', [])),
+            'resource_urls': ' '.join(res['url'] for res in resources),
+            'resource_formats': ' '.join(res['format'] or ''
+                                         for res in resources),
+            'extras': json.dumps(dict((extra['key'], extra['value'])
+                                      for extra in pkg_dict.get('extras',
+                                                                []))),
+        })
+        return _csv_row(self.csv_columns, row)
+
+    def _open(self, path):
+        if self.compress:
+            return gzip.open(path, 'wb')
+        return open(path, 'wb')
+
+    def write(self, file_obj, pkg_dicts):
+        '''Write `pkg_dicts` to `file_obj`, without the CSV header, and
+        return how many were written.'''
+        count = 0
+        if self.format == 'csv':
+            writer = csv.writer(file_obj, quotechar='"',
+                                quoting=csv.QUOTE_NONNUMERIC)
+            for pkg_dict in pkg_dicts:
+                writer.writerow(self.csv_row(pkg_dict))
+                count += 1
+        else:
+            for pkg_dict in pkg_dicts:
+                file_obj.write(json.dumps(pkg_dict) + '\n')
+                count += 1
+        return count
+
+    def write_header(self, file_obj):
+        if self.format == 'csv':
+            csv.writer(file_obj, quotechar='"',
+                       quoting=csv.QUOTE_NONNUMERIC).writerow(
+                           self.csv_columns)
+
+    def export_shard(self, path, shard=0, shards=1):
+        '''Write the packages of one shard to `path`, without the CSV
+        header, and return how many were written.'''
+        with self._open(path) as file_obj:
+            return self.write(file_obj, self.package_dicts(shard, shards))
+
+    def export(self, path, processes=1):
+        '''Export the packages to `path` and return how many there were.
+
+        With more than one process, each exports a shard of the packages to
+        a file of its own, and the files are joined together at the end
+        (gzip files can be joined like this too).
+
+        '''
+        if processes <= 1:
+            with self._open(path) as file_obj:
+                self.write_header(file_obj)
+                return self.write(file_obj, self.package_dicts())
+
+        import multiprocessing
+        # the processes mustn't share the connections of this one
+        model.Session.remove()
+        model.meta.engine.dispose()
+        part_paths = ['%s.part%i' % (path, shard)
+                      for shard in range(processes)]
+        pool = multiprocessing.Pool(processes)
+        try:
+            counts = pool.map(_export_shard, [
+                (self, part_path, shard, processes)
+                for shard, part_path in enumerate(part_paths)])
+        finally:
+            pool.close()
+            pool.join()
+
+        with open(path, 'wb') as out:
+            if self.compress:
+                # the header is a gzip member of its own
+                header_obj = gzip.GzipFile(fileobj=out, mode='wb')
+                self.write_header(header_obj)
+                header_obj.close()
+            else:
+                self.write_header(out)
+            for part_path in part_paths:
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, out)
+                os.remove(part_path)
+        return sum(counts)
+
+
+def _csv_row(col_titles, row_dict):
+    row = []
+    for title in col_titles:
+        value = row_dict.get(title)
+        if isinstance(value, unicode):
+            value = value.encode('utf8')
+        row.append(value)
+    return row
+
 
 class Dumper(object):
     '''Dumps the database in same structure as it appears in the database'''
@@ -0,0 +1,119 @@
+'''The SQLAlchemy engines that CKAN connects to its databases with.
+
+Each database URL gets one engine, and so one pool of connections, in each
+process, however many parts of CKAN use it. An engine's pool is configured
+by the config options with the same prefix as the option holding its URL,
+e.g. for ``ckan.datastore.write_url``::
+
+    ckan.datastore.write_pool_size = 10
+    ckan.datastore.write_max_overflow = 5
+    ckan.datastore.write_pool_recycle = 3600
+    ckan.datastore.write_pool_pre_ping = true
+
+and ``sqlalchemy.pool_size`` etc. for ``sqlalchemy.url``. With
+``<prefix>pgbouncer = true`` the engine keeps no pool of its own, leaving
+that to PgBouncer.
+
+'''
+import logging
+import threading
+
+import paste.deploy.converters as converters
+import sqlalchemy
+import sqlalchemy.engine.url
+import sqlalchemy.event
+import sqlalchemy.exc
+import sqlalchemy.pool
+
+log = logging.getLogger(__name__)
+
+_engines = {}
+_lock = threading.Lock()
+
+# the options that only a pool of connections kept by the engine uses
+_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout',
+                 'pool_recycle')
+
+
+def engine_from_config(config, prefix='sqlalchemy.', **kwargs):
+    '''Return the engine for the database at ``config[prefix + 'url']``.
+
+    Like ``sqlalchemy.engine_from_config()``, except that the engine is only
+    created the first time, so `kwargs` and the other options are only used
+    then.
+
+    '''
+    url = config[prefix + 'url']
+    with _lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = _create_engine(config, prefix, **kwargs)
+            _engines[url] = engine
+    return engine
+
+
+def _create_engine(config, prefix, **kwargs):
+    options = dict((key, value) for key, value in config.items()
+                   if key.startswith(prefix))
+    pre_ping = converters.asbool(options.pop(prefix + 'pool_pre_ping',
+                                             False))
+    pgbouncer = converters.asbool(options.pop(prefix + 'pgbouncer', False))
+    if pgbouncer:
+        # PgBouncer hands each transaction whichever server connection is
+        # free, so connections mustn't be kept, or be given session-level
+        # settings that the next client would get
+        for option in _POOL_OPTIONS + ('isolation_level',):
+            if options.pop(prefix + option, None) is not None:
+                log.warning('%s%s is ignored with %spgbouncer',
+                            prefix, option, prefix)
+        kwargs['poolclass'] = sqlalchemy.pool.NullPool
+    engine = sqlalchemy.engine_from_config(options, prefix, **kwargs)
+    if pre_ping and not pgbouncer:
+        sqlalchemy.event.listen(engine, 'checkout', _ping)
+    return engine
+
+
+def _ping(dbapi_connection, connection_record, connection_proxy):
+    '''Check that a connection taken from the pool still works.'''
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    except Exception:
+        # the pool replaces the connection and tries again
+        raise sqlalchemy.exc.DisconnectionError()
+    finally:
+        cursor.close()
+
+
+def pool_statistics():
+    '''Return the state of each engine's pool of connections.
+
+    :returns: a dictionary of the ``pool`` class and, for pools that keep
+        connections, their ``size`` and how many connections are
+        ``checked_in``, ``checked_out`` and ``overflow``, by database URL
+        (with any password hidden)
+    :rtype: dictionary
+
+    '''
+    with _lock:
+        engines = _engines.items()
+    statistics = {}
+    for url, engine in engines:
+        pool = engine.pool
+        pool_statistics = {'pool': pool.__class__.__name__}
+        if isinstance(pool, sqlalchemy.pool.QueuePool):
+            pool_statistics.update({
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+            })
+        statistics[_hide_password(url)] = pool_statistics
+    return statistics
+
+
+def _hide_password(url):
+    url = sqlalchemy.engine.url.make_url(url)
+    if url.password:
+        url.password = '***'
+    return str(url)
@@ -0,0 +1,188 @@
+'''A cache of rendered template fragments and of the results of expensive
+template helpers.
+
+Templates cache fragments with the ``{% cache %}`` tag (see
+``ckan.lib.jinja_extensions.FragmentCacheExtension``) and helpers with
+``get_or_create()``. Entries are kept in an LRU cache in each process and,
+if ``ckan.fragment_cache.backend`` is ``redis``, in Redis so that they are
+shared by all of the site's processes.
+
+Cache keys should include the ids and ``metadata_modified`` of the objects
+that a fragment shows, so that other processes don't serve a fragment after
+its objects have changed. The whole cache is also cleared when this process
+commits changes to datasets, groups or related items (see
+``ckan.model.meta.CkanCacheExtension``). Otherwise, entries expire after
+``ckan.fragment_cache.ttl`` seconds.
+
+'''
+import copy
+import cPickle as pickle
+import hashlib
+import logging
+import time
+
+from paste.deploy.converters import asbool
+from pylons import config
+from repoze.lru import ExpiringLRUCache
+
+log = logging.getLogger(__name__)
+
+# the domain objects whose changes clear the cache
+INVALIDATING_CLASSES = set(['Package', 'Resource', 'PackageExtra',
+                            'PackageTag', 'Group', 'GroupExtra', 'Member',
+                            'Related', 'RelatedDataset'])
+
+# how long (in seconds) a process trusts its copy of a shared cache's
+# generation before checking whether another process has cleared the cache
+GENERATION_CHECK_INTERVAL = 1
+
+_missing = object()
+
+
+class RedisBackend(object):
+    '''Keeps the cache entries in Redis.
+
+    Clearing the cache increments a generation number that is part of every
+    key, so the old entries are never read again and Redis expires them.
+
+    '''
+    def __init__(self, url, prefix):
+        import redis
+        self.redis = redis.StrictRedis.from_url(url)
+        self.errors = redis.exceptions.RedisError
+        self.prefix = prefix
+        self.generation_key = prefix + 'generation'
+
+    def get_generation(self):
+        return int(self.redis.get(self.generation_key) or 0)
+
+    def clear(self):
+        self.redis.incr(self.generation_key)
+
+    def get(self, key):
+        value = self.redis.get(self.prefix + key)
+        if value is None:
+            return _missing
+        return pickle.loads(value)
+
+    def put(self, key, value, ttl):
+        self.redis.setex(self.prefix + key, ttl,
+                         pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+class FragmentCache(object):
+    '''An LRU cache of `size` entries expiring after `ttl` seconds, in front
+    of an optional shared `backend`.'''
+    def __init__(self, size, ttl, backend=None):
+        self.local = ExpiringLRUCache(size, default_timeout=ttl)
+        self.ttl = ttl
+        self.backend = backend
+        self.generation = 0
+        self.generation_checked = 0
+
+    def _check_generation(self):
+        '''Clear the local cache if another process has cleared the shared
+        one.'''
+        if time.time() - self.generation_checked < GENERATION_CHECK_INTERVAL:
+            return
+        generation = self.backend.get_generation()
+        if generation != self.generation:
+            self.local.clear()
+            self.generation = generation
+        self.generation_checked = time.time()
+
+    def get_or_create(self, key, create, ttl=None):
+        ttl = ttl or self.ttl
+        key = hashlib.sha1(repr(key)).hexdigest()
+        value = self.local.get(key, _missing)
+        if value is not _missing:
+            return value
+
+        backend = self.backend
+        if backend is not None:
+            try:
+                self._check_generation()
+                shared_key = '%i:%s' % (self.generation, key)
+                value = backend.get(shared_key)
+            except backend.errors, e:
+                # the cache must never break the site
+                log.warning('Could not read the shared fragment cache: %s',
+                            e)
+                backend = None
+
+        if value is _missing:
+            value = create()
+            if backend is not None:
+                try:
+                    backend.put(shared_key, value, ttl)
+                except backend.errors, e:
+                    log.warning('Could not write to the shared fragment '
+                                'cache: %s', e)
+        self.local.put(key, value, timeout=ttl)
+        return value
+
+    def clear(self):
+        self.local.clear()
+        if self.backend is not None:
+            try:
+                self.backend.clear()
+            except self.backend.errors, e:
+                log.warning('Could not clear the shared fragment cache: %s',
+                            e)
+            self.generation_checked = 0
+
+
+_cache = None
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        if not asbool(config.get('ckan.fragment_cache.enabled',
+                                 not asbool(config.get('debug', False)))):
+            return None
+        backend = None
+        if config.get('ckan.fragment_cache.backend', 'memory') == 'redis':
+            backend = RedisBackend(
+                config.get('ckan.fragment_cache.redis_url',
+                           'redis://localhost:6379/0'),
+                'ckan:%s:fragments:' % config.get('ckan.site_id', ''))
+        _cache = FragmentCache(
+            int(config.get('ckan.fragment_cache.size', 1000)),
+            int(config.get('ckan.fragment_cache.ttl', 300)),
+            backend)
+    return _cache
+
+
+def get_or_create(key, create, ttl=None):
+    '''Return the value cached under `key`, calling `create()` to compute
+    (and cache) it if it isn't cached.
+
+    :param key: the parts of the key, e.g. ``('featured_groups', count)``.
+        Its ``repr()`` must identify the value.
+    :type key: tuple
+    :param ttl: how long to cache the value for, in seconds (optional,
+        defaults to ``ckan.fragment_cache.ttl``)
+    :type ttl: int
+
+    '''
+    cache = _get_cache()
+    if cache is None:
+        return create()
+    value = cache.get_or_create(key, create, ttl)
+    if isinstance(value, basestring):
+        return value
+    # don't let callers change the cached value
+    return copy.deepcopy(value)
+
+
+def clear():
+    '''Remove every entry from the cache, in all processes if it is shared.'''
+    if _cache is not None:
+        _cache.clear()
+
+
+def reset():
+    '''Forget the cache, so that it is created again from the config.'''
+    global _cache
+    _cache = None
@@ -21,7 +21,6 @@ from paste.deploy.converters import asbool
 from webhelpers.html import escape, HTML, literal, url_escape
 from webhelpers.html.tools import mail_to
 from webhelpers.html.tags import *
-from webhelpers.markdown import markdown
 from webhelpers import paginate
 from webhelpers.text import truncate
 import webhelpers.date as date
@@ -34,10 +33,11 @@ from alphabet_paginate import AlphaPage
 import i18n
 import ckan.exceptions
 
-import ckan.lib.fanstatic_resources as fanstatic_resources
 import ckan.model as model
 import ckan.lib.formatters as formatters
+import ckan.lib.fragment_cache as fragment_cache
 import ckan.lib.maintain as maintain
+import ckan.lib.site_statistics as site_statistics
 import ckan.lib.datapreview as datapreview
 import ckan.logic as logic
 import ckan.lib.uploader as uploader
@@ -773,13 +773,20 @@ def group_name_to_title(name):
     return name
 
 
+def _markdown(*args, **kwargs):
+    # imported here because webhelpers.markdown is a large module that most
+    # commands and requests never use
+    from webhelpers.markdown import markdown
+    return markdown(*args, **kwargs)
+
+
 def markdown_extract(text, extract_length=190):
     ''' return the plain text representation of markdown encoded text.  That
     is the texted without any html tags.  If extract_length is 0 then it
     will not be truncated.'''
     if (text is None) or (text.strip() == ''):
         return ''
-    plain = RE_MD_HTML_TAGS.sub('', markdown(text))
+    plain = RE_MD_HTML_TAGS.sub('', _markdown(text))
     if not extract_length or len(plain) < extract_length:
         return literal(plain)
     return literal(unicode(truncate(plain, length=extract_length, indicator='...', whole_word=True)))
@@ -1339,6 +1346,9 @@ def remove_url_param(key, value=None, replace=None, controller=None,
 
 
 def include_resource(resource):
+    # imported here because scanning the resource directories is slow and
+    # only needed when rendering pages
+    import ckan.lib.fanstatic_resources as fanstatic_resources
     r = getattr(fanstatic_resources, resource)
     r.need()
 
@@ -1349,6 +1359,7 @@ def urls_for_resource(resource):
 
     NOTE: This is for special situations only and is not the way to generally
     include resources.  It is advised not to use this function.'''
+    import ckan.lib.fanstatic_resources as fanstatic_resources
     r = getattr(fanstatic_resources, resource)
     resources = list(r.resources)
     core = fanstatic_resources.fanstatic_extensions.core
@@ -1613,10 +1624,10 @@ def render_markdown(data, auto_link=True, allow_html=False):
     if not data:
         return ''
     if allow_html:
-        data = markdown(data.strip(), safe_mode=False)
+        data = _markdown(data.strip(), safe_mode=False)
     else:
         data = RE_MD_HTML_TAGS.sub('', data.strip())
-        data = markdown(data, safe_mode=True)
+        data = _markdown(data, safe_mode=True)
     # tags can be added by tag:... or tag:"...." and a link will be made
     # from it
     if auto_link:
@@ -1816,10 +1827,12 @@ def get_featured_organizations(count=1):
     of organization_list action function
     '''
     config_orgs = config.get('ckan.featured_orgs', '').split()
-    orgs = featured_group_org(get_action='organization_show',
-                              list_action='organization_list',
-                              count=count,
-                              items=config_orgs)
+    orgs = fragment_cache.get_or_create(
+        ('featured_organizations', count, config_orgs),
+        lambda: featured_group_org(get_action='organization_show',
+                                   list_action='organization_list',
+                                   count=count,
+                                   items=config_orgs))
     return orgs
 
 
@@ -1828,16 +1841,22 @@ def get_featured_groups(count=1):
     of organization_list action function
     '''
     config_groups = config.get('ckan.featured_groups', '').split()
-    groups = featured_group_org(get_action='group_show',
-                                list_action='group_list',
-                                count=count,
-                                items=config_groups)
+    groups = fragment_cache.get_or_create(
+        ('featured_groups', count, config_groups),
+        lambda: featured_group_org(get_action='group_show',
+                                   list_action='group_list',
+                                   count=count,
+                                   items=config_groups))
     return groups
 
 
 def featured_group_org(items, get_action, list_action, count):
+    # the featured groups are cached and shown to everyone, so they are
+    # read as an anonymous user would see them, without the private
+    # datasets that the current user may be able to see
     def get_group(id):
-        context = {'ignore_auth': True,
+        context = {'user': '',
+                   'ignore_auth': True,
                    'limits': {'packages': 2},
                    'for_view': True}
         data_dict = {'id': id}
@@ -1850,7 +1869,7 @@ def featured_group_org(items, get_action, list_action, count):
 
     groups_data = []
 
-    extras = logic.get_action(list_action)({}, {})
+    extras = logic.get_action(list_action)({'user': ''}, {})
 
     # list of found ids to prevent duplicates
     found = []
@@ -1870,19 +1889,10 @@ def featured_group_org(items, get_action, list_action, count):
 
 
 def get_site_statistics():
-    stats = {}
-    stats['dataset_count'] = logic.get_action('package_search')(
-        {}, {"rows": 1})['count']
-    stats['group_count'] = len(logic.get_action('group_list')({}, {}))
-    stats['organization_count'] = len(
-        logic.get_action('organization_list')({}, {}))
-    result = model.Session.execute(
-        '''select count(*) from related r
-           left join related_dataset rd on r.id = rd.related_id
-           where rd.status = 'active' or rd.id is null''').first()[0]
-    stats['related_count'] = result
-
-    return stats
+    '''Returns the numbers of datasets, groups, organizations, resources,
+    users and related items on the site, from a snapshot that is refreshed
+    every ``ckan.site_statistics.ttl`` seconds.'''
+    return site_statistics.get()
 
 _RESOURCE_FORMATS = None
 
@@ -0,0 +1,93 @@
+'''Time how long importing a module, and each module it imports, takes.
+
+This is what ``python -X importtime`` does in Python 3.7+. Run it in a fresh
+interpreter, because modules that have already been imported aren't timed::
+
+    python -m ckan.lib.import_profile ckan.lib.helpers 20
+
+prints the 20 slowest imports (all of them if no number is given), or see
+``paster benchmark imports``. It only uses the standard library, so that
+profiling an import doesn't import anything else first.
+
+'''
+import __builtin__
+import sys
+import time
+
+
+class ImportProfiler(object):
+    '''Context manager timing the imports made inside it.
+
+    ``timings`` is a list of ``(module name, self ms, cumulative ms)`` in the
+    order that the imports finished; "self" excludes the modules imported by
+    that module.
+
+    '''
+    def __init__(self):
+        self.timings = []
+        # the time spent in nested imports, for each import in progress
+        self._nested = []
+        self._import = None
+
+    def __enter__(self):
+        self._import = __builtin__.__import__
+        __builtin__.__import__ = self._timed_import
+        return self
+
+    def __exit__(self, *exc_info):
+        __builtin__.__import__ = self._import
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=None,
+                      level=-1):
+        relative = self._relative_name(name, globals)
+        # imports of modules that were already loaded are just lookups
+        new = not (sys.modules.get(relative) or sys.modules.get(name))
+        self._nested.append(0)
+        start = time.time()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = (time.time() - start) * 1000
+            nested = self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+            if new:
+                if sys.modules.get(relative) is not None:
+                    name = relative
+                self.timings.append((name, elapsed - nested, elapsed))
+
+    def _relative_name(self, name, globals):
+        '''Return the name that `name` has if it is an implicit relative
+        import.'''
+        globals = globals or {}
+        package = globals.get('__name__', '')
+        if '__path__' not in globals:
+            package = package.rpartition('.')[0]
+        return '%s.%s' % (package, name) if package else name
+
+    def slowest(self, count=None):
+        '''Return the `count` slowest imports, by cumulative time.'''
+        timings = sorted(self.timings, key=lambda t: t[2], reverse=True)
+        return timings[:count] if count else timings
+
+
+def profile(module_name):
+    '''Import `module_name`, returning the ImportProfiler that timed it.'''
+    with ImportProfiler() as profiler:
+        __import__(module_name)
+    return profiler
+
+
+def report(profiler, count=None):
+    '''Return a table of the `count` slowest imports timed by `profiler`.'''
+    lines = ['%10s %10s  %s' % ('self [ms]', 'cumulative', 'module')]
+    for name, own, cumulative in profiler.slowest(count):
+        lines.append('%10.1f %10.1f  %s' % (own, cumulative, name))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        sys.exit('Usage: python -m ckan.lib.import_profile MODULE [N]')
+    count = int(sys.argv[2]) if len(sys.argv) == 3 else None
+    print report(profile(sys.argv[1]), count)
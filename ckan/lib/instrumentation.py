@@ -0,0 +1,284 @@
+'''Timings of action function calls, with counts of the SQL statements and
+Solr requests that they make.
+
+Every call of an action function made through ``ckan.logic.get_action()``
+is measured and passed to the sinks listed in the
+``ckan.instrumentation.sinks`` config option. Nothing is measured if that
+option isn't set.
+
+A sink is any object with a ``record(timing)`` method that takes an
+ActionTiming. The built in ones are:
+
+``log``
+    logs one line per call
+``statsd``
+    sends the timings to a statsd server over UDP, see
+    ``ckan.instrumentation.statsd_host`` and
+    ``ckan.instrumentation.statsd_prefix``
+``memory``
+    keeps per-action histograms in this process, returned by the
+    ``status_metrics`` action
+
+Other sinks can be given as ``package.module:ClassName``.
+
+'''
+import bisect
+import copy
+import logging
+import socket
+import threading
+import time
+
+from pylons import config
+import sqlalchemy.event
+
+log = logging.getLogger(__name__)
+
+# upper bounds (in ms) of the buckets of the memory sink's histograms
+HISTOGRAM_BUCKETS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000,
+                     10000]
+
+_local = threading.local()
+
+
+class ActionTiming(object):
+    '''The measurements of one call of an action function.
+
+    ``sql_count``, ``sql_time``, ``solr_count`` and ``solr_time`` include
+    the statements and requests of any actions called by this one. Times are
+    in milliseconds. ``depth`` is 0 for actions called directly (e.g. by a
+    controller), 1 for actions called by those and so on.
+
+    '''
+    def __init__(self, action_name, depth):
+        self.action_name = action_name
+        self.depth = depth
+        self.start = time.time()
+        self.time = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.solr_count = 0
+        self.solr_time = 0.0
+
+    def as_dict(self):
+        return {
+            'action': self.action_name,
+            'depth': self.depth,
+            'time': self.time,
+            'sql_count': self.sql_count,
+            'sql_time': self.sql_time,
+            'solr_count': self.solr_count,
+            'solr_time': self.solr_time,
+        }
+
+
+class LogSink(object):
+    '''Log a line for each action call.'''
+    def record(self, timing):
+        log.info('%s%s: %.1f ms, %i SQL statements (%.1f ms), '
+                 '%i Solr requests (%.1f ms)',
+                 '  ' * timing.depth, timing.action_name, timing.time,
+                 timing.sql_count, timing.sql_time, timing.solr_count,
+                 timing.solr_time)
+
+
+class StatsdSink(object):
+    '''Send the timings to a statsd server, as timers (which statsd turns
+    into histograms) for the times and counters for the numbers of SQL
+    statements and Solr requests.'''
+    def __init__(self):
+        host = config.get('ckan.instrumentation.statsd_host',
+                          'localhost:8125')
+        host, port = host.rsplit(':', 1)
+        self.address = (host, int(port))
+        self.prefix = config.get('ckan.instrumentation.statsd_prefix',
+                                 'ckan.action')
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def record(self, timing):
+        name = '%s.%s' % (self.prefix, timing.action_name)
+        lines = [
+            '%s.time:%.3f|ms' % (name, timing.time),
+            '%s.sql_time:%.3f|ms' % (name, timing.sql_time),
+            '%s.sql_count:%i|c' % (name, timing.sql_count),
+            '%s.solr_time:%.3f|ms' % (name, timing.solr_time),
+            '%s.solr_count:%i|c' % (name, timing.solr_count),
+        ]
+        try:
+            self.socket.sendto('\n'.join(lines), self.address)
+        except socket.error, e:
+            # metrics must never break the site
+            log.debug('Could not send metrics to statsd: %s', e)
+
+
+class MemorySink(object):
+    '''Keep a histogram of the times of each action, and the totals of its
+    other measurements.'''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def record(self, timing):
+        with self.lock:
+            metrics = self.metrics.get(timing.action_name)
+            if metrics is None:
+                metrics = self.metrics[timing.action_name] = {
+                    'count': 0,
+                    'time': 0.0,
+                    'max_time': 0.0,
+                    'sql_count': 0,
+                    'sql_time': 0.0,
+                    'solr_count': 0,
+                    'solr_time': 0.0,
+                    'histogram': [0] * (len(HISTOGRAM_BUCKETS) + 1),
+                }
+            metrics['count'] += 1
+            metrics['time'] += timing.time
+            metrics['max_time'] = max(metrics['max_time'], timing.time)
+            for key in ('sql_count', 'sql_time', 'solr_count', 'solr_time'):
+                metrics[key] += getattr(timing, key)
+            bucket = bisect.bisect_left(HISTOGRAM_BUCKETS, timing.time)
+            metrics['histogram'][bucket] += 1
+
+    def get_metrics(self):
+        with self.lock:
+            return copy.deepcopy(self.metrics)
+
+
+SINKS = {
+    'log': LogSink,
+    'statsd': StatsdSink,
+    'memory': MemorySink,
+}
+
+_sinks = None
+
+
+def _load_sink(name):
+    if name in SINKS:
+        return SINKS[name]()
+    module_name, class_name = name.split(':')
+    module = __import__(module_name, fromlist=[class_name])
+    return getattr(module, class_name)()
+
+
+def get_sinks():
+    '''Return the sinks configured in ``ckan.instrumentation.sinks``.'''
+    global _sinks
+    if _sinks is None:
+        _sinks = [_load_sink(name) for name in
+                  config.get('ckan.instrumentation.sinks', '').split()]
+    return _sinks
+
+
+def reset():
+    '''Forget the configured sinks and everything recorded by them.'''
+    global _sinks
+    _sinks = None
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def start_action(action_name):
+    '''Start timing a call of an action function.
+
+    Returns the ActionTiming to pass to ``finish_action()``, or None if
+    there are no sinks configured.
+
+    '''
+    if not get_sinks():
+        return None
+    stack = _stack()
+    timing = ActionTiming(action_name, len(stack))
+    stack.append(timing)
+    return timing
+
+
+def finish_action(timing):
+    '''Stop timing a call of an action function and record it.'''
+    timing.time = (time.time() - timing.start) * 1000
+    stack = _stack()
+    if stack and stack[-1] is timing:
+        stack.pop()
+    for sink in get_sinks():
+        try:
+            sink.record(timing)
+        except Exception, e:
+            log.exception(e)
+
+
+def _record(kind, seconds):
+    stack = getattr(_local, 'stack', None)
+    if not stack:
+        return
+    milliseconds = seconds * 1000
+    for timing in stack:
+        setattr(timing, kind + '_count', getattr(timing, kind + '_count') + 1)
+        setattr(timing, kind + '_time',
+                getattr(timing, kind + '_time') + milliseconds)
+
+
+class solr_request(object):
+    '''Context manager for making a request to Solr, so that it is counted
+    in the timings of the actions making it::
+
+        with instrumentation.solr_request():
+            solr_response = conn.raw_query(**query)
+
+    '''
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _record('solr', time.time() - self.start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    _local.sql_start = time.time()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    start = getattr(_local, 'sql_start', None)
+    if start is not None:
+        seconds = time.time() - start
+        _record('sql', seconds)
+        _local.sql_start = None
+        sql_log = getattr(_local, 'sql_log', None)
+        if sql_log is not None:
+            sql_log.append((statement, seconds * 1000))
+
+
+def log_sql(statements):
+    '''Append a (statement, milliseconds) tuple to the `statements` list
+    for each SQL statement run by this thread from now on, until this is
+    called again with None.'''
+    _local.sql_log = statements
+
+
+def instrument_engine(engine):
+    '''Count the SQL statements run by the given engine in the timings of
+    the actions running them.'''
+    if getattr(engine, '_ckan_instrumented', False):
+        return
+    sqlalchemy.event.listen(engine, 'before_cursor_execute',
+                            _before_cursor_execute)
+    sqlalchemy.event.listen(engine, 'after_cursor_execute',
+                            _after_cursor_execute)
+    engine._ckan_instrumented = True
+
+
+def get_metrics():
+    '''Return the metrics kept by the ``memory`` sink, or None if it isn't
+    configured.'''
+    for sink in get_sinks():
+        if isinstance(sink, MemorySink):
+            metrics = sink.get_metrics()
+            return {'buckets': HISTOGRAM_BUCKETS, 'actions': metrics}
+    return None
@@ -1,9 +1,11 @@
+import os
 import re
 from os import path
 import logging
 
 from jinja2 import nodes
 from jinja2 import loaders
+from jinja2 import bccache
 from jinja2 import ext
 from jinja2.exceptions import TemplateNotFound
 from jinja2.utils import open_if_exists, escape
@@ -11,7 +13,10 @@ from jinja2.filters import do_truncate
 from jinja2 import Environment
 
 import ckan.lib.base as base
+import ckan.lib.fragment_cache as fragment_cache
 import ckan.lib.helpers as h
+import ckan.lib.render as render
+import ckan.lib.util as util
 
 
 log = logging.getLogger(__name__)
@@ -207,6 +212,104 @@ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
         raise TemplateNotFound(template)
 
 
+class FragmentCacheExtension(ext.Extension):
+    ''' Custom {% cache key[, ttl] %}...{% endcache %} tag that caches the
+    rendered content of its body in the fragment cache, see
+    ckan.lib.fragment_cache.
+
+    The key should identify everything that the content depends on, e.g.
+
+        {% cache [package.id, package.metadata_modified] %}
+
+    The template name and the current language are added to it. The ttl
+    is in seconds and defaults to ckan.fragment_cache.ttl. Variables set
+    inside the tag aren't available after it. '''
+
+    tags = set(['cache'])
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [nodes.Const(parser.name), parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cache', args),
+                               [], [], body).set_lineno(lineno)
+
+    def _cache(self, template_name, key, ttl, caller):
+        key = ('template', template_name, h.lang(), key)
+        return fragment_cache.get_or_create(key, caller, ttl)
+
+
+def get_bytecode_cache(config):
+    '''Return the Jinja2 bytecode cache set by the
+    ``ckan.jinja2.bytecode_cache`` config option, or None if it isn't set.
+
+    Compiled templates are stored under a hash of their name and filename,
+    together with a checksum of their source so that changed templates are
+    recompiled.
+
+    '''
+    cache_type = config.get('ckan.jinja2.bytecode_cache')
+    if not cache_type:
+        return None
+    if cache_type == 'filesystem':
+        directory = config.get('ckan.jinja2.bytecode_cache_dir')
+        if not directory:
+            # not the temporary directory, where anyone could write the
+            # bytecode that is loaded
+            if not config.get('cache_dir'):
+                raise Exception('ckan.jinja2.bytecode_cache = filesystem '
+                                'needs ckan.jinja2.bytecode_cache_dir or '
+                                'cache_dir to be set')
+            directory = path.join(config['cache_dir'], 'jinja2')
+        return bccache.FileSystemBytecodeCache(
+            util.make_private_directory(directory))
+    if cache_type == 'memcached':
+        try:
+            import memcache
+        except ImportError:
+            raise Exception('ckan.jinja2.bytecode_cache = memcached needs '
+                            'the python-memcached package to be installed')
+        servers = config.get('ckan.jinja2.memcached_servers',
+                             '127.0.0.1:11211').split()
+        prefix = 'ckan/%s/jinja2/' % config.get('ckan.site_id', '')
+        return bccache.MemcachedBytecodeCache(memcache.Client(servers),
+                                              prefix=prefix)
+    raise Exception('Unknown ckan.jinja2.bytecode_cache %r, it must be '
+                    'filesystem or memcached' % cache_type)
+
+
+def template_names(searchpaths):
+    '''Return the name and filename of every Jinja2 template in the given
+    template search paths.
+
+    Templates that are hidden by a template of the same name earlier in the
+    search path get the name that ``{% ckan_extends %}`` loads them with.
+
+    '''
+    names = []
+    last_index = {}
+    for index, searchpath in enumerate(searchpaths):
+        for dirpath, dirnames, filenames in sorted(os.walk(searchpath)):
+            for filename in sorted(filenames):
+                if not filename.endswith('.html'):
+                    continue
+                filename = path.join(dirpath, filename)
+                if render.template_type(filename) != 'jinja2':
+                    continue
+                name = filename[len(searchpath) + 1:].replace(os.sep, '/')
+                if name in last_index:
+                    extended_name = '*%i*%s' % (last_index[name], name)
+                else:
+                    extended_name = name
+                last_index[name] = index
+                names.append((extended_name, filename))
+    return names
+
+
 class BaseExtension(ext.Extension):
     ''' Base class for creating custom jinja2 tags.
     parse expects a tag of the format
@@ -157,6 +157,140 @@ def augment_data(data, schema):
 
     return new_data
 
+class CompiledSchema(object):
+    '''The parts of validating against a schema that only depend on the shape
+    of the schema, worked out once and reused for every validation.
+
+    Schemas are usually built afresh for each request (and their validators
+    are often closures made on the spot) so compiled schemas are cached by
+    shape, see compile_schema(), and the validators themselves are always
+    taken from the schema being validated against.
+
+    '''
+    def __init__(self, schema):
+        flattented_schema = flatten_schema(schema)
+        self.schema_prefixes = set(key[:-1] for key in flattented_schema)
+        ## every leading part of every key, to spot data placed against
+        ## subschemas
+        self.initial_keys = set(key[:length] for key in flattented_schema
+                                for length in range(1, len(key) + 1))
+
+        ## fields of each subschema in validation order, split by run
+        self.fields = {}
+        self.phases = {}
+        for prefix in self.schema_prefixes | set([()]):
+            sub_schema = schema
+            for key in prefix:
+                sub_schema = sub_schema[key]
+            fields = sorted(key for key, value in sub_schema.iteritems()
+                            if isinstance(value, list))
+            self.fields[prefix] = fields
+            self.phases[prefix] = {
+                'before': [key for key in fields if key == '__before'],
+                'main': [key for key in fields if not key.startswith('__')],
+                'extras': [key for key in fields if key == '__extras'],
+                'after': [key for key in fields if key == '__after'],
+            }
+
+    def get_all_key_combinations(self, data):
+        '''Same as get_all_key_combinations() but without sorting the data
+        keys: only parents need to be looked at before their children.'''
+        combinations = set([()])
+        by_length = {}
+        for key in data:
+            by_length.setdefault(len(key), []).append(key)
+
+        for length in sorted(by_length):
+            for key in by_length[length]:
+                if key[:-1:2] not in self.schema_prefixes:
+                    continue
+                if key[:-3] not in combinations:
+                    continue
+                combinations.add(key[:-1])
+
+        return combinations
+
+    def make_full_schema(self, schema, key_combinations):
+        full_schema = {}
+        sub_schemas = {}
+        for combination in key_combinations:
+            prefix = combination[::2]
+            sub_schema = sub_schemas.get(prefix)
+            if sub_schema is None:
+                sub_schema = schema
+                for key in prefix:
+                    sub_schema = sub_schema[key]
+                sub_schemas[prefix] = sub_schema
+            for key in self.fields[prefix]:
+                full_schema[combination + (key,)] = sub_schema[key]
+        return full_schema
+
+    def augment_data(self, data, full_schema, key_combinations):
+        new_data = copy.copy(data)
+
+        ## fill junk and extras
+
+        for key, value in data.iteritems():
+            if key in full_schema:
+                continue
+
+            ## check if any thing naugthy is placed against subschemas
+            if key[::2] in self.initial_keys:
+                if value <> []:
+                    raise DataError('Only lists of dicts can be placed '
+                                    'against subschema %s, not %s' %
+                                    (key, type(value)))
+
+            if key[:-1] in key_combinations:
+                extras_key = key[:-1] + ('__extras',)
+                extras = new_data.get(extras_key, {})
+                extras[key[-1]] = value
+                new_data[extras_key] = extras
+            else:
+                junk = new_data.get(("__junk",), {})
+                junk[key] = value
+                new_data[("__junk",)] = junk
+            new_data.pop(key)
+
+        ## add missing
+
+        for key in full_schema:
+            if key not in new_data and not key[-1].startswith("__"):
+                new_data[key] = missing
+
+        return new_data
+
+    def run_order(self, key_combinations, phase):
+        '''Return the keys of the full schema to run in the given phase
+        ('before', 'main', 'extras' or 'after'), in the order of
+        flattened_order_key().'''
+        keys = []
+        for combination in sorted(key_combinations, key=flattened_order_key):
+            for field in self.phases[combination[::2]][phase]:
+                keys.append(combination + (field,))
+        return keys
+
+
+def _schema_shape(schema):
+    return frozenset((key, _schema_shape(value)) if isinstance(value, dict)
+                     else (key, isinstance(value, list))
+                     for key, value in schema.iteritems())
+
+_compiled_schemas = {}
+_COMPILED_SCHEMAS_MAX = 1000
+
+def compile_schema(schema):
+    '''Return the CompiledSchema for the given schema, reusing the one of any
+    earlier schema with the same keys and subschemas.'''
+    shape = _schema_shape(schema)
+    compiled = _compiled_schemas.get(shape)
+    if compiled is None:
+        compiled = CompiledSchema(schema)
+        if len(_compiled_schemas) >= _COMPILED_SCHEMAS_MAX:
+            _compiled_schemas.clear()
+        _compiled_schemas[shape] = compiled
+    return compiled
+
 def convert(converter, key, converted_data, errors, context):
 
     if inspect.isclass(converter) and issubclass(converter, fe.Validator):
@@ -271,56 +405,38 @@ def validate_flattened(data, schema, context=None):
     return converted_data, errors
 
 
+def _run_converters(converters, key, converted_data, errors, context):
+    for converter in converters:
+        try:
+            convert(converter, key, converted_data, errors, context)
+        except StopOnError:
+            break
+
+
 def _validate(data, schema, context):
     '''validate a flattened dict against a schema'''
-    converted_data = augment_data(data, schema)
-    full_schema = make_full_schema(data, schema)
+    compiled = compile_schema(schema)
+    key_combinations = compiled.get_all_key_combinations(data)
+    full_schema = compiled.make_full_schema(schema, key_combinations)
+    converted_data = compiled.augment_data(data, full_schema, key_combinations)
 
     errors = dict((key, []) for key in full_schema)
 
-    ## before run
-    for key in sorted(full_schema, key=flattened_order_key):
-        if key[-1] == '__before':
-            for converter in full_schema[key]:
-                try:
-                    convert(converter, key, converted_data, errors, context)
-                except StopOnError:
-                    break
-
-    ## main run
-    for key in sorted(full_schema, key=flattened_order_key):
-        if not key[-1].startswith('__'):
-            for converter in full_schema[key]:
-                try:
-                    convert(converter, key, converted_data, errors, context)
-                except StopOnError:
-                    break
-
-    ## extras run
-    for key in sorted(full_schema, key=flattened_order_key):
-        if key[-1] == '__extras':
-            for converter in full_schema[key]:
-                try:
-                    convert(converter, key, converted_data, errors, context)
-                except StopOnError:
-                    break
+    ## before, main and extras runs
+    for phase in ('before', 'main', 'extras'):
+        for key in compiled.run_order(key_combinations, phase):
+            _run_converters(full_schema[key], key, converted_data, errors,
+                            context)
 
     ## after run
-    for key in reversed(sorted(full_schema, key=flattened_order_key)):
-        if key[-1] == '__after':
-            for converter in full_schema[key]:
-                try:
-                    convert(converter, key, converted_data, errors, context)
-                except StopOnError:
-                    break
+    for key in reversed(compiled.run_order(key_combinations, 'after')):
+        _run_converters(full_schema[key], key, converted_data, errors,
+                        context)
 
     ## junk
     if ('__junk',) in full_schema:
-        for converter in full_schema[('__junk',)]:
-            try:
-                convert(converter, ('__junk',), converted_data, errors, context)
-            except StopOnError:
-                break
+        _run_converters(full_schema[('__junk',)], ('__junk',),
+                        converted_data, errors, context)
 
     return converted_data, errors
 
@@ -0,0 +1,297 @@
+'''Profiles of live requests, taken by the ProfilingMiddleware.
+
+A fraction of requests (``ckan.profiling.sample_rate``) are profiled with
+cProfile. When ``ckan.profiling.slow_threshold`` is set, the stacks of the
+threads handling all the other requests are also sampled every
+``ckan.profiling.sample_interval`` milliseconds, and the requests that turn
+out slower than the threshold are kept with those stack samples. Profiles
+also record the SQL statements run and the templates rendered.
+
+The profiles are kept in a ProfileStore, a directory holding the most
+recent ``ckan.profiling.max_profiles`` of them, which ``paster profiling``
+lists and shows.
+
+'''
+import collections
+import cProfile
+import datetime
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+import ckan.lib.instrumentation as instrumentation
+import ckan.lib.util as util
+
+log = logging.getLogger(__name__)
+
+# limits on what is kept from each request
+MAX_SQL_STATEMENTS = 1000
+MAX_STACKS = 200
+MAX_STACK_DEPTH = 100
+
+_local = threading.local()
+
+
+def record_template(template_name, seconds):
+    '''Record the time taken to render a template, if the current request
+    is being profiled.'''
+    profile = getattr(_local, 'profile', None)
+    if profile is not None:
+        profile.templates.append((template_name, seconds * 1000))
+
+
+def _stack_key(frame):
+    '''Return the stack of the given frame, outermost call first, in the
+    "collapsed" format used by flame graph tools.'''
+    calls = []
+    while frame is not None and len(calls) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        calls.append('%s:%i(%s)' % (code.co_filename, code.co_firstlineno,
+                                    code.co_name))
+        frame = frame.f_back
+    return ';'.join(reversed(calls))
+
+
+class StackSampler(threading.Thread):
+    '''A thread that samples the stacks of the threads added to it every
+    `interval` seconds.'''
+    def __init__(self, interval):
+        super(StackSampler, self).__init__(name='ckan-stack-sampler')
+        self.daemon = True
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, thread_id):
+        with self.lock:
+            self.samples[thread_id] = collections.Counter()
+
+    def remove(self, thread_id):
+        '''Stop sampling a thread, and return a Counter of its stacks.'''
+        with self.lock:
+            return self.samples.pop(thread_id, None)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, samples in self.samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_stack_key(frame)] += 1
+
+
+class RequestProfile(object):
+    '''What is recorded while a request is handled.'''
+    def __init__(self, environ, sampled):
+        self.method = environ.get('REQUEST_METHOD')
+        self.url = environ.get('PATH_INFO', '')
+        if environ.get('QUERY_STRING'):
+            self.url += '?' + environ['QUERY_STRING']
+        self.sampled = sampled
+        self.status = None
+        self.time = None
+        self.sql = []
+        self.templates = []
+        self.stacks = None
+        self.profiler = cProfile.Profile() if sampled else None
+        self.thread_id = None
+        self.start = None
+
+    def start_recording(self, sampler):
+        self.start = time.time()
+        self.thread_id = threading.current_thread().ident
+        _local.profile = self
+        instrumentation.log_sql(self.sql)
+        if sampler is not None and not self.sampled:
+            sampler.add(self.thread_id)
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def stop_recording(self, sampler):
+        if self.profiler is not None:
+            self.profiler.disable()
+        if sampler is not None and not self.sampled:
+            self.stacks = sampler.remove(self.thread_id)
+        instrumentation.log_sql(None)
+        _local.profile = None
+        self.time = (time.time() - self.start) * 1000
+
+    def as_dict(self):
+        return {
+            'method': self.method,
+            'url': self.url,
+            'status': self.status,
+            'time': self.time,
+            'timestamp': self.start,
+            'reason': 'sampled' if self.sampled else 'slow',
+            'sql_count': len(self.sql),
+            'sql_time': sum(duration for statement, duration in self.sql),
+            'sql': [{'statement': statement, 'time': duration}
+                    for statement, duration in self.sql[:MAX_SQL_STATEMENTS]],
+            'templates': [{'template': template, 'time': duration}
+                          for template, duration in self.templates],
+            'stacks': (self.stacks.most_common(MAX_STACKS)
+                       if self.stacks else []),
+        }
+
+
+class ProfileStore(object):
+    '''A directory of request profiles, keeping only the `size` most recent
+    ones.
+
+    Each profile is a JSON file, with a cProfile stats file of the same
+    name (ending in ``.prof``) for the requests profiled with cProfile.
+
+    '''
+    def __init__(self, directory, size):
+        self.directory = directory
+        self.size = size
+
+    def _path(self, profile_id, extension):
+        return os.path.join(self.directory, profile_id + extension)
+
+    def _ids(self):
+        '''Return the ids of the stored profiles, oldest first.'''
+        paths = sorted(glob.glob(os.path.join(self.directory, '*.json')))
+        return [os.path.basename(path)[:-len('.json')] for path in paths]
+
+    def save(self, profile):
+        # ids sort by time
+        profile_id = '%s-%s' % (
+            datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S%f'),
+            uuid.uuid4().hex[:8])
+        profile_dict = profile.as_dict()
+        profile_dict['id'] = profile_id
+        if profile.profiler is not None:
+            profile.profiler.dump_stats(self._path(profile_id, '.prof'))
+        with open(self._path(profile_id, '.json'), 'w') as f:
+            json.dump(profile_dict, f)
+        self._trim()
+        return profile_id
+
+    def _trim(self):
+        ids = self._ids()
+        for profile_id in ids[:max(len(ids) - self.size, 0)]:
+            self.delete(profile_id)
+
+    def delete(self, profile_id):
+        for extension in ('.json', '.prof'):
+            try:
+                os.remove(self._path(profile_id, extension))
+            except OSError:
+                # not there, or already removed by another process
+                pass
+
+    def list(self):
+        '''Return the stored profiles, most recent first.'''
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            profile = self.get(profile_id)
+            if profile is not None:
+                profiles.append(profile)
+        return profiles
+
+    def get(self, profile_id):
+        try:
+            with open(self._path(profile_id, '.json')) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def stats_path(self, profile_id):
+        '''Return the path of the cProfile stats of a profile, or None if it
+        has none.'''
+        path = self._path(profile_id, '.prof')
+        return path if os.path.exists(path) else None
+
+    def clear(self):
+        for profile_id in self._ids():
+            self.delete(profile_id)
+
+
+def get_store(config):
+    directory = config.get('ckan.profiling.directory')
+    if not directory:
+        # not the temporary directory, where anyone could write the stats
+        # that are loaded
+        if not config.get('cache_dir'):
+            raise Exception('Profiling needs ckan.profiling.directory or '
+                            'cache_dir to be set')
+        directory = os.path.join(config['cache_dir'], 'profiles')
+    util.make_private_directory(directory)
+    return ProfileStore(directory,
+                        int(config.get('ckan.profiling.max_profiles', 100)))
+
+
+class ProfilingMiddleware(object):
+    '''Profile a random sample of requests, and keep the profiles of requests
+    that are slower than a threshold.'''
+    def __init__(self, app, config):
+        self.app = app
+        self.sample_rate = float(config.get('ckan.profiling.sample_rate', 0))
+        self.slow_threshold = float(
+            config.get('ckan.profiling.slow_threshold', 0))
+        self.store = get_store(config)
+        self.sampler = None
+        if self.slow_threshold:
+            interval = float(config.get('ckan.profiling.sample_interval', 10))
+            self.sampler = StackSampler(interval / 1000)
+            self.sampler.start()
+
+    def __call__(self, environ, start_response):
+        sampled = random.random() < self.sample_rate
+        if not (sampled or self.slow_threshold):
+            return self.app(environ, start_response)
+
+        profile = RequestProfile(environ, sampled)
+
+        def profiling_start_response(status, headers, exc_info=None):
+            profile.status = status
+            return start_response(status, headers, exc_info)
+
+        profile.start_recording(self.sampler)
+        try:
+            app_iter = self.app(environ, profiling_start_response)
+        except:
+            self._finish(profile)
+            raise
+        # keep recording until the response has been sent
+        return ProfiledResponse(app_iter, lambda: self._finish(profile))
+
+    def _finish(self, profile):
+        profile.stop_recording(self.sampler)
+        if profile.sampled or profile.time >= self.slow_threshold:
+            try:
+                profile_id = self.store.save(profile)
+            except Exception, e:
+                # profiling must never break the site
+                log.exception(e)
+            else:
+                log.info('Profiled %s %s (%.0f ms) as %s', profile.method,
+                         profile.url, profile.time, profile_id)
+
+
+class ProfiledResponse(object):
+    '''Wraps the response of an application, calling `on_close` once it has
+    been sent.'''
+    def __init__(self, app_iter, on_close):
+        self.app_iter = app_iter
+        self.on_close = on_close
+
+    def __iter__(self):
+        return iter(self.app_iter)
+
+    def close(self):
+        try:
+            if hasattr(self.app_iter, 'close'):
+                self.app_iter.close()
+        finally:
+            self.on_close()
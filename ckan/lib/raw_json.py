@@ -0,0 +1,45 @@
+'''JSON text that is put into JSON responses as it is.
+
+Action functions can return a ``RawJSON`` in their results when they already
+have part of their result as JSON text, for example one rendered by the
+database. The API puts its text into the response with ``dumps()``, without
+parsing it and encoding it again.
+
+'''
+import uuid
+
+from ckan.common import json
+
+
+class RawJSON(object):
+    '''JSON text that ``dumps()`` puts into its output unchanged.'''
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return '<RawJSON %s>' % self.text[:50]
+
+    def loads(self):
+        '''Return the value that the JSON text encodes.'''
+        return json.loads(self.text)
+
+
+def dumps(obj, **kwargs):
+    '''Like ``json.dumps()``, but puts the text of any ``RawJSON`` in `obj`
+    into the output as it is.'''
+    fragments = []
+    # a token that can't be in the rest of the output, other than where
+    # default() put it
+    token = uuid.uuid4().hex
+
+    def default(value):
+        if isinstance(value, RawJSON):
+            fragments.append(value.text)
+            return '%s-%i' % (token, len(fragments) - 1)
+        raise TypeError('%r is not JSON serializable' % value)
+
+    output = json.dumps(obj, default=default, **kwargs)
+    for i, text in enumerate(fragments):
+        output = output.replace('"%s-%i"' % (token, i), text, 1)
+    return output
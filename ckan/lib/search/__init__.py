@@ -1,6 +1,7 @@
 import logging
 import sys
 import cgitb
+import threading
 import warnings
 import xml.dom.minidom
 import urllib2
@@ -13,7 +14,9 @@ import ckan.plugins as p
 import ckan.logic as logic
 
 from common import (SearchIndexError, SearchError, SearchQueryError,
-                    make_connection, is_available, SolrSettings)
+                    make_connection, is_available, SolrSettings,
+                    get_facet_snapshot, set_facet_snapshot,
+                    clear_facet_snapshots)
 from index import PackageSearchIndex, NoopSearchIndex
 from query import (TagSearchQuery, ResourceSearchQuery, PackageSearchQuery,
                    QueryOptions, convert_legacy_parameters_to_solr)
@@ -112,6 +115,37 @@ def dispatch_by_operation(entity_type, entity, operation):
         raise
 
 
+_deferred_indexing = threading.local()
+
+
+def defer_indexing(defer=True):
+    '''Stop indexing datasets as they are committed by this thread, or start
+    again if `defer` is False.
+
+    While indexing is deferred the datasets are only remembered, and
+    index_deferred() indexes them all at once.
+
+    '''
+    _deferred_indexing.package_ids = set() if defer else None
+
+
+def index_deferred():
+    '''Index the datasets committed since defer_indexing() was called with a
+    single request to the search engine, and start indexing datasets as they
+    are committed again.'''
+    package_ids = getattr(_deferred_indexing, 'package_ids', None)
+    defer_indexing(False)
+    if not package_ids:
+        return
+
+    context = {'model': model, 'ignore_auth': True, 'validate': False,
+               'use_cache': False}
+    pkg_dicts = [logic.get_action('package_show')(dict(context),
+                                                  {'id': package_id})
+                 for package_id in package_ids]
+    index_for(model.Package).update_dicts(pkg_dicts)
+
+
 class SynchronousSearchPlugin(p.SingletonPlugin):
     """Update the search index automatically."""
     p.implements(p.IDomainObjectModification, inherit=True)
@@ -119,6 +153,11 @@ class SynchronousSearchPlugin(p.SingletonPlugin):
     def notify(self, entity, operation):
         if not isinstance(entity, model.Package):
             return
+        deferred = getattr(_deferred_indexing, 'package_ids', None)
+        if (deferred is not None and
+                operation != model.domain_object.DomainObjectOperation.deleted):
+            deferred.add(entity.id)
+            return
         if operation != model.domain_object.DomainObjectOperation.deleted:
             dispatch_by_operation(
                 entity.__class__.__name__,
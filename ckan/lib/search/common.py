@@ -1,5 +1,7 @@
-from pylons import config
+import time
 import logging
+
+from pylons import config
 log = logging.getLogger(__name__)
 
 
@@ -68,3 +70,29 @@ def make_connection():
                               http_pass=solr_password)
     else:
         return SolrConnection(solr_url)
+
+
+# Snapshots of facet queries that are expensive to run and where slightly
+# stale results are acceptable (e.g. the dataset counts of every group).
+# They are dropped whenever this process writes to the index.
+_facet_snapshots = {}
+
+
+def get_facet_snapshot(key, ttl):
+    '''Return the facets stored under `key` if younger than `ttl` seconds,
+    otherwise None.'''
+    snapshot = _facet_snapshots.get(key)
+    if snapshot is None:
+        return None
+    created, facets = snapshot
+    if time.time() - created > ttl:
+        return None
+    return facets
+
+
+def set_facet_snapshot(key, facets):
+    _facet_snapshots[key] = (time.time(), facets)
+
+
+def clear_facet_snapshots():
+    _facet_snapshots.clear()
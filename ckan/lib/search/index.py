@@ -13,13 +13,15 @@ import solr
 from pylons import config
 from paste.deploy.converters import asbool
 
-from common import SearchIndexError, make_connection
+from common import (SearchIndexError, make_connection,
+                    clear_facet_snapshots)
 from ckan.model import PackageRelationship
 import ckan.model as model
 from ckan.plugins import (PluginImplementations,
                           IPackageController)
 import ckan.logic as logic
 import ckan.lib.plugins as lib_plugins
+import ckan.lib.instrumentation as instrumentation
 import ckan.lib.navl.dictization_functions
 
 log = logging.getLogger(__name__)
@@ -53,6 +55,7 @@ def clear_index():
     try:
         conn.delete_query(query)
         conn.commit()
+        clear_facet_snapshots()
     except socket.error, e:
         err = 'Could not connect to SOLR %r: %r' % (conn.url, e)
         log.error(err)
@@ -83,6 +86,11 @@ class SearchIndex(object):
         """ Update data from a dictionary. """
         log.debug("NOOP Index: %s" % ",".join(data.keys()))
 
+    def update_dicts(self, data_dicts):
+        """ Update data from several dictionaries. """
+        for data in data_dicts:
+            self.update_dict(data)
+
     def remove_dict(self, data):
         """ Delete an index entry uniquely identified by ``data``. """
         log.debug("NOOP Delete: %s" % ",".join(data.keys()))
@@ -104,10 +112,55 @@ class PackageSearchIndex(SearchIndex):
     def update_dict(self, pkg_dict, defer_commit=False):
         self.index_package(pkg_dict, defer_commit)
 
+    def update_dicts(self, pkg_dicts, defer_commit=False):
+        self.index_packages(pkg_dicts, defer_commit)
+
     def index_package(self, pkg_dict, defer_commit=False):
         if pkg_dict is None:
             return
+        self.index_packages([pkg_dict], defer_commit)
+
+    def index_packages(self, pkg_dicts, defer_commit=False):
+        """ Index several datasets with a single request to Solr. """
+        docs = []
+        for pkg_dict in pkg_dicts:
+            doc = self._package_document(pkg_dict)
+            if doc is None:
+                # not active, so it shouldn't be in the index
+                self.delete_package(pkg_dict)
+            else:
+                docs.append(doc)
+        if not docs:
+            return
+
+        # send to solr:
+        try:
+            conn = make_connection()
+            commit = not defer_commit
+            if not asbool(config.get('ckan.search.solr_commit', 'true')):
+                commit = False
+            with instrumentation.solr_request():
+                conn.add_many(docs, _commit=commit)
+            clear_facet_snapshots()
+        except solr.core.SolrException, e:
+            msg = 'Solr returned an error: {0} {1} - {2}'.format(
+                e.httpcode, e.reason, e.body[:1000] # limit huge responses
+            )
+            raise SearchIndexError(msg)
+        except socket.error, e:
+            err = 'Could not connect to Solr using {0}: {1}'.format(conn.url, str(e))
+            log.error(err)
+            raise SearchIndexError(err)
+        finally:
+            conn.close()
 
+        commit_debug_msg = 'Not commited yet' if defer_commit else 'Commited'
+        log.debug('Updated index for %s [%s]' % (
+            ', '.join(doc.get('name') for doc in docs), commit_debug_msg))
+
+    def _package_document(self, pkg_dict):
+        """ Return the Solr document for a dataset, or None if the dataset
+        is not active. """
         if config.get('ckan.cache_validated_datasets', True):
             package_plugin = lib_plugins.lookup_package_plugin(
                 pkg_dict.get('type'))
@@ -126,7 +179,7 @@ class PackageSearchIndex(SearchIndex):
             pkg_dict['title_string'] = title
 
         if (not pkg_dict.get('state')) or ('active' not in pkg_dict.get('state')):
-            return self.delete_package(pkg_dict)
+            return None
 
         index_fields = RESERVED_FIELDS + pkg_dict.keys()
 
@@ -270,32 +323,13 @@ class PackageSearchIndex(SearchIndex):
 
         assert pkg_dict, 'Plugin must return non empty package dict on index'
 
-        # send to solr:
-        try:
-            conn = make_connection()
-            commit = not defer_commit
-            if not asbool(config.get('ckan.search.solr_commit', 'true')):
-                commit = False
-            conn.add_many([pkg_dict], _commit=commit)
-        except solr.core.SolrException, e:
-            msg = 'Solr returned an error: {0} {1} - {2}'.format(
-                e.httpcode, e.reason, e.body[:1000] # limit huge responses
-            )
-            raise SearchIndexError(msg)
-        except socket.error, e:
-            err = 'Could not connect to Solr using {0}: {1}'.format(conn.url, str(e))
-            log.error(err)
-            raise SearchIndexError(err)
-        finally:
-            conn.close()
-
-        commit_debug_msg = 'Not commited yet' if defer_commit else 'Commited'
-        log.debug('Updated index for %s [%s]' % (pkg_dict.get('name'), commit_debug_msg))
+        return pkg_dict
 
     def commit(self):
         try:
             conn = make_connection()
-            conn.commit(wait_searcher=False)
+            with instrumentation.solr_request():
+                conn.commit(wait_searcher=False)
         except Exception, e:
             log.exception(e)
             raise SearchIndexError(e)
@@ -309,9 +343,11 @@ class PackageSearchIndex(SearchIndex):
                                                        pkg_dict.get('id'), pkg_dict.get('id'),
                                                        config.get('ckan.site_id'))
         try:
-            conn.delete_query(query)
-            if asbool(config.get('ckan.search.solr_commit', 'true')):
-                conn.commit()
+            with instrumentation.solr_request():
+                conn.delete_query(query)
+                if asbool(config.get('ckan.search.solr_commit', 'true')):
+                    conn.commit()
+            clear_facet_snapshots()
         except Exception, e:
             log.exception(e)
             raise SearchIndexError(e)
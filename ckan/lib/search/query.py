@@ -10,11 +10,10 @@ from ckan.common import json
 from ckan.lib.search.common import make_connection, SearchError, SearchQueryError
 import ckan.logic as logic
 import ckan.model as model
+import ckan.lib.instrumentation as instrumentation
 
 log = logging.getLogger(__name__)
 
-_open_licenses = None
-
 VALID_SOLR_PARAMETERS = set([
     'q', 'fl', 'fq', 'rows', 'sort', 'start', 'wt', 'qf', 'bf', 'boost',
     'facet', 'facet.mincount', 'facet.limit', 'facet.field',
@@ -136,16 +135,7 @@ class SearchQuery(object):
 
     @property
     def open_licenses(self):
-        # this isn't exactly the very best place to put these, but they stay
-        # there persistently.
-        # TODO: figure out if they change during run-time.
-        global _open_licenses
-        if not isinstance(_open_licenses, list):
-            _open_licenses = []
-            for license in model.Package.get_license_register().values():
-                if license and license.isopen():
-                    _open_licenses.append(license.id)
-        return _open_licenses
+        return list(model.Package.get_license_register().open_license_ids)
 
     def get_all_entity_ids(self, max_results=1000):
         """
@@ -255,7 +245,9 @@ class PackageSearchQuery(SearchQuery):
 
         conn = make_connection()
         try:
-            data = conn.query(query, fq=fq, rows=max_results, fields='id')
+            with instrumentation.solr_request():
+                data = conn.query(query, fq=fq, rows=max_results,
+                                  fields='id')
         finally:
             conn.close()
 
@@ -271,7 +263,8 @@ class PackageSearchQuery(SearchQuery):
         conn = make_connection()
         log.debug('Package query: %r' % query)
         try:
-            solr_response = conn.raw_query(**query)
+            with instrumentation.solr_request():
+                solr_response = conn.raw_query(**query)
         except SolrException, e:
             raise SearchError('SOLR returned an error running query: %r Error: %r' %
                               (query, e.reason))
@@ -358,7 +351,8 @@ class PackageSearchQuery(SearchQuery):
         conn = make_connection()
         log.debug('Package query: %r' % query)
         try:
-            solr_response = conn.raw_query(**query)
+            with instrumentation.solr_request():
+                solr_response = conn.raw_query(**query)
         except SolrException, e:
             raise SearchError('SOLR returned an error running query: %r Error: %r' %
                               (query, e.reason))
@@ -0,0 +1,136 @@
+'''A snapshot of the site's statistics (numbers of datasets, groups, users
+and so on), shown on the front page and returned by the
+``site_statistics`` action.
+
+Counting everything takes a search and several SQL queries, so the counts
+are kept in the ``system_info`` table, where all of the site's processes
+share them, and in memory. They are counted again when they are older than
+``ckan.site_statistics.ttl`` seconds.
+
+'''
+import copy
+import datetime
+import json
+import logging
+import time
+
+from pylons import config
+import sqlalchemy
+
+log = logging.getLogger(__name__)
+
+SYSTEM_INFO_KEY = 'ckan.site_statistics'
+
+RELATED_COUNT_SQL = '''
+    SELECT count(*) FROM related r
+    LEFT JOIN related_dataset rd ON r.id = rd.related_id
+    WHERE rd.status = 'active' OR rd.id IS NULL'''
+
+_snapshot = None
+
+
+def count():
+    '''Count everything, returning the statistics.'''
+    # have to import here to avoid circular imports
+    import ckan.model as model
+    import ckan.logic as logic
+
+    def count_groups(is_organization):
+        query = model.Session.query(sqlalchemy.func.count(model.Group.id))
+        query = query.filter(model.Group.state == 'active')
+        query = query.filter(model.Group.is_organization == is_organization)
+        return query.scalar()
+
+    # the public, active datasets
+    dataset_count = logic.get_action('package_search')(
+        {}, {'rows': 0})['count']
+
+    query = model.Session.query(sqlalchemy.func.count(model.Resource.id))
+    query = query.join(model.ResourceGroup).join(model.Package)
+    query = query.filter(model.Resource.state == 'active')
+    query = query.filter(model.Package.state == 'active')
+    query = query.filter(sqlalchemy.not_(model.Package.private))
+    resource_count = query.scalar()
+
+    query = model.Session.query(sqlalchemy.func.count(model.User.id))
+    query = query.filter(model.User.state != 'deleted')
+    query = query.filter(model.User.name != config.get('ckan.site_id'))
+    user_count = query.scalar()
+
+    return {
+        'dataset_count': dataset_count,
+        'group_count': count_groups(False),
+        'organization_count': count_groups(True),
+        'resource_count': resource_count,
+        'user_count': user_count,
+        'related_count': model.Session.execute(RELATED_COUNT_SQL).scalar(),
+        'last_updated': datetime.datetime.utcnow().isoformat(),
+    }
+
+
+def _save(snapshot):
+    '''Save the snapshot in the system_info table.
+
+    This happens while a page is being rendered, so it is done on a
+    connection of its own rather than by committing the request's session,
+    which may have other changes pending.
+
+    '''
+    import ckan.model as model
+    table = model.system_info_table
+    value = json.dumps(snapshot)
+    try:
+        with model.meta.engine.begin() as connection:
+            updated = connection.execute(
+                table.update().where(table.c.key == SYSTEM_INFO_KEY)
+                .values(value=value)).rowcount
+            if not updated:
+                connection.execute(
+                    table.insert().values(key=SYSTEM_INFO_KEY, value=value))
+    except sqlalchemy.exc.IntegrityError:
+        # another process saved the first snapshot at the same time
+        pass
+
+
+def refresh():
+    '''Count everything and save the new snapshot, returning it.'''
+    global _snapshot
+    snapshot = {'time': time.time(), 'statistics': count()}
+    _save(snapshot)
+    _snapshot = snapshot
+    log.debug('Counted site statistics: %r', snapshot['statistics'])
+    return snapshot
+
+
+def _is_fresh(snapshot):
+    ttl = int(config.get('ckan.site_statistics.ttl', 600))
+    return snapshot is not None and time.time() - snapshot['time'] < ttl
+
+
+def get():
+    '''Return the site statistics, counting them again if the snapshot is
+    out of date.
+
+    :returns: the numbers of active datasets (``dataset_count``) and their
+        resources (``resource_count``), of groups, organizations, users and
+        related items, and when they were counted (``last_updated``)
+    :rtype: dictionary
+
+    '''
+    global _snapshot
+    import ckan.model as model
+    snapshot = _snapshot
+    if not _is_fresh(snapshot):
+        saved = model.get_system_info(SYSTEM_INFO_KEY)
+        snapshot = json.loads(saved) if saved else None
+        if _is_fresh(snapshot):
+            _snapshot = snapshot
+        else:
+            snapshot = refresh()
+    return copy.deepcopy(snapshot['statistics'])
+
+
+def clear():
+    '''Forget the snapshot held in memory.'''
+    global _snapshot
+    _snapshot = None
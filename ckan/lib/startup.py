@@ -0,0 +1,74 @@
+'''Timings of the phases of CKAN's startup, and the fast start mode.
+
+Each CKAN process logs how long it took to start, and how long each phase
+of its startup took, once its WSGI application has been made.
+
+When ``ckan.fast_start`` is on, the steps that need the network (checking
+the Solr schema version, fetching a remote license list) run in background
+threads, and the steps that can happen on first use (creating the site
+user) are left until then, so that new processes can serve requests sooner.
+
+'''
+import contextlib
+import logging
+import threading
+import time
+
+from paste.deploy.converters import asbool
+from pylons import config
+
+log = logging.getLogger(__name__)
+
+_timings = []
+
+
+@contextlib.contextmanager
+def phase(name):
+    '''Context manager timing a phase of the startup.'''
+    start = time.time()
+    try:
+        yield
+    finally:
+        _timings.append((name, (time.time() - start) * 1000))
+
+
+def fast_start():
+    return asbool(config.get('ckan.fast_start', False))
+
+
+def in_background(name, func):
+    '''Call `func()` in a daemon thread, logging any exception it raises.'''
+    def run():
+        start = time.time()
+        try:
+            func()
+        except Exception, e:
+            log.error('Startup step %s failed: %s', name, e)
+        else:
+            log.debug('Startup step %s took %.0f ms in the background',
+                      name, (time.time() - start) * 1000)
+        finally:
+            # have to import here to avoid circular imports
+            import ckan.model as model
+            model.Session.remove()
+    thread = threading.Thread(target=run, name='ckan-startup-%s' % name)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def get_timings():
+    '''Return the (phase name, milliseconds) of the phases timed so far.'''
+    return list(_timings)
+
+
+def reset():
+    del _timings[:]
+
+
+def report(total):
+    '''Log how long the startup took, `total` being in milliseconds.'''
+    timings = _timings + [('other', total - sum(t for n, t in _timings))]
+    log.info('CKAN started in %.0f ms%s: %s', total,
+             ' (fast start)' if fast_start() else '',
+             ', '.join('%s %.0f ms' % timing for timing in timings))
@@ -0,0 +1,63 @@
+import collections
+import logging
+
+from sqlalchemy.orm.session import SessionExtension
+
+logger = logging.getLogger(__name__)
+
+
+class UserStatsSessionExtension(SessionExtension):
+    """Session extension that keeps the user_stats counters up to date.
+
+    Creates the counters of new users, and watches for new Revisions and new
+    or deleted package admin roles being committed and increments the
+    number_of_edits and number_administered_packages counters of the users
+    concerned, so that user_list doesn't have to count them for every user.
+
+    """
+    def before_commit(self, session):
+        # have to import here to avoid circular imports
+        import ckan.model as model
+
+        session.flush()
+
+        try:
+            object_cache = session._object_cache
+        except AttributeError:
+            return
+
+        new_users = []
+        edits = collections.defaultdict(int)
+        administered = collections.defaultdict(int)
+        for delta, objs in ((1, object_cache['new']),
+                            (-1, object_cache['deleted'])):
+            for obj in objs:
+                if isinstance(obj, model.User):
+                    if delta > 0:
+                        new_users.append(obj.id)
+                elif isinstance(obj, model.Revision):
+                    if delta > 0 and obj.author:
+                        edits[obj.author] += delta
+                elif isinstance(obj, model.UserObjectRole):
+                    if (obj.context == 'Package' and obj.user_id and
+                            obj.role == model.Role.ADMIN):
+                        administered[obj.user_id] += delta
+
+        if not (new_users or edits or administered):
+            return
+
+        connection = session.connection()
+        # the stats rows of new users are created along with them, so that
+        # two transactions never both create the same row
+        if new_users:
+            model.UserStats.create(connection, new_users)
+        for author, delta in edits.items():
+            model.UserStats.increment(connection, 'number_of_edits', delta,
+                                      author=author)
+        for user_id, delta in administered.items():
+            if delta:
+                model.UserStats.increment(
+                    connection, 'number_administered_packages', delta,
+                    user_id=user_id)
+        logger.debug('Updated user stats for %i authors and %i admins',
+                     len(edits), len(administered))
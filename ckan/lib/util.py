@@ -4,6 +4,8 @@ Unlike :py:mod:`ckan.lib.helpers`, the functions in this module are not
 available to templates.
 
 '''
+import errno
+import os
 import subprocess
 
 
@@ -43,3 +45,25 @@ def check_output(*popenargs, **kwargs):
             cmd = popenargs[0]
         raise subprocess.CalledProcessError(retcode, cmd)
     return output
+
+
+def make_private_directory(directory):
+    '''Create `directory` so that only this process's user can use it, or
+    check that it is like that if it already exists, and return it.
+
+    For directories of files that are loaded back as code or marshalled
+    data, which no one else must be able to write. Raises an Exception if
+    the directory belongs to another user or others can write to it.
+
+    '''
+    try:
+        os.makedirs(directory, 0700)
+    except OSError, e:
+        # another process may have just created it
+        if e.errno != errno.EEXIST:
+            raise
+    stat = os.stat(directory)
+    if stat.st_uid != os.getuid() or stat.st_mode & 0022:
+        raise Exception('%s must belong to the user that CKAN runs as and '
+                        'not be writable by anyone else' % directory)
+    return directory
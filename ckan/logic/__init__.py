@@ -7,6 +7,7 @@ import formencode.validators
 
 import ckan.model as model
 import ckan.new_authz as new_authz
+import ckan.lib.instrumentation as instrumentation
 import ckan.lib.navl.dictization_functions as df
 import ckan.plugins as p
 
@@ -292,64 +293,26 @@ def check_access(action, context, data_dict=None):
     return True
 
 
+# the action functions, resolved on the first call of get_action()
 _actions = {}
-def clear_actions_cache():
-    _actions.clear()
-
-
-def get_action(action):
-    '''Return the named :py:mod:`ckan.logic.action` function.
-
-    For example ``get_action('package_create')`` will normally return the
-    :py:func:`ckan.logic.action.create.package_create()` function.
-
-    For documentation of the available action functions, see
-    :ref:`api-reference`.
-
-    You should always use ``get_action()`` instead of importing an action
-    function directly, because :py:class:`~ckan.plugins.interfaces.IActions`
-    plugins can override action functions, causing ``get_action()`` to return a
-    plugin-provided function instead of the default one.
-
-    Usage::
-
-        import ckan.plugins.toolkit as toolkit
-
-        # Call the package_create action function:
-        toolkit.get_action('package_create')(context, data_dict)
-
-    As the context parameter passed to an action function is commonly::
-
-        context = {'model': ckan.model, 'session': ckan.model.Session,
-                   'user': pylons.c.user or pylons.c.author}
+# the action functions wrapped by get_action(), wrapped as they are needed
+_wrapped_actions = {}
 
-    an action function returned by ``get_action()`` will automatically add
-    these parameters to the context if they are not defined.  This is
-    especially useful for plugins as they should not really be importing parts
-    of ckan eg :py:mod:`ckan.model` and as such do not have access to ``model``
-    or ``model.Session``.
 
-    If a ``context`` of ``None`` is passed to the action function then the
-    default context dict will be created.
-
-    :param action: name of the action function to return,
-        eg. ``'package_create'``
-    :type action: string
-
-    :returns: the named action function
-    :rtype: callable
+def clear_actions_cache():
+    _actions.clear()
+    _wrapped_actions.clear()
 
-    '''
 
-    if _actions:
-        if not action in _actions:
-            raise KeyError("Action '%s' not found" % action)
-        return _actions.get(action)
-    # Otherwise look in all the plugins to resolve all possible
+def _resolve_actions():
+    # Look in all the plugins to resolve all possible actions
     # First get the default ones in the ckan/logic/action directory
     # Rather than writing them out in full will use __import__
     # to load anything from ckan.logic.action that looks like it might
     # be an action
+    # Resolve them into a local dict so that other threads never see a
+    # partly resolved set of actions.
+    actions = {}
     for action_module_name in ['get', 'create', 'update', 'delete']:
         module_path = 'ckan.logic.action.' + action_module_name
         module = __import__(module_path)
@@ -362,7 +325,7 @@ def get_action(action):
                 if (hasattr(v, '__call__')
                         and (v.__module__ == module_path
                              or hasattr(v, '__replaced'))):
-                    _actions[k] = v
+                    actions[k] = v
 
                     # Whitelist all actions defined in logic/action/get.py as
                     # being side-effect free.
@@ -390,59 +353,120 @@ def get_action(action):
             auth_function.auth_audit_exempt = True
             fetched_actions[name] = auth_function
     # Use the updated ones in preference to the originals.
-    _actions.update(fetched_actions)
-
-    # wrap the functions
-    for action_name, _action in _actions.items():
-        def make_wrapped(_action, action_name):
-            def wrapped(context=None, data_dict=None, **kw):
-                if kw:
-                    log.critical('%s was passed extra keywords %r'
-                                 % (_action.__name__, kw))
-
-                context = _prepopulate_context(context)
-
-                # Auth Auditing
-                # store this action name in the auth audit so we can see if
-                # check access was called on the function we store the id of
-                # the action incase the action is wrapped inside an action
-                # of the same name.  this happens in the datastore
-                context.setdefault('__auth_audit', [])
-                context['__auth_audit'].append((action_name, id(_action)))
-
-                # check_access(action_name, context, data_dict=None)
+    actions.update(fetched_actions)
+    _actions.update(actions)
+
+
+def _wrap_action(_action, action_name):
+    # If we have been called multiple times for example during tests then
+    # we need to make sure that we do not rewrap the actions.
+    if hasattr(_action, '__replaced'):
+        return _action.__replaced
+
+    def make_wrapped(_action, action_name):
+        def wrapped(context=None, data_dict=None, **kw):
+            if kw:
+                log.critical('%s was passed extra keywords %r'
+                             % (_action.__name__, kw))
+
+            context = _prepopulate_context(context)
+
+            # Auth Auditing
+            # store this action name in the auth audit so we can see if
+            # check access was called on the function we store the id of
+            # the action incase the action is wrapped inside an action
+            # of the same name.  this happens in the datastore
+            context.setdefault('__auth_audit', [])
+            context['__auth_audit'].append((action_name, id(_action)))
+
+            # check_access(action_name, context, data_dict=None)
+            timing = instrumentation.start_action(action_name)
+            try:
                 result = _action(context, data_dict, **kw)
-                try:
-                    audit = context['__auth_audit'][-1]
-                    if audit[0] == action_name and audit[1] == id(_action):
-                        if action_name not in new_authz.auth_functions_list():
-                            log.debug('No auth function for %s' % action_name)
-                        elif not getattr(_action, 'auth_audit_exempt', False):
-                            raise Exception(
-                                'Action function {0} did not call its auth function'
-                                .format(action_name))
-                        # remove from audit stack
-                        context['__auth_audit'].pop()
-                except IndexError:
-                    pass
-                return result
-            return wrapped
+            finally:
+                if timing:
+                    instrumentation.finish_action(timing)
+            try:
+                audit = context['__auth_audit'][-1]
+                if audit[0] == action_name and audit[1] == id(_action):
+                    if action_name not in new_authz.auth_functions_list():
+                        log.debug('No auth function for %s' % action_name)
+                    elif not getattr(_action, 'auth_audit_exempt', False):
+                        raise Exception(
+                            'Action function {0} did not call its auth function'
+                            .format(action_name))
+                    # remove from audit stack
+                    context['__auth_audit'].pop()
+            except IndexError:
+                pass
+            return result
+        return wrapped
+
+    fn = make_wrapped(_action, action_name)
+    # we need to mirror the docstring
+    fn.__doc__ = _action.__doc__
+    # we need to retain the side effect free behaviour
+    if getattr(_action, 'side_effect_free', False):
+        fn.side_effect_free = True
+    return fn
 
-        # If we have been called multiple times for example during tests then
-        # we need to make sure that we do not rewrap the actions.
-        if hasattr(_action, '__replaced'):
-            _actions[action_name] = _action.__replaced
-            continue
 
-        fn = make_wrapped(_action, action_name)
-        # we need to mirror the docstring
-        fn.__doc__ = _action.__doc__
-        # we need to retain the side effect free behaviour
-        if getattr(_action, 'side_effect_free', False):
-            fn.side_effect_free = True
-        _actions[action_name] = fn
+def get_action(action):
+    '''Return the named :py:mod:`ckan.logic.action` function.
+
+    For example ``get_action('package_create')`` will normally return the
+    :py:func:`ckan.logic.action.create.package_create()` function.
+
+    For documentation of the available action functions, see
+    :ref:`api-reference`.
+
+    You should always use ``get_action()`` instead of importing an action
+    function directly, because :py:class:`~ckan.plugins.interfaces.IActions`
+    plugins can override action functions, causing ``get_action()`` to return a
+    plugin-provided function instead of the default one.
+
+    Usage::
+
+        import ckan.plugins.toolkit as toolkit
+
+        # Call the package_create action function:
+        toolkit.get_action('package_create')(context, data_dict)
+
+    As the context parameter passed to an action function is commonly::
+
+        context = {'model': ckan.model, 'session': ckan.model.Session,
+                   'user': pylons.c.user or pylons.c.author}
+
+    an action function returned by ``get_action()`` will automatically add
+    these parameters to the context if they are not defined.  This is
+    especially useful for plugins as they should not really be importing parts
+    of ckan eg :py:mod:`ckan.model` and as such do not have access to ``model``
+    or ``model.Session``.
+
+    If a ``context`` of ``None`` is passed to the action function then the
+    default context dict will be created.
+
+    :param action: name of the action function to return,
+        eg. ``'package_create'``
+    :type action: string
+
+    :returns: the named action function
+    :rtype: callable
+
+    '''
 
-    return _actions.get(action)
+    fn = _wrapped_actions.get(action)
+    if fn is not None:
+        return fn
+    if not _actions:
+        _resolve_actions()
+    if not action in _actions:
+        raise KeyError("Action '%s' not found" % action)
+    # wrapping every action up front slows down startup, so they are
+    # wrapped on their first use
+    fn = _wrap_action(_actions[action], action)
+    _wrapped_actions[action] = fn
+    return fn
 
 
 def get_or_bust(data_dict, keys):
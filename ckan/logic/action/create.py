@@ -27,6 +27,8 @@ from ckan.common import _
 
 # FIXME this looks nasty and should be shared better
 from ckan.logic.action.update import _update_package_relationship
+from ckan.logic.action.update import _save_resource
+from ckan.logic.action.update import _write_packages
 
 log = logging.getLogger(__name__)
 
@@ -160,12 +162,15 @@ def package_create(context, data_dict):
         model.Session.rollback()
         raise ValidationError(errors)
 
-    rev = model.repo.new_revision()
-    rev.author = user
-    if 'message' in context:
-        rev.message = context['message']
-    else:
-        rev.message = _(u'REST API: Create object %s') % data.get("name")
+    # package_create_many() and package_update_many() save all their
+    # datasets in one revision
+    if 'revision' not in context:
+        rev = model.repo.new_revision()
+        rev.author = user
+        if 'message' in context:
+            rev.message = context['message']
+        else:
+            rev.message = _(u'REST API: Create object %s') % data.get("name")
 
     admins = []
     if user:
@@ -213,6 +218,36 @@ def package_create(context, data_dict):
     return output
 
 
+def package_create_many(context, data_dict):
+    '''Create several datasets at once.
+
+    Each dataset is validated and saved as by
+    :py:func:`~ckan.logic.action.create.package_create`, but they are all
+    saved in a single transaction and revision and added to the search index
+    together once they have all been saved. A dataset that fails to be
+    created doesn't stop the others from being created, its error is
+    returned instead.
+
+    :param datasets: the datasets to create, each a dictionary of the
+        parameters of :py:func:`~ckan.logic.action.create.package_create`
+    :type datasets: list of dictionaries
+
+    :returns: one dictionary per dataset, in the order given, with a
+        ``'success'`` key and either the id of the new dataset as
+        ``'result'`` or the errors as ``'error'``. If ``'return_id_only'``
+        is ``False`` in the context the ``'result'`` is the whole dataset
+        instead of its id.
+    :rtype: list of dictionaries
+
+    '''
+    datasets = _get_or_bust(data_dict, 'datasets')
+
+    _check_access('package_create_many', context, data_dict)
+
+    return _write_packages(context, datasets, 'package_create',
+                           _(u'REST API: Create %i objects') % len(datasets))
+
+
 def resource_create(context, data_dict):
     '''Appends a new resource to a datasets list of resources.
 
@@ -264,37 +299,51 @@ def resource_create(context, data_dict):
     data_dict.pop('package_id')
     _get_or_bust(data_dict, 'url')
 
-    pkg_dict = _get_action('package_show')(context, {'id': package_id})
+    pkg = model.Package.get(package_id)
+    if pkg is None:
+        raise NotFound(_('Package was not found.'))
+    context['package'] = pkg
 
+    _check_access('package_show', context, {'id': pkg.id})
     _check_access('resource_create', context, data_dict)
+    _check_access('package_update', context, {'id': pkg.id})
 
-    if not 'resources' in pkg_dict:
-        pkg_dict['resources'] = []
+    # saving a resource with an id updates the resource with that id, which
+    # mustn't be a resource of a dataset that the user may not be able to
+    # update
+    if data_dict.get('id'):
+        existing = model.Session.query(model.Resource).get(data_dict['id'])
+        if existing is not None and existing.get_package_id() != pkg.id:
+            raise ValidationError({'id': [
+                _('Resource id already in use by another dataset')]})
 
     upload = uploader.ResourceUpload(data_dict)
 
-    pkg_dict['resources'].append(data_dict)
-
-    try:
-        context['defer_commit'] = True
-        context['use_cache'] = False
-        _get_action('package_update')(context, pkg_dict)
-        context.pop('defer_commit')
-    except ValidationError, e:
-        errors = e.error_dict['resources'][-1]
-        raise ValidationError(errors)
-
-    ## Get out resource_id resource from model as it will not appear in
-    ## package_show until after commit
-    upload.upload(context['package'].resources[-1].id,
-                  uploader.get_max_resource_size())
-    model.repo.commit()
+    resource = _save_resource(context, pkg, data_dict)
+    if resource is None:
+        pkg_dict = _get_action('package_show')(context, {'id': pkg.id})
+        if not 'resources' in pkg_dict:
+            pkg_dict['resources'] = []
+        pkg_dict['resources'].append(data_dict)
 
-    ##  Run package show again to get out actual last_resource
-    pkg_dict = _get_action('package_show')(context, {'id': package_id})
-    resource = pkg_dict['resources'][-1]
+        try:
+            context['defer_commit'] = True
+            context['use_cache'] = False
+            _get_action('package_update')(context, pkg_dict)
+            context.pop('defer_commit')
+        except ValidationError, e:
+            errors = e.error_dict['resources'][-1]
+            raise ValidationError(errors)
+
+        ## Get out resource_id resource from model as it will not appear in
+        ## package_show until after commit
+        resource = context['package'].resources[-1]
+
+    upload.upload(resource.id, uploader.get_max_resource_size())
+    if not context.get('defer_commit'):
+        model.repo.commit()
 
-    return resource
+    return _get_action('resource_show')(context, {'id': resource.id})
 
 
 def resource_view_create(context, data_dict):
@@ -356,6 +405,101 @@ def resource_view_create(context, data_dict):
     return model_dictize.resource_view_dictize(resource_view, context)
 
 
+def resource_view_create_many(context, data_dict):
+    '''Creates the same resource view for several resources at once.
+
+    The view is validated once, as by
+    :py:func:`~ckan.logic.action.create.resource_view_create`, and then
+    added to each resource with a single insert. Resources that already
+    have a view of this type are left out, so the same resources can be
+    given again after an interruption.
+
+    :param resource_ids: ids of the resources
+    :type resource_ids: list of strings
+    :param title: the title of the views
+    :type title: string
+    :param description: a description of the views (optional)
+    :type description: string
+    :param view_type: type of view
+    :type view_type: string
+    :param config: options necessary to recreate a view state (optional)
+    :type config: JSON string
+
+    :returns: the ids of the resources that views were created for
+    :rtype: list of strings
+
+    '''
+    model = context['model']
+    # a copy, as resource_id is removed from it and the plugin's schema added
+    schema = dict(context.get('schema') or
+                  ckan.logic.schema.default_create_resource_view_schema())
+    schema.pop('resource_id', None)
+
+    resource_ids = _get_or_bust(data_dict, 'resource_ids')
+    if not isinstance(resource_ids, list):
+        raise ValidationError({'resource_ids': [_('Must be a list')]})
+    view_type = _get_or_bust(data_dict, 'view_type')
+    view_plugin = datapreview.get_view_plugin(view_type)
+    if not view_plugin:
+        raise ValidationError(
+            {"view_type": "No plugin found for view_type {view_type}".format(
+                view_type=view_type
+            )}
+        )
+    plugin_schema = view_plugin.info().get('schema', {})
+    schema.update(plugin_schema)
+
+    view_dict = dict(data_dict)
+    del view_dict['resource_ids']
+    data, errors = _validate(view_dict, schema, context)
+    if errors:
+        model.Session.rollback()
+        raise ValidationError(errors)
+
+    _check_access('resource_view_create_many', context, data_dict)
+
+    resource_ids = set(resource_ids)
+    if not resource_ids:
+        return []
+    found = set(resource_id for resource_id, in model.Session.query(
+        model.Resource.id).filter(model.Resource.id.in_(resource_ids)))
+    if found != resource_ids:
+        raise ValidationError({'resource_ids': ['%s: %s %s' % (
+            _('Not found'), _('Resource'),
+            ', '.join(sorted(resource_ids - found)))]})
+
+    with_view = set(
+        resource_id for resource_id, in
+        model.Session.query(model.ResourceView.resource_id)
+        .filter(model.ResourceView.resource_id.in_(resource_ids))
+        .filter(model.ResourceView.view_type == data['view_type']))
+    max_orders = dict(
+        model.Session.query(model.ResourceView.resource_id,
+                            func.max(model.ResourceView.order))
+        .filter(model.ResourceView.resource_id.in_(resource_ids))
+        .group_by(model.ResourceView.resource_id))
+
+    columns = model.ResourceView.get_columns()
+    config = dict((key, value) for key, value in data.iteritems()
+                  if key not in columns)
+    rows = []
+    for resource_id in sorted(resource_ids - with_view):
+        max_order = max_orders.get(resource_id)
+        rows.append({
+            'resource_id': resource_id,
+            'title': data['title'],
+            'description': data.get('description'),
+            'view_type': data['view_type'],
+            'order': 0 if max_order is None else max_order + 1,
+            'config': config,
+        })
+    if rows:
+        model.Session.execute(model.resource_view_table.insert(), rows)
+    if not context.get('defer_commit'):
+        model.repo.commit()
+    return [row['resource_id'] for row in rows]
+
+
 def related_create(context, data_dict):
     '''Add a new related item to a dataset.
 
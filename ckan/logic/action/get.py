@@ -23,6 +23,10 @@ import ckan.lib.search as search
 import ckan.lib.plugins as lib_plugins
 import ckan.lib.activity_streams as activity_streams
 import ckan.lib.datapreview as datapreview
+import ckan.lib.autocomplete as autocomplete
+import ckan.lib.engines as engines
+import ckan.lib.instrumentation as instrumentation
+import ckan.lib.site_statistics as site_stats
 import ckan.new_authz as new_authz
 
 from ckan.common import _
@@ -186,8 +190,18 @@ def current_package_list_with_resources(context, data_dict):
     return search.get('results', [])
 
 
+@logic.validate(logic.schema.default_revision_list_schema)
 def revision_list(context, data_dict):
-    '''Return a list of the IDs of the site's revisions.
+    '''Return a list of the IDs of the site's revisions, oldest first.
+
+    :param since_id: only return the revisions after the revision with this
+        id, e.g. the last one of the previous page (optional)
+    :type since_id: string
+    :param since_time: only return the revisions made after this time, in
+        ISO format, e.g. ``2014-04-01T12:00:00`` (optional)
+    :type since_time: string
+    :param limit: return at most this many revisions (optional)
+    :type limit: int
 
     :rtype: list of strings
 
@@ -196,15 +210,38 @@ def revision_list(context, data_dict):
 
     _check_access('revision_list', context, data_dict)
 
-    revs = model.Session.query(model.Revision).all()
-    return [rev.id for rev in revs]
+    revision = model.revision_table
+    query = _select([revision.c.id])
+    since_id = data_dict.get('since_id')
+    if since_id:
+        since = model.Session.query(model.Revision).get(since_id)
+        if since is None:
+            raise NotFound(_('Revision not found'))
+        query = query.where(sqlalchemy.tuple_(
+            revision.c.timestamp, revision.c.id) >
+            sqlalchemy.tuple_(since.timestamp, since.id))
+    since_time = data_dict.get('since_time')
+    if since_time:
+        query = query.where(revision.c.timestamp > since_time)
+    query = query.order_by(revision.c.timestamp, revision.c.id)
+    limit = data_dict.get('limit')
+    if limit:
+        query = query.limit(limit)
+    return [row[0] for row in model.Session.execute(query)]
 
 
+@logic.validate(logic.schema.default_package_revision_list_schema)
 def package_revision_list(context, data_dict):
-    '''Return a dataset (package)'s revisions as a list of dictionaries.
+    '''Return a dataset (package)'s revisions as a list of dictionaries,
+    most recent first.
 
     :param id: the id or name of the dataset
     :type id: string
+    :param before_id: only return the revisions before the revision with
+        this id, e.g. the last one of the previous page (optional)
+    :type before_id: string
+    :param limit: return at most this many revisions (optional)
+    :type limit: int
 
     '''
     model = context["model"]
@@ -215,12 +252,12 @@ def package_revision_list(context, data_dict):
 
     _check_access('package_revision_list', context, data_dict)
 
-    revision_dicts = []
-    for revision, object_revisions in pkg.all_related_revisions:
-        revision_dicts.append(model.revision_as_dict(revision,
-                                                     include_packages=False,
-                                                     include_groups=False))
-    return revision_dicts
+    revisions = model.package_related_revisions(
+        pkg.id, before_id=data_dict.get('before_id'),
+        limit=data_dict.get('limit'))
+    return [model.revision_as_dict(revision, include_packages=False,
+                                   include_groups=False)
+            for revision in revisions]
 
 
 def related_show(context, data_dict=None):
@@ -389,15 +426,15 @@ def _group_or_org_list(context, data_dict, is_org=False):
                                                'package_count'],
                                total=1)
 
+    pagination = _validate_pagination(context, data_dict)
+    limit = pagination.get('limit')
+    offset = pagination.get('offset', 0)
+
     all_fields = data_dict.get('all_fields', None)
     include_extras = all_fields and \
                      asbool(data_dict.get('include_extras', False))
 
     query = model.Session.query(model.Group).join(model.GroupRevision)
-    if include_extras:
-        # this does an eager load of the extras, avoiding an sql query every
-        # time group_list_dictize accesses a group's extra.
-        query = query.options(sqlalchemy.orm.joinedload(model.Group._extras))
     query = query.filter(model.GroupRevision.state == 'active')
     query = query.filter(model.GroupRevision.current == True)
     if groups:
@@ -412,27 +449,61 @@ def _group_or_org_list(context, data_dict, is_org=False):
 
     query = query.filter(model.GroupRevision.is_organization == is_org)
 
-    groups = query.all()
-    if all_fields:
-        include_tags = asbool(data_dict.get('include_tags', False))
+    sort_field, sort_order = sort_info[0]
+    if sort_field == 'name':
+        # sort and paginate in the database so that only the groups being
+        # returned are loaded
+        order_by = model.Group.name
+        if sort_order == 'desc':
+            order_by = _desc(order_by)
+        query = query.order_by(order_by)
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        if not all_fields:
+            column = model.Group.id if ref_group_by == 'id' \
+                else model.Group.name
+            return [row[0] for row in query.with_entities(column)]
+        page_ids = None
     else:
-        include_tags = False
-    # even if we are not going to return all_fields, we need to dictize all the
-    # groups so that we can sort by any field.
+        # package counts live in the search index, so sort the ids on the
+        # cached facet counts and only load the requested page
+        dataset_counts = model_dictize.get_group_dataset_counts()
+        counts = dataset_counts['owner_org' if is_org else 'groups']
+        rows = query.with_entities(model.Group.id, model.Group.name).all()
+        rows.sort(key=lambda row: row[1])
+        rows.sort(key=lambda row: counts.get(row[0] if is_org else row[1], 0),
+                  reverse=sort_order == 'desc')
+        end = offset + limit if limit is not None else None
+        rows = rows[offset:end]
+        if not all_fields:
+            return [row[0] if ref_group_by == 'id' else row[1]
+                    for row in rows]
+        page_ids = [row[0] for row in rows]
+        if not page_ids:
+            return []
+        query = model.Session.query(model.Group).filter(
+            model.Group.id.in_(page_ids))
+
+    if include_extras:
+        # this does an eager load of the extras, avoiding an sql query every
+        # time group_list_dictize accesses a group's extra.
+        query = query.options(sqlalchemy.orm.joinedload(model.Group._extras))
+    groups = query.all()
+
+    if page_ids is None:
+        page_ids = [group.id for group in groups]
+    position = dict((group_id, i) for i, group_id in enumerate(page_ids))
     group_list = model_dictize.group_list_dictize(
         groups, context,
-        sort_key=lambda x: x[sort_info[0][0]],
-        reverse=sort_info[0][1] == 'desc',
-        with_package_counts=all_fields or
-        sort_info[0][0] in ('packages', 'package_count'),
+        sort_key=lambda x: position[x['id']],
+        with_package_counts=True,
         include_groups=asbool(data_dict.get('include_groups', False)),
-        include_tags=include_tags,
+        include_tags=asbool(data_dict.get('include_tags', False)),
         include_extras=include_extras,
         )
 
-    if not all_fields:
-        group_list = [group[ref_group_by] for group in group_list]
-
     return group_list
 
 
@@ -465,6 +536,13 @@ def group_list(context, data_dict):
     :param include_groups: if all_fields, include the groups the groups are in
         (optional, default: ``False``)
     :type include_groups: boolean
+    :param limit: if given, the list of groups will be broken into pages of
+        at most ``limit`` groups per page and only one page will be returned
+        at a time (optional)
+    :type limit: int
+    :param offset: when ``limit`` is given, the offset to start
+        returning groups from
+    :type offset: int
 
     :rtype: list of strings
 
@@ -504,6 +582,13 @@ def organization_list(context, data_dict):
     :param include_groups: if all_fields, include the groups the groups are in
         (optional, default: ``False``)
     :type all_fields: boolean
+    :param limit: if given, the list of organizations will be broken into
+        pages of at most ``limit`` organizations per page and only one page
+        will be returned at a time (optional)
+    :type limit: int
+    :param offset: when ``limit`` is given, the offset to start
+        returning organizations from
+    :type offset: int
 
     :rtype: list of strings
 
@@ -711,6 +796,13 @@ def tag_list(context, data_dict):
     :param all_fields: return full tag dictionaries instead of just names
         (optional, default: ``False``)
     :type all_fields: boolean
+    :param limit: if given, the list of tags will be broken into pages of
+        at most ``limit`` tags per page and only one page will be returned
+        at a time (optional)
+    :type limit: int
+    :param offset: when ``limit`` is given, the offset to start
+        returning tags from
+    :type offset: int
 
     :rtype: list of dictionaries
 
@@ -725,10 +817,17 @@ def tag_list(context, data_dict):
 
     _check_access('tag_list', context, data_dict)
 
+    data_dict = dict(data_dict, **_validate_pagination(context, data_dict))
+
     if query:
         tags, count = _tag_search(context, data_dict)
     else:
-        tags = model.Tag.all(vocab_id_or_name)
+        tags = model.Tag.all(vocab_id_or_name).order_by(model.Tag.name)
+        if data_dict.get('offset'):
+            tags = tags.offset(data_dict['offset'])
+        if data_dict.get('limit') is not None:
+            tags = tags.limit(data_dict['limit'])
+        tags = tags.all()
 
     if tags:
         if all_fields:
@@ -750,6 +849,13 @@ def user_list(context, data_dict):
     :param order_by: which field to sort the list by (optional, default:
       ``'name'``)
     :type order_by: string
+    :param limit: if given, the list of users will be broken into pages of
+        at most ``limit`` users per page and only one page will be returned
+        at a time (optional)
+    :type limit: int
+    :param offset: when ``limit`` is given, the offset to start
+        returning users from
+    :type offset: int
 
     :rtype: list of dictionaries
 
@@ -758,9 +864,16 @@ def user_list(context, data_dict):
 
     _check_access('user_list', context, data_dict)
 
+    pagination = _validate_pagination(context, data_dict)
+
     q = data_dict.get('q', '')
     order_by = data_dict.get('order_by', 'name')
 
+    # the edit and admin counts are maintained in user_stats as revisions and
+    # roles are committed, so this is a single query over user and user_stats
+    number_of_edits = _func.coalesce(model.UserStats.number_of_edits, 0)
+    number_administered_packages = _func.coalesce(
+        model.UserStats.number_administered_packages, 0)
     query = model.Session.query(
         model.User,
         model.User.name.label('name'),
@@ -768,28 +881,16 @@ def user_list(context, data_dict):
         model.User.about.label('about'),
         model.User.about.label('email'),
         model.User.created.label('created'),
-        _select([_func.count(model.Revision.id)],
-                _or_(
-                    model.Revision.author == model.User.name,
-                    model.Revision.author == model.User.openid
-                )).label('number_of_edits'),
-        _select([_func.count(model.UserObjectRole.id)],
-                _and_(
-                    model.UserObjectRole.user_id == model.User.id,
-                    model.UserObjectRole.context == 'Package',
-                    model.UserObjectRole.role == 'admin'
-                )).label('number_administered_packages')
-    )
+        number_of_edits.label('number_of_edits'),
+        number_administered_packages.label('number_administered_packages'),
+    ).outerjoin(model.UserStats,
+                model.UserStats.user_id == model.User.id)
 
     if q:
         query = model.User.search(q, query, user_name=context.get('user'))
 
     if order_by == 'edits':
-        query = query.order_by(_desc(
-            _select([_func.count(model.Revision.id)],
-                    _or_(
-                        model.Revision.author == model.User.name,
-                        model.Revision.author == model.User.openid))))
+        query = query.order_by(_desc(number_of_edits), model.User.name)
 
     else:
         query = query.order_by(
@@ -802,6 +903,11 @@ def user_list(context, data_dict):
     # Filter deleted users
     query = query.filter(model.User.state != model.State.DELETED)
 
+    if pagination.get('offset'):
+        query = query.offset(pagination['offset'])
+    if pagination.get('limit') is not None:
+        query = query.limit(pagination['limit'])
+
     ## hack for pagination
     if context.get('return_query'):
         return query
@@ -809,7 +915,10 @@ def user_list(context, data_dict):
     users_list = []
 
     for user in query.all():
-        result_dict = model_dictize.user_dictize(user[0], context)
+        result_dict = model_dictize.user_dictize(
+            user[0], context,
+            number_of_edits=user.number_of_edits,
+            number_administered_packages=user.number_administered_packages)
         users_list.append(result_dict)
 
     return users_list
@@ -1375,34 +1484,40 @@ def package_autocomplete(context, data_dict):
 
     limit = data_dict.get('limit', 10)
     q = data_dict['q']
+    q_lower = q.lower()
 
-    like_q = u"%s%%" % q
-
-    query = model.Session.query(model.PackageRevision)
-    query = query.filter(model.PackageRevision.state == 'active')
-    query = query.filter(model.PackageRevision.private == False)
-    query = query.filter(model.PackageRevision.current == True)
-    query = query.filter(_or_(model.PackageRevision.name.ilike(like_q),
-                              model.PackageRevision.title.ilike(like_q)))
-    query = query.limit(limit)
+    def search():
+        # this matches the lower(name) and lower(title) text_pattern_ops
+        # indexes, so only the datasets starting with the query are read
+        like_q = u'%s%%' % misc.escape_sql_like_special_characters(
+            q_lower, escape='\\')
+        query = model.Session.query(model.Package.name, model.Package.title)
+        query = query.filter(model.Package.state == 'active')
+        query = query.filter(model.Package.private == False)
+        query = query.filter(_or_(
+            _func.lower(model.Package.name).like(like_q, escape='\\'),
+            _func.lower(model.Package.title).like(like_q, escape='\\')))
+        query = query.order_by(model.Package.name)
+        query = query.limit(limit)
 
-    q_lower = q.lower()
-    pkg_list = []
-    for package in query:
-        if package.name.startswith(q_lower):
-            match_field = 'name'
-            match_displayed = package.name
-        else:
-            match_field = 'title'
-            match_displayed = '%s (%s)' % (package.title, package.name)
-        result_dict = {
-            'name': package.name,
-            'title': package.title,
-            'match_field': match_field,
-            'match_displayed': match_displayed}
-        pkg_list.append(result_dict)
+        pkg_list = []
+        for name, title in query:
+            if name.startswith(q_lower):
+                match_field = 'name'
+                match_displayed = name
+            else:
+                match_field = 'title'
+                match_displayed = '%s (%s)' % (title, name)
+            result_dict = {
+                'name': name,
+                'title': title,
+                'match_field': match_field,
+                'match_displayed': match_displayed}
+            pkg_list.append(result_dict)
+        return pkg_list
 
-    return pkg_list
+    return autocomplete.get_cached_results(
+        ('package', q_lower, limit), search)
 
 
 @logic.validate(logic.schema.default_autocomplete_schema)
@@ -1426,21 +1541,22 @@ def format_autocomplete(context, data_dict):
     q = data_dict['q']
     limit = data_dict.get('limit', 5)
 
-    like_q = u'%' + q + u'%'
-
-    query = (session.query(
-        model.ResourceRevision.format,
-        _func.count(model.ResourceRevision.format).label('total'))
-        .filter(_and_(
-            model.ResourceRevision.state == 'active',
-            model.ResourceRevision.current == True
-        ))
-        .filter(model.ResourceRevision.format.ilike(like_q))
-        .group_by(model.ResourceRevision.format)
-        .order_by('total DESC')
-        .limit(limit))
+    def search():
+        like_q = u'%%%s%%' % misc.escape_sql_like_special_characters(
+            q, escape='\\')
+        format_ = _func.lower(model.Resource.format)
+        query = (session.query(
+            format_.label('format'),
+            _func.count(model.Resource.id).label('total'))
+            .filter(model.Resource.state == 'active')
+            .filter(model.Resource.format.ilike(like_q, escape='\\'))
+            .group_by(format_)
+            .order_by('total DESC')
+            .limit(limit))
+        return [resource.format for resource in query]
 
-    return [resource.format.lower() for resource in query]
+    return autocomplete.get_cached_results(
+        ('format', q.lower(), limit), search)
 
 
 @logic.validate(logic.schema.default_autocomplete_schema)
@@ -1686,6 +1802,7 @@ def package_search(context, data_dict):
     }
 
     # Transform facets into a more useful data structure.
+    license_register = model.Package.get_license_register()
     restructured_facets = {}
     for key, value in facets.items():
         restructured_facets[key] = {
@@ -1702,7 +1819,7 @@ def package_search(context, data_dict):
                 else:
                     new_facet_dict['display_name'] = key_
             elif key == 'license_id':
-                license = model.Package.get_license_register().get(key_)
+                license = license_register.get(key_)
                 if license:
                     new_facet_dict['display_name'] = license.title
                 else:
@@ -2014,6 +2131,9 @@ def tag_autocomplete(context, data_dict):
     searched. If the ``vocabulary_id`` argument is given then only tags
     belonging to that vocabulary will be searched instead.
 
+    Tags starting with the string are returned first, the ones used by most
+    datasets first.
+
     :param query: the string to search for
     :type query: string
     :param vocabulary_id: the id or name of the tag vocabulary to search in
@@ -2030,12 +2150,39 @@ def tag_autocomplete(context, data_dict):
     :rtype: list of strings
 
     '''
+    model = context['model']
+
     _check_access('tag_autocomplete', context, data_dict)
-    matching_tags, count = _tag_search(context, data_dict)
-    if matching_tags:
+
+    pagination = _validate_pagination(context, data_dict)
+    data_dict = dict(data_dict, **pagination)
+    term = data_dict.get('query') or data_dict.get('q')
+    if (not isinstance(term, basestring) or not term.strip()
+            or data_dict.get('offset') or data_dict.get('fields')):
+        matching_tags, count = _tag_search(context, data_dict)
         return [tag.name for tag in matching_tags]
-    else:
-        return []
+
+    vocabulary_id = None
+    if 'vocabulary_id' in data_dict:
+        vocab = model.Vocabulary.get(_get_or_bust(data_dict, 'vocabulary_id'))
+        if not vocab:
+            raise NotFound
+        vocabulary_id = vocab.id
+
+    # the most popular tags starting with the term come from an in-memory
+    # index, the database is only searched for tags containing the term
+    # elsewhere if there aren't enough of them
+    limit = pagination.get('limit')
+    tag_names = autocomplete.get_tag_index(vocabulary_id).search(term.strip(),
+                                                                 limit)
+    if limit is None or len(tag_names) < limit:
+        if limit is not None:
+            data_dict['limit'] = limit + len(tag_names)
+        matching_tags, count = _tag_search(context, data_dict)
+        found = set(tag_names)
+        tag_names.extend(tag.name for tag in matching_tags
+                         if tag.name not in found)
+    return tag_names[:limit]
 
 
 def task_status_show(context, data_dict):
@@ -2238,6 +2385,73 @@ def status_show(context, data_dict):
     }
 
 
+def site_statistics(context, data_dict):
+    '''Return the numbers of datasets, resources, groups, organizations,
+    users and related items on the site.
+
+    The numbers come from a snapshot that is counted again every
+    ``ckan.site_statistics.ttl`` seconds, so they may be a little out of
+    date. Only public datasets (and their resources) are counted.
+
+    :returns: ``dataset_count``, ``resource_count``, ``group_count``,
+        ``organization_count``, ``user_count`` and ``related_count``, and
+        when they were counted as ``last_updated``
+    :rtype: dictionary
+
+    '''
+    _check_access('site_statistics', context, data_dict)
+    return site_stats.get()
+
+
+def status_metrics(context, data_dict):
+    '''Return the timings of the action functions called by this CKAN
+    process.
+
+    Only available if ``memory`` is one of the ``ckan.instrumentation.sinks``
+    in the config file, and only to sysadmins. When CKAN runs in several
+    processes, each of them keeps its own metrics.
+
+    The result has the upper bounds of the histogram buckets (in
+    milliseconds) as ``'buckets'``, and a dictionary for each action that
+    has been called as ``'actions'``. Each of those has the number of calls
+    (``'count'``), their total and maximum times (``'time'`` and
+    ``'max_time'``, in milliseconds), the total number and time of the SQL
+    statements and Solr requests that they made (``'sql_count'``,
+    ``'sql_time'``, ``'solr_count'`` and ``'solr_time'``) and the number of
+    calls that fell in each histogram bucket (``'histogram'``, with one
+    more bucket for slower calls).
+
+    :rtype: dictionary
+
+    '''
+    _check_access('status_metrics', context, data_dict)
+
+    metrics = instrumentation.get_metrics()
+    if metrics is None:
+        raise NotFound(_('The memory instrumentation sink is not enabled'))
+    return metrics
+
+
+def status_database_pools(context, data_dict):
+    '''Return the state of the pools of database connections of this CKAN
+    process.
+
+    There is one pool for the CKAN database and, with the DataStore, one for
+    each of its read and write URLs. Only available to sysadmins. When CKAN
+    runs in several processes, each of them has its own pools.
+
+    :returns: a dictionary for each database URL (with any password hidden)
+        with the class of its ``pool`` and, unless it is a ``NullPool``,
+        the ``size`` of the pool and the numbers of connections that are
+        ``checked_in`` (idle), ``checked_out`` (in use) and ``overflow``
+        (open beyond the size)
+    :rtype: dictionary
+
+    '''
+    _check_access('status_database_pools', context, data_dict)
+    return engines.pool_statistics()
+
+
 def vocabulary_list(context, data_dict):
     '''Return a list of all the site's tag vocabularies.
 
@@ -3200,6 +3414,18 @@ def dashboard_new_activities_count(context, data_dict):
     return len([activity for activity in activities if activity['is_new']])
 
 
+def _validate_pagination(context, data_dict):
+    '''Return the validated ``limit`` and ``offset`` of data_dict (the ones
+    that were given) or raise a ValidationError.'''
+    pagination, errors = _validate(
+        dict((key, data_dict[key]) for key in ('limit', 'offset')
+             if data_dict.get(key) not in (None, '')),
+        logic.schema.default_pagination_schema(), context)
+    if errors:
+        raise ValidationError(errors)
+    return pagination
+
+
 def _unpick_search(sort, allowed_fields=None, total=None):
     ''' This is a helper function that takes a sort string
     eg 'name asc, last_modified desc' and returns a list of
@@ -5,6 +5,7 @@ import datetime
 import json
 
 from pylons import config
+from sqlalchemy import func
 from vdm.sqlalchemy.base import SQLAlchemySession
 import paste.deploy.converters as converters
 
@@ -185,6 +186,75 @@ def related_update(context, data_dict):
 
 
 
+def _save_resource(context, pkg, data_dict):
+    '''Validate and save a single resource of a dataset, leaving the rest of
+    the dataset alone (package_update() validates and saves every resource).
+
+    The resource is validated against the resources part of the dataset
+    type's update schema and saved in a new revision. The dataset's
+    IPackageController plugins are called as they are by package_update(),
+    and the dataset is reindexed once, when the session is committed.
+
+    Returns the saved resource, or None if the dataset type's plugin checks
+    whole datasets itself (with ``validate()`` or ``check_data_dict()``), in
+    which case the resource has to be saved with package_update() instead.
+
+    '''
+    model = context['model']
+    session = context['session']
+    user = context['user']
+
+    package_plugin = lib_plugins.lookup_package_plugin(pkg.type)
+    if hasattr(package_plugin, 'validate') or (
+            'api_version' not in context and
+            hasattr(package_plugin, 'check_data_dict')):
+        return None
+
+    if 'schema' in context:
+        schema = context['schema']
+    else:
+        schema = package_plugin.update_package_schema()
+    resource_schema = schema.get('resources',
+                                 schema_.default_update_resource_schema())
+
+    data, errors = _validate(data_dict, resource_schema, context)
+    if errors:
+        model.Session.rollback()
+        raise ValidationError(errors)
+
+    rev = model.repo.new_revision()
+    rev.author = user
+    if 'message' in context:
+        rev.message = context['message']
+    else:
+        rev.message = _(u'REST API: Update object %s') % pkg.name
+
+    #avoid revisioning by updating directly
+    model.Session.query(model.Package).filter_by(id=pkg.id).update(
+        {"metadata_modified": datetime.datetime.utcnow()})
+    model.Session.refresh(pkg)
+
+    resource = model_save.resource_dict_save(data, context)
+    if resource.resource_group_id is None:
+        # a new resource goes after the others, without loading them
+        resource_group = pkg.resource_groups_all[0]
+        last_position = session.query(func.max(model.Resource.position)) \
+            .filter(model.Resource.resource_group_id == resource_group.id) \
+            .scalar()
+        resource.resource_group = resource_group
+        resource.position = 0 if last_position is None else last_position + 1
+    session.flush()
+
+    pkg_dict = model_dictize.package_dictize(pkg, context)
+    for item in plugins.PluginImplementations(plugins.IPackageController):
+        item.edit(pkg)
+
+        item.after_update(context, pkg_dict)
+
+    log.debug('Saved resource %s of dataset %s' % (resource.id, pkg.name))
+    return resource
+
+
 def resource_update(context, data_dict):
     '''Update a resource.
 
@@ -208,38 +278,42 @@ def resource_update(context, data_dict):
     resource = model.Resource.get(id)
     context["resource"] = resource
 
-    if not resource:
+    if not resource or resource.state == 'deleted':
         logging.error('Could not find resource ' + id)
         raise NotFound(_('Resource was not found.'))
 
     _check_access('resource_update', context, data_dict)
     del context["resource"]
 
-    package_id = resource.resource_group.package.id
-    pkg_dict = _get_action('package_show')(context, {'id': package_id})
-
-    for n, p in enumerate(pkg_dict['resources']):
-        if p['id'] == id:
-            break
-    else:
-        logging.error('Could not find resource ' + id)
-        raise NotFound(_('Resource was not found.'))
+    pkg = resource.resource_group.package
+    context['package'] = pkg
 
     upload = uploader.ResourceUpload(data_dict)
 
-    pkg_dict['resources'][n] = data_dict
+    if _save_resource(context, pkg, data_dict) is None:
+        pkg_dict = _get_action('package_show')(context, {'id': pkg.id})
 
-    try:
-        context['defer_commit'] = True
-        context['use_cache'] = False
-        pkg_dict = _get_action('package_update')(context, pkg_dict)
-        context.pop('defer_commit')
-    except ValidationError, e:
-        errors = e.error_dict['resources'][n]
-        raise ValidationError(errors)
+        for n, p in enumerate(pkg_dict['resources']):
+            if p['id'] == id:
+                break
+        else:
+            logging.error('Could not find resource ' + id)
+            raise NotFound(_('Resource was not found.'))
+
+        pkg_dict['resources'][n] = data_dict
+
+        try:
+            context['defer_commit'] = True
+            context['use_cache'] = False
+            _get_action('package_update')(context, pkg_dict)
+            context.pop('defer_commit')
+        except ValidationError, e:
+            errors = e.error_dict['resources'][n]
+            raise ValidationError(errors)
 
     upload.upload(id, uploader.get_max_resource_size())
-    model.repo.commit()
+    if not context.get('defer_commit'):
+        model.repo.commit()
     return _get_action('resource_show')(context, {'id': id})
 
 
@@ -402,12 +476,15 @@ def package_update(context, data_dict):
         model.Session.rollback()
         raise ValidationError(errors)
 
-    rev = model.repo.new_revision()
-    rev.author = user
-    if 'message' in context:
-        rev.message = context['message']
-    else:
-        rev.message = _(u'REST API: Update object %s') % data.get("name")
+    # package_create_many() and package_update_many() save all their
+    # datasets in one revision
+    if 'revision' not in context:
+        rev = model.repo.new_revision()
+        rev.author = user
+        if 'message' in context:
+            rev.message = context['message']
+        else:
+            rev.message = _(u'REST API: Update object %s') % data.get("name")
 
     #avoid revisioning by updating directly
     model.Session.query(model.Package).filter_by(id=pkg.id).update(
@@ -445,6 +522,117 @@ def package_update(context, data_dict):
 
     return output
 
+def _write_packages(context, datasets, action_name, message):
+    '''Call package_create() or package_update() for each of a list of
+    datasets, saving them all in one transaction and revision and indexing
+    them together at the end.
+
+    A dataset that can't be saved is rolled back on its own and reported
+    in the results instead, without aborting the others.
+
+    '''
+    model = context['model']
+    user = context['user']
+
+    if not isinstance(datasets, list):
+        raise ValidationError({'datasets': [_('Must be a list of datasets')]})
+
+    defer_commit = context.get('defer_commit', False)
+
+    rev = model.repo.new_revision()
+    rev.author = user
+    rev.message = context.get('message', message)
+
+    if not defer_commit:
+        search.defer_indexing()
+    try:
+        results = []
+        for dataset_dict in datasets:
+            dataset_context = context.copy()
+            dataset_context.update({'revision': rev, 'defer_commit': True,
+                                    'return_id_only': True})
+            savepoint = model.Session.begin_nested()
+            try:
+                package_id = _get_action(action_name)(dataset_context,
+                                                      dataset_dict)
+            except (ValidationError, NotFound, logic.NotAuthorized), e:
+                # a ValidationError has already rolled back to the savepoint
+                if model.Session().transaction is savepoint:
+                    model.Session.rollback()
+                results.append({'success': False,
+                                'error': _batch_error(e)})
+                continue
+            model.Session.commit()
+            results.append({'success': True, 'result': package_id})
+
+        if not defer_commit:
+            model.repo.commit()
+            search.index_deferred()
+    finally:
+        search.defer_indexing(False)
+
+    if not context.get('return_id_only', True):
+        show_context = {'model': model, 'session': model.Session,
+                        'user': user, 'ignore_auth': True}
+        for result in results:
+            if result['success']:
+                result['result'] = _get_action('package_show')(
+                    show_context.copy(), {'id': result['result']})
+
+    log.debug('%s: saved %i of %i datasets' % (
+        action_name, len([r for r in results if r['success']]),
+        len(results)))
+    return results
+
+
+def _batch_error(error):
+    '''Return the error dict that the API would return for the given
+    error.'''
+    if isinstance(error, ValidationError):
+        error_dict = dict(error.error_dict)
+        error_dict['__type'] = 'Validation Error'
+        return error_dict
+    if isinstance(error, NotFound):
+        message = _('Not found')
+        if error.extra_msg:
+            message += ': %s' % error.extra_msg
+        return {'__type': 'Not Found Error', 'message': message}
+    return {'__type': 'Authorization Error', 'message': _('Access denied')}
+
+
+def package_update_many(context, data_dict):
+    '''Update several datasets at once.
+
+    Each dataset is validated and saved as by
+    :py:func:`~ckan.logic.action.update.package_update`, but they are all
+    saved in a single transaction and revision and added to the search index
+    together once they have all been saved. A dataset that fails to update
+    doesn't stop the others from being updated, its error is returned
+    instead.
+
+    You must be authorized to edit each of the datasets.
+
+    :param datasets: the datasets to update, each a dictionary of the
+        parameters of
+        :py:func:`~ckan.logic.action.update.package_update`
+    :type datasets: list of dictionaries
+
+    :returns: one dictionary per dataset, in the order given, with a
+        ``'success'`` key and either the id of the updated dataset as
+        ``'result'`` or the errors as ``'error'``. If ``'return_id_only'``
+        is ``False`` in the context the ``'result'`` is the whole dataset
+        instead of its id.
+    :rtype: list of dictionaries
+
+    '''
+    datasets = _get_or_bust(data_dict, 'datasets')
+
+    _check_access('package_update_many', context, data_dict)
+
+    return _write_packages(context, datasets, 'package_update',
+                           _(u'REST API: Update %i objects') % len(datasets))
+
+
 def package_resource_reorder(context, data_dict):
     '''Reorder resources against datasets.  If only partial resource ids are
     supplied then these are assumed to be first and the other resources will
@@ -37,6 +37,14 @@ def package_create(context, data_dict=None):
     return {'success': True}
 
 
+@logic.auth_allow_anonymous_access
+def package_create_many(context, data_dict):
+    # package_create_many runs package_create for each dataset, which checks
+    # the user's permissions for that dataset, so only check that the user
+    # can create datasets at all here.
+    return new_authz.is_authorized('package_create', context, {})
+
+
 def file_upload(context, data_dict=None):
     user = context['user']
     if new_authz.auth_is_anon_user(context):
@@ -76,6 +84,29 @@ def resource_view_create(context, data_dict):
     return resource_create(context, data_dict)
 
 
+def resource_view_create_many(context, data_dict):
+    model = context['model']
+    user = context.get('user')
+    resource_ids = data_dict.get('resource_ids') or []
+
+    # check authentication against each of the resources' packages
+    query = model.Session.query(model.ResourceGroup.package_id)\
+        .join(model.Resource)\
+        .filter(model.Resource.id.in_(resource_ids))\
+        .distinct()
+    for package_id, in query:
+        # package_update keeps the package it checks in the context
+        package_context = dict(context)
+        package_context.pop('package', None)
+        authorized = new_authz.is_authorized_boolean(
+            'package_update', package_context, {'id': package_id})
+        if not authorized:
+            return {'success': False,
+                    'msg': _('User %s not authorized to edit package %s') %
+                    (str(user), package_id)}
+    return {'success': True}
+
+
 def package_relationship_create(context, data_dict):
     user = context['user']
 
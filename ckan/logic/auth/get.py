@@ -268,6 +268,19 @@ def followee_list(context, data_dict):
     return _followee_list(context, data_dict)
 
 
+def site_statistics(context, data_dict):
+    # the statistics are shown to everyone on the front page
+    return {'success': True}
+
+
+def status_metrics(context, data_dict):
+    return sysadmin(context, data_dict)
+
+
+def status_database_pools(context, data_dict):
+    return sysadmin(context, data_dict)
+
+
 @logic.auth_audit_exempt
 def user_followee_list(context, data_dict):
     return _followee_list(context, data_dict)
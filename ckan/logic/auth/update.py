@@ -48,6 +48,11 @@ def package_update(context, data_dict):
 
     return {'success': True}
 
+def package_update_many(context, data_dict):
+    # package_update_many runs package_update for each dataset, which checks
+    # the user's permissions for that dataset.
+    return {'success': True}
+
 def package_resource_reorder(context, data_dict):
     ## the action function runs package update so no need to run it twice
     return {'success': True}
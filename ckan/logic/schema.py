@@ -569,6 +569,24 @@ def default_pagination_schema():
     return schema
 
 
+def default_revision_list_schema():
+    schema = {
+        'since_id': [ignore_missing, unicode],
+        'since_time': [ignore_missing, isodate],
+        'limit': [ignore_missing, natural_number_validator],
+    }
+    return schema
+
+
+def default_package_revision_list_schema():
+    schema = {
+        'id': [not_missing, unicode],
+        'before_id': [ignore_missing, unicode],
+        'limit': [ignore_missing, natural_number_validator],
+    }
+    return schema
+
+
 def default_dashboard_activity_list_schema():
     schema = default_pagination_schema()
     schema['id'] = [unicode]
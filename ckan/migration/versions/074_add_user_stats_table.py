@@ -0,0 +1,32 @@
+def upgrade(migrate_engine):
+    migrate_engine.execute('''
+        BEGIN;
+
+        CREATE TABLE user_stats (
+            user_id text NOT NULL,
+            number_of_edits integer NOT NULL,
+            number_administered_packages integer NOT NULL
+        );
+
+        ALTER TABLE user_stats
+            ADD CONSTRAINT user_stats_pkey PRIMARY KEY (user_id);
+
+        ALTER TABLE user_stats
+            ADD CONSTRAINT user_stats_user_id_fkey
+            FOREIGN KEY (user_id) REFERENCES "user"(id)
+            ON UPDATE CASCADE ON DELETE CASCADE;
+
+        INSERT INTO user_stats
+            (user_id, number_of_edits, number_administered_packages)
+        SELECT "user".id,
+            (SELECT count(*) FROM revision
+             WHERE revision.author = "user".name
+             OR revision.author = "user".openid),
+            (SELECT count(*) FROM user_object_role
+             WHERE user_object_role.user_id = "user".id
+             AND user_object_role.context = 'Package'
+             AND user_object_role.role = 'admin')
+        FROM "user";
+
+        COMMIT;
+    ''')
@@ -0,0 +1,35 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def upgrade(migrate_engine):
+    migrate_engine.execute(
+        '''
+        CREATE INDEX idx_package_tag_tag_id ON package_tag (tag_id, state);
+        '''
+    )
+
+    # Trigram indexes let Postgres answer the ILIKE '%term%' searches of tag
+    # search and autocomplete without scanning the table, but they need the
+    # pg_trgm extension, which may not be installed or may need a superuser
+    # to be enabled.
+    try:
+        available = migrate_engine.execute(
+            '''
+            SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'
+            '''
+        ).first()
+        if available:
+            migrate_engine.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except Exception, e:
+        log.warn('Could not enable the pg_trgm extension: %s', e)
+        available = False
+    if not available:
+        log.warn('Tag searches will not be able to use a trigram index')
+        return
+    migrate_engine.execute(
+        '''
+        CREATE INDEX idx_tag_name_trgm ON tag USING gin (name gin_trgm_ops);
+        '''
+    )
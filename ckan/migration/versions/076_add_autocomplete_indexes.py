@@ -0,0 +1,37 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def upgrade(migrate_engine):
+    # package_autocomplete matches the start of lower-cased names and titles
+    migrate_engine.execute(
+        '''
+        CREATE INDEX idx_package_name_lower_pattern ON package
+        (lower(name) text_pattern_ops);
+        CREATE INDEX idx_package_title_lower_pattern ON package
+        (lower(title) text_pattern_ops);
+        '''
+    )
+
+    # format_autocomplete matches anywhere in the format, which needs the
+    # pg_trgm extension (enabled by migration 075 when possible)
+    try:
+        enabled = migrate_engine.execute(
+            '''
+            SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'
+            '''
+        ).first()
+    except Exception, e:
+        log.warn('Could not check for the pg_trgm extension: %s', e)
+        enabled = False
+    if not enabled:
+        log.warn('Format autocomplete will not be able to use a trigram '
+                 'index')
+        return
+    migrate_engine.execute(
+        '''
+        CREATE INDEX idx_resource_format_trgm ON resource
+        USING gin (format gin_trgm_ops);
+        '''
+    )
@@ -158,8 +158,15 @@ from domain_object import (
 from dashboard import (
     Dashboard,
 )
+from user_stats import (
+    UserStats,
+    user_stats_table,
+)
 
 import ckan.migration
+import ckan.lib.autocomplete as autocomplete
+import ckan.lib.fragment_cache as fragment_cache
+import ckan.lib.site_statistics as site_statistics
 
 log = logging.getLogger(__name__)
 
@@ -293,6 +300,11 @@ class Repository(vdm.sqlalchemy.Repository):
         self.session.remove()
         self.init_db()
         self.session.flush()
+        # the in-memory autocomplete indexes refer to the old data
+        autocomplete.clear_tag_indexes()
+        autocomplete.clear_results_cache()
+        fragment_cache.clear()
+        site_statistics.clear()
         log.info('Database rebuilt')
 
     def delete_all(self):
@@ -475,6 +487,120 @@ def revision_as_dict(revision, include_packages=True, include_groups=True,
     return revision_dict
 
 
+# the revisions of each dataset's parts, as (revision_id, package_id) rows:
+# the objects of Package.all_related_revisions
+_PACKAGE_PART_REVISIONS = """
+    SELECT revision_id, id AS package_id FROM package_revision
+    UNION ALL
+    SELECT revision_id, package_id FROM package_tag_revision
+    UNION ALL
+    SELECT revision_id, package_id FROM package_extra_revision
+    UNION ALL
+    SELECT revision_id, package_id FROM resource_group_revision
+    UNION ALL
+    SELECT rr.revision_id, rg.package_id
+    FROM resource_revision rr
+    JOIN resource_group rg ON rg.id = rr.resource_group_id"""
+
+_REVISION_PACKAGE_CHANGES = """
+    SELECT DISTINCT ON (a.revision_id, p.name)
+        a.revision_id, p.id, p.name, p.private, pr.state,
+        pr.revision_id IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM package_revision older
+            JOIN revision older_r ON older_r.id = older.revision_id
+            WHERE older.id = p.id AND older_r.timestamp < r.timestamp
+        ) AS created,
+        EXISTS (
+            SELECT 1 FROM resource_revision rr
+            JOIN resource_group rg ON rg.id = rr.resource_group_id
+            WHERE rr.revision_id = a.revision_id AND rg.package_id = p.id
+        ) AS resources,
+        EXISTS (
+            SELECT 1 FROM resource_group_revision rgr
+            WHERE rgr.revision_id = a.revision_id AND rgr.package_id = p.id
+        ) AS resource_group,
+        EXISTS (
+            SELECT 1 FROM package_extra_revision per
+            WHERE per.revision_id = a.revision_id AND per.package_id = p.id
+                AND per.key = 'date_updated'
+        ) AS date_updated
+    FROM (%s
+          UNION ALL
+          SELECT revision_id, table_id FROM member_revision
+          WHERE table_name = 'package') a
+    JOIN package p ON p.id = a.package_id
+    JOIN revision r ON r.id = a.revision_id
+    LEFT JOIN package_revision pr
+        ON pr.id = p.id AND pr.revision_id = a.revision_id
+    WHERE a.revision_id = ANY(:revision_ids)
+    ORDER BY a.revision_id, p.name""" % _PACKAGE_PART_REVISIONS
+
+
+def revision_package_changes(revision_ids):
+    '''Return how the revisions `revision_ids` changed the datasets that
+    they affected, with one query.
+
+    A change is ``created`` for a dataset's first revision, ``deleted`` for
+    a revision that deleted it, and otherwise ``updated``, followed by
+    ``:resources``, ``:resource_group`` and ``:date_updated`` if the
+    revision changed its resources, resource group or ``date_updated``
+    extra.
+
+    :returns: {revision_id: [(package, change), ...]} where each package is
+        a row of its ``id``, ``name`` and ``private``, ordered by name
+    :rtype: dictionary
+
+    '''
+    changes = dict((revision_id, []) for revision_id in revision_ids)
+    if not revision_ids:
+        return changes
+    rows = Session.execute(_REVISION_PACKAGE_CHANGES,
+                           {'revision_ids': list(revision_ids)})
+    for row in rows:
+        if row.state == State.DELETED:
+            change = 'deleted'
+        elif row.created:
+            change = 'created'
+        else:
+            change = 'updated'
+            if row.resources:
+                change += ':resources'
+            if row.resource_group:
+                change += ':resource_group'
+            if row.date_updated:
+                change += ':date_updated'
+        changes[row.revision_id].append((row, change))
+    return changes
+
+
+def package_related_revisions(package_id, before_id=None, limit=None):
+    '''Return the revisions of a dataset and its tags, extras, resources and
+    resource group, most recent first, as rows of the columns of the
+    revision table.
+
+    :param before_id: only return the revisions before this one, so that
+        the next page starts after the last revision of the page before
+    :param limit: return at most this many revisions
+
+    '''
+    query = """
+        SELECT r.* FROM revision r
+        WHERE r.id IN (SELECT revision_id FROM (%s) parts
+                       WHERE package_id = :package_id)""" % \
+        _PACKAGE_PART_REVISIONS
+    params = {'package_id': package_id}
+    if before_id is not None:
+        query += """
+            AND (r.timestamp, r.id) < (SELECT timestamp, id FROM revision
+                                       WHERE id = :before_id)"""
+        params['before_id'] = before_id
+    query += " ORDER BY r.timestamp DESC, r.id DESC"
+    if limit is not None:
+        query += " LIMIT :limit"
+        params['limit'] = limit
+    return Session.execute(query, params).fetchall()
+
+
 def is_id(id_string):
     '''Tells the client if the string looks like a revision id or not'''
     reg_ex = '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
@@ -1,4 +1,7 @@
 import datetime
+import logging
+import threading
+import time
 import urllib2
 import re
 
@@ -6,6 +9,8 @@ from pylons import config
 
 from ckan.common import _, json
 
+log = logging.getLogger(__name__)
+
 
 class License(object):
     """Domain object for a license."""
@@ -41,12 +46,21 @@ class License(object):
 
 
 class LicenseRegister(object):
-    """Dictionary-like interface to a group of licenses."""
+    """Dictionary-like interface to a group of licenses.
+
+    The licenses are indexed by id when the register is created and never
+    change afterwards. A register loaded from ``licenses_group_url`` is
+    replaced by a new one when the list there changes (see
+    ``get_license_register()``).
+
+    """
 
     def __init__(self):
-        group_url = config.get('licenses_group_url', None)
-        if group_url:
-            self.load_licenses(group_url)
+        self.group_url = config.get('licenses_group_url', None)
+        self.etag = None
+        self.loaded = time.time()
+        if self.group_url:
+            self.load_licenses(self.group_url)
         else:
             default_license_list = [
                 LicenseNotSpecified(),
@@ -67,10 +81,20 @@ class LicenseRegister(object):
                 ]
             self._create_license_list(default_license_list)
 
-    def load_licenses(self, license_url):
+    def load_licenses(self, license_url, etag=None):
+        '''Load the licenses from `license_url`, returning False if they
+        haven't changed since they had the ETag `etag`.'''
+        request = urllib2.Request(license_url)
+        if etag:
+            request.add_header('If-None-Match', etag)
         try:
-            response = urllib2.urlopen(license_url)
+            response = urllib2.urlopen(request)
             response_body = response.read()
+        except urllib2.HTTPError, inst:
+            if inst.code == 304:
+                return False
+            msg = "Couldn't connect to licenses service %r: %s" % (license_url, inst)
+            raise Exception, msg
         except Exception, inst:
             msg = "Couldn't connect to licenses service %r: %s" % (license_url, inst)
             raise Exception, msg
@@ -80,20 +104,44 @@ class LicenseRegister(object):
             msg = "Couldn't read response from licenses service %r: %s" % (response_body, inst)
             raise Exception, inst
         self._create_license_list(license_data, license_url)
+        self.etag = response.info().getheader('ETag')
+        return True
 
     def _create_license_list(self, license_data, license_url=''):
         if isinstance(license_data, dict):
-            self.licenses = [License(entity) for entity in license_data.values()]
+            licenses = [License(entity) for entity in license_data.values()]
         elif isinstance(license_data, list):
-            self.licenses = [License(entity) for entity in license_data]
+            licenses = [License(entity) for entity in license_data]
         else:
             msg = "Licenses at %s must be dictionary or list" % license_url
             raise ValueError(msg)
+        self.licenses = tuple(licenses)
+        self._by_id = dict((license.id, license) for license in licenses)
+        self.open_license_ids = tuple(license.id for license in licenses
+                                      if license.isopen())
+
+    def is_stale(self):
+        '''Return True if the licenses came from ``licenses_group_url`` more
+        than ``ckan.licenses_refresh_interval`` seconds ago.'''
+        interval = int(config.get('ckan.licenses_refresh_interval', 3600))
+        return bool(self.group_url and interval and
+                    time.time() - self.loaded > interval)
+
+    def refreshed(self):
+        '''Return a new register of the licenses now at the register's
+        ``licenses_group_url``, or this register if they haven't changed.'''
+        register = LicenseRegister.__new__(LicenseRegister)
+        register.group_url = self.group_url
+        register.loaded = time.time()
+        self.loaded = register.loaded
+        if register.load_licenses(self.group_url, etag=self.etag):
+            return register
+        return self
 
     def __getitem__(self, key, default=Exception):
-        for license in self.licenses:
-            if key == license.id:
-                return license
+        license = self._by_id.get(key)
+        if license is not None:
+            return license
         if default != Exception:
             return default
         else:
@@ -106,7 +154,7 @@ class LicenseRegister(object):
         return [license.id for license in self.licenses]
 
     def values(self):
-        return self.licenses
+        return list(self.licenses)
 
     def items(self):
         return [(license.id, license) for license in self.licenses]
@@ -118,6 +166,47 @@ class LicenseRegister(object):
         return len(self.licenses)
 
 
+_register = None
+_refreshing = threading.Lock()
+
+
+def get_license_register():
+    '''Return the process's register of licenses, creating it the first
+    time.
+
+    When a register loaded from ``licenses_group_url`` is stale, this returns
+    it as it is, and a background thread replaces it if the licenses there
+    have changed.
+
+    '''
+    global _register
+    register = _register
+    if register is None:
+        register = _register = LicenseRegister()
+    elif register.is_stale() and _refreshing.acquire(False):
+        thread = threading.Thread(target=_refresh, args=(register,),
+                                  name='ckan-licenses-refresh')
+        thread.daemon = True
+        thread.start()
+    return register
+
+
+def _refresh(register):
+    global _register
+    try:
+        _register = register.refreshed()
+    except Exception, e:
+        # keep the licenses we have, and try again after the interval
+        log.warning('Could not refresh the licenses: %s', e)
+    finally:
+        _refreshing.release()
+
+
+def reset_license_register():
+    '''Forget the register, so that it is loaded again from the config.'''
+    global _register
+    _register = None
+
 
 class DefaultLicense(dict):
     ''' The license was a dict but this did not allow translation of the
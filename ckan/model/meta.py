@@ -9,6 +9,9 @@ from sqlalchemy.orm.session import SessionExtension
 
 import extension
 import ckan.lib.activity_streams_session_extension as activity
+import ckan.lib.user_stats_session_extension as user_stats
+import ckan.lib.autocomplete as autocomplete
+import ckan.lib.fragment_cache as fragment_cache
 
 __all__ = ['Session', 'engine_is_sqlite', 'engine_is_pg']
 
@@ -38,6 +41,12 @@ class CkanCacheExtension(SessionExtension):
             objs = set()
             for item in oc_list:
                 objs.add(item.__class__.__name__)
+            if objs & set(['Tag', 'PackageTag']):
+                autocomplete.clear_tag_indexes()
+            if objs & set(['Package', 'Resource']):
+                autocomplete.clear_results_cache()
+            if objs & fragment_cache.INVALIDATING_CLASSES:
+                fragment_cache.clear()
 
         # Flush Redis
         if self.use_redis:
@@ -133,7 +142,8 @@ Session = orm.scoped_session(orm.sessionmaker(
     extension=[CkanCacheExtension(),
                CkanSessionExtension(),
                extension.PluginSessionExtension(),
-               activity.DatasetActivitySessionExtension()],
+               activity.DatasetActivitySessionExtension(),
+               user_stats.UserStatsSessionExtension()],
 ))
 
 create_local_session = orm.sessionmaker(
@@ -143,7 +153,8 @@ create_local_session = orm.sessionmaker(
     extension=[CkanCacheExtension(),
                CkanSessionExtension(),
                extension.PluginSessionExtension(),
-               activity.DatasetActivitySessionExtension()],
+               activity.DatasetActivitySessionExtension(),
+               user_stats.UserStatsSessionExtension()],
 )
 
 #mapper = Session.mapper
@@ -337,9 +337,7 @@ class Package(vdm.sqlalchemy.RevisionedObjectMixin,
 
     @classmethod
     def get_license_register(cls):
-        if not hasattr(cls, '_license_register'):
-            cls._license_register = _license.LicenseRegister()
-        return cls._license_register
+        return _license.get_license_register()
 
     @classmethod
     def get_license_options(cls):
@@ -192,16 +192,12 @@ class User(vdm.sqlalchemy.StatefulObjectMixin,
     def number_of_edits(self):
         # have to import here to avoid circular imports
         import ckan.model as model
-        revisions_q = meta.Session.query(model.Revision)
-        revisions_q = revisions_q.filter_by(author=self.name)
-        return revisions_q.count()
+        return model.UserStats.get(self.id, 'number_of_edits')
 
     def number_administered_packages(self):
         # have to import here to avoid circular imports
         import ckan.model as model
-        q = meta.Session.query(model.PackageRole)
-        q = q.filter_by(user=self, role=model.Role.ADMIN)
-        return q.count()
+        return model.UserStats.get(self.id, 'number_administered_packages')
 
     def activate(self):
         ''' Activate the user '''
@@ -0,0 +1,120 @@
+from sqlalchemy import types, Column, Table, ForeignKey, text
+import sqlalchemy.exc
+
+import meta
+
+__all__ = ['UserStats', 'user_stats_table']
+
+user_stats_table = Table(
+    'user_stats', meta.metadata,
+    Column('user_id', types.UnicodeText,
+           ForeignKey('user.id', onupdate='CASCADE', ondelete='CASCADE'),
+           primary_key=True, nullable=False),
+    Column('number_of_edits', types.Integer, nullable=False, default=0),
+    Column('number_administered_packages', types.Integer, nullable=False,
+           default=0),
+)
+
+COUNTERS = ('number_of_edits', 'number_administered_packages')
+
+USER_FILTERS = {
+    'author': '"user".name = :author OR "user".openid = :author',
+    'user_id': '"user".id = :user_id',
+}
+
+INSERT_MISSING_SQL = '''
+    INSERT INTO user_stats
+        (user_id, number_of_edits, number_administered_packages)
+    SELECT "user".id, 0, 0 FROM "user"
+    WHERE ({user_filter})
+    AND "user".id NOT IN (SELECT user_id FROM user_stats)'''
+
+INCREMENT_SQL = '''
+    UPDATE user_stats SET {counter} = {counter} + :delta
+    WHERE user_id IN (SELECT "user".id FROM "user" WHERE {user_filter})'''
+
+REFRESH_SQL = '''
+    DELETE FROM user_stats;
+    INSERT INTO user_stats
+        (user_id, number_of_edits, number_administered_packages)
+    SELECT "user".id,
+        (SELECT count(*) FROM revision
+         WHERE revision.author = "user".name
+         OR revision.author = "user".openid),
+        (SELECT count(*) FROM user_object_role
+         WHERE user_object_role.user_id = "user".id
+         AND user_object_role.context = 'Package'
+         AND user_object_role.role = 'admin')
+    FROM "user";'''
+
+
+class UserStats(object):
+    '''Per-user counters shown in user listings.
+
+    The counters are kept up to date as revisions and package roles are
+    committed (see ckan.lib.user_stats_session_extension), so listing users
+    does not need to count revisions for every user. ``refresh()`` recomputes
+    them all from scratch.
+
+    '''
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.number_of_edits = 0
+        self.number_administered_packages = 0
+
+    @classmethod
+    def create(cls, connection, user_ids):
+        '''Create the stats rows of new users, with their counters at 0.'''
+        connection.execute(user_stats_table.insert(), [
+            {'user_id': user_id, 'number_of_edits': 0,
+             'number_administered_packages': 0} for user_id in user_ids])
+
+    @classmethod
+    def increment(cls, connection, counter, delta, **user_filter):
+        '''Add `delta` to a counter of the users matching `user_filter`.
+
+        `user_filter` is either ``author=...`` (matching user name or openid,
+        as revision authors do) or ``user_id=...``. Users get their stats
+        rows when they are created, but a row is created here for a user
+        that hasn't got one.
+
+        '''
+        assert counter in COUNTERS, counter
+        (filter_key, filter_value), = user_filter.items()
+        where = USER_FILTERS[filter_key]
+        params = {filter_key: filter_value}
+        increment_sql = text(INCREMENT_SQL.format(counter=counter,
+                                                  user_filter=where))
+        if connection.execute(increment_sql, delta=delta,
+                              **params).rowcount:
+            return
+
+        # in a savepoint, so that if another transaction creates the row
+        # first only the insert fails, not the whole transaction
+        savepoint = connection.begin_nested()
+        try:
+            inserted = connection.execute(
+                text(INSERT_MISSING_SQL.format(user_filter=where)),
+                **params).rowcount
+            savepoint.commit()
+        except sqlalchemy.exc.IntegrityError:
+            savepoint.rollback()
+            inserted = True
+        if inserted:
+            connection.execute(increment_sql, delta=delta, **params)
+
+    @classmethod
+    def get(cls, user_id, counter):
+        '''Return the value of a counter for the given user_id.'''
+        assert counter in COUNTERS, counter
+        query = meta.Session.query(getattr(cls, counter))
+        return query.filter(cls.user_id == user_id).scalar() or 0
+
+    @classmethod
+    def refresh(cls):
+        '''Recompute the counters of every user.'''
+        meta.Session.execute(REFRESH_SQL)
+        meta.Session.commit()
+
+
+meta.mapper(UserStats, user_stats_table)
@@ -0,0 +1,38 @@
+from nose.tools import assert_true, assert_false
+
+from routes import url_for
+
+import ckan.lib.fragment_cache as fragment_cache
+import ckan.new_tests.helpers as helpers
+import ckan.new_tests.factories as factories
+
+
+class TestFeaturedOrganization(helpers.FunctionalTestBase):
+
+    @classmethod
+    def _apply_config_changes(cls, cfg):
+        cfg['ckan.featured_orgs'] = 'featured-org'
+        cfg['ckan.fragment_cache.enabled'] = 'true'
+
+    def setup(self):
+        super(TestFeaturedOrganization, self).setup()
+        fragment_cache.reset()
+
+    def teardown(self):
+        fragment_cache.reset()
+
+    def test_members_private_datasets_are_not_shown_to_others(self):
+        member = factories.User()
+        org = factories.Organization(name='featured-org', user=member)
+        factories.Dataset(owner_org=org['id'], title='Public dataset',
+                          user=member)
+        factories.Dataset(owner_org=org['id'], title='Private dataset',
+                          private=True, user=member)
+        app = self._get_test_app()
+
+        app.get(url_for(controller='home', action='index'),
+                extra_environ={'REMOTE_USER': member['name'].encode('ascii')})
+        response = app.get(url_for(controller='home', action='index'))
+
+        assert_true('Public dataset' in response)
+        assert_false('Private dataset' in response)
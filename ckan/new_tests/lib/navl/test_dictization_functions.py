@@ -0,0 +1,84 @@
+'''Unit tests for ckan/lib/navl/dictization_functions.py.
+
+'''
+import nose.tools
+
+import ckan.lib.navl.dictization_functions as df
+from ckan.lib.navl.validators import identity_converter, ignore_missing
+
+assert_equals = nose.tools.assert_equals
+
+
+def _schema():
+    return {
+        '__before': [identity_converter],
+        '__junk': [identity_converter],
+        'name': [identity_converter],
+        'title': [ignore_missing],
+        'resources': {
+            '__after': [identity_converter],
+            'url': [identity_converter],
+            'format': [ignore_missing],
+        },
+    }
+
+
+def _data():
+    return {
+        ('name',): 'test',
+        ('resources', 0, 'url'): 'http://example.com/0',
+        ('resources', 1, 'url'): 'http://example.com/1',
+        ('resources', 1, 'size'): 10,
+        ('other', 0, 'url'): 'junk',
+    }
+
+
+class TestCompileSchema(object):
+
+    def test_schemas_with_the_same_shape_share_a_compiled_schema(self):
+        assert df.compile_schema(_schema()) is df.compile_schema(_schema())
+
+    def test_schemas_with_different_shapes_are_compiled_separately(self):
+        schema = _schema()
+        schema['resources']['name'] = [identity_converter]
+
+        assert df.compile_schema(schema) is not df.compile_schema(_schema())
+
+    def test_matches_uncompiled_full_schema_and_data(self):
+        schema, data = _schema(), _data()
+        compiled = df.compile_schema(schema)
+
+        combinations = compiled.get_all_key_combinations(data)
+        full_schema = compiled.make_full_schema(schema, combinations)
+
+        assert_equals(combinations, df.get_all_key_combinations(
+            data, df.flatten_schema(schema)))
+        assert_equals(full_schema, df.make_full_schema(data, schema))
+        assert_equals(
+            compiled.augment_data(data, full_schema, combinations),
+            df.augment_data(data, schema))
+
+    def test_run_order(self):
+        schema, data = _schema(), _data()
+        compiled = df.compile_schema(schema)
+        combinations = compiled.get_all_key_combinations(data)
+        full_schema = df.make_full_schema(data, schema)
+        ordered = sorted(full_schema, key=df.flattened_order_key)
+
+        assert_equals(compiled.run_order(combinations, 'main'),
+                      [key for key in ordered
+                       if not key[-1].startswith('__')])
+        assert_equals(compiled.run_order(combinations, 'after'),
+                      [('resources', 0, '__after'),
+                       ('resources', 1, '__after')])
+
+    def test_validators_come_from_the_schema_being_validated(self):
+        schema = _schema()
+        schema['title'] = [lambda value: 'first']
+        df.validate({'name': 'test'}, schema)
+        schema = _schema()
+        schema['title'] = [lambda value: 'second']
+
+        data, errors = df.validate({'name': 'test'}, schema)
+
+        assert_equals(data['title'], 'second')
@@ -0,0 +1,34 @@
+import nose
+
+import ckan.lib.autocomplete as autocomplete
+
+eq_ = nose.tools.eq_
+
+
+class TestPrefixIndex(object):
+    def setup(self):
+        self.index = autocomplete.PrefixIndex([
+            (u'economy', 3),
+            (u'Ecology', 10),
+            (u'education', 3),
+            (u'health', 50),
+        ])
+
+    def test_search_returns_names_starting_with_prefix(self):
+        eq_(sorted(self.index.search(u'ec')), [u'Ecology', u'economy'])
+
+    def test_search_is_case_insensitive(self):
+        eq_(self.index.search(u'ECOL'), [u'Ecology'])
+
+    def test_search_ranks_by_count_then_name(self):
+        eq_(self.index.search(u'e'), [u'Ecology', u'economy', u'education'])
+
+    def test_search_limit(self):
+        eq_(self.index.search(u'e', limit=1), [u'Ecology'])
+
+    def test_search_without_matches(self):
+        eq_(self.index.search(u'zzz'), [])
+
+    def test_search_with_non_ascii_prefix(self):
+        index = autocomplete.PrefixIndex([(u'\u03b2eta', 1), (u'beta', 1)])
+        eq_(index.search(u'\u03b2'), [u'\u03b2eta'])
@@ -0,0 +1,93 @@
+import csv
+import datetime
+import gzip
+import json
+import os
+import tempfile
+
+import nose
+
+import ckan.lib.dumper as dumper
+import ckan.new_tests.helpers as helpers
+import ckan.new_tests.factories as factories
+
+eq_ = nose.tools.eq_
+
+
+class TestPackageExporter(object):
+
+    def setup(self):
+        helpers.reset_db()
+        self.path = tempfile.mktemp()
+
+    def teardown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _names(self, lines):
+        return sorted(json.loads(line)['name'] for line in lines)
+
+    def test_export_json_lines(self):
+        factories.Dataset(name='dataset-a')
+        factories.Dataset(name='dataset-b', private=True,
+                          owner_org=factories.Organization()['id'])
+
+        count = dumper.PackageExporter(batch_size=1).export(self.path)
+
+        eq_(count, 1)
+        with open(self.path) as f:
+            lines = f.readlines()
+        eq_(self._names(lines), ['dataset-a'])
+        eq_(json.loads(lines[0])['resources'], [])
+
+    def test_export_gzipped_csv(self):
+        dataset = factories.Dataset(name='dataset-a', tags=[{'name': 'x'}])
+        factories.Resource(package_id=dataset['id'], url='http://a/b.csv')
+
+        dumper.PackageExporter('csv', compress=True).export(self.path)
+
+        with gzip.open(self.path) as f:
+            rows = list(csv.DictReader(f))
+        eq_(len(rows), 1)
+        eq_(rows[0]['name'], 'dataset-a')
+        eq_(rows[0]['tags'], 'x')
+        eq_(rows[0]['resource_urls'], 'http://a/b.csv')
+
+    def test_export_since_includes_deleted_datasets(self):
+        factories.Dataset(name='dataset-a')
+        since = datetime.datetime.utcnow()
+        factories.Dataset(name='dataset-b')
+        deleted = factories.Dataset(name='dataset-c')
+        helpers.call_action('package_delete', id=deleted['id'])
+
+        dumper.PackageExporter(since=since).export(self.path)
+
+        with open(self.path) as f:
+            lines = f.readlines()
+        eq_(self._names(lines), ['dataset-b', 'dataset-c'])
+
+    def test_export_since_includes_datasets_deleted_since(self):
+        factories.Dataset(name='dataset-a')
+        deleted = factories.Dataset(name='dataset-b')
+        since = datetime.datetime.utcnow()
+        helpers.call_action('package_delete', id=deleted['id'])
+
+        dumper.PackageExporter(since=since).export(self.path)
+
+        with open(self.path) as f:
+            lines = f.readlines()
+        eq_(self._names(lines), ['dataset-b'])
+        eq_(json.loads(lines[0])['state'], 'deleted')
+
+    def test_export_in_parallel(self):
+        for i in range(5):
+            factories.Dataset(name='dataset-%i' % i)
+
+        count = dumper.PackageExporter('csv', compress=True).export(
+            self.path, processes=2)
+
+        eq_(count, 5)
+        with gzip.open(self.path) as f:
+            rows = list(csv.DictReader(f))
+        eq_(sorted(row['name'] for row in rows),
+            ['dataset-%i' % i for i in range(5)])
@@ -0,0 +1,63 @@
+import nose
+
+import ckan.lib.fragment_cache as fragment_cache
+import ckan.new_tests.helpers as helpers
+import ckan.new_tests.factories as factories
+
+eq_ = nose.tools.eq_
+
+
+class Counter(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {'calls': self.calls}
+
+
+class TestFragmentCache(object):
+
+    def setup(self):
+        fragment_cache.reset()
+
+    def teardown(self):
+        fragment_cache.reset()
+
+    @helpers.change_config('ckan.fragment_cache.enabled', 'true')
+    def test_values_are_cached(self):
+        create = Counter()
+
+        fragment_cache.get_or_create(('key', 1), create)
+        value = fragment_cache.get_or_create(('key', 1), create)
+
+        eq_(value, {'calls': 1})
+        eq_(create.calls, 1)
+
+    @helpers.change_config('ckan.fragment_cache.enabled', 'true')
+    def test_cached_values_cannot_be_changed_by_callers(self):
+        value = fragment_cache.get_or_create(('key',), Counter())
+        value['calls'] = 100
+
+        eq_(fragment_cache.get_or_create(('key',), Counter()), {'calls': 1})
+
+    @helpers.change_config('ckan.fragment_cache.enabled', 'false')
+    def test_nothing_is_cached_when_disabled(self):
+        create = Counter()
+
+        fragment_cache.get_or_create(('key',), create)
+        fragment_cache.get_or_create(('key',), create)
+
+        eq_(create.calls, 2)
+
+    @helpers.change_config('ckan.fragment_cache.enabled', 'true')
+    def test_committing_a_dataset_clears_the_cache(self):
+        helpers.reset_db()
+        create = Counter()
+        fragment_cache.get_or_create(('key',), create)
+
+        factories.Dataset()
+        fragment_cache.get_or_create(('key',), create)
+
+        eq_(create.calls, 2)
@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+import nose
+
+import ckan
+import ckan.lib.import_profile as import_profile
+
+eq_ = nose.tools.eq_
+
+
+def _profile_in_new_process(module):
+    '''Return the modules imported by importing `module` in a new process.'''
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'ckan.lib.import_profile', module],
+        cwd=os.path.dirname(os.path.dirname(ckan.__file__)))
+    return [line.split()[-1] for line in output.splitlines()[1:]]
+
+
+class TestImportProfiler(object):
+
+    def test_only_new_imports_are_timed(self):
+        with import_profile.ImportProfiler() as profiler:
+            import ckan.lib.import_profile
+            import sys
+
+        eq_(profiler.timings, [])
+
+    def test_nested_imports_are_timed(self):
+        modules = _profile_in_new_process('email.mime.text')
+
+        assert modules[0] == 'email.mime.text', modules
+        assert 'email.mime.base' in modules, modules
+
+
+class TestImportTime(object):
+    '''The modules that every paster command imports mustn't import modules
+    that only some commands, or only rendering pages, need.'''
+
+    def test_cli(self):
+        modules = _profile_in_new_process('ckan.lib.cli')
+
+        for slow in ['ckan.lib.fanstatic_resources', 'ckan.include.rjsmin',
+                     'ckan.include.rcssmin']:
+            assert slow not in modules, slow
+
+    def test_helpers(self):
+        modules = _profile_in_new_process('ckan.lib.helpers')
+
+        for slow in ['ckan.lib.fanstatic_resources', 'webhelpers.markdown']:
+            assert slow not in modules, slow
@@ -0,0 +1,83 @@
+import nose
+
+import ckan.lib.instrumentation as instrumentation
+import ckan.logic as logic
+import ckan.new_tests.helpers as helpers
+
+eq_ = nose.tools.eq_
+
+
+class RecordingSink(object):
+    timings = []
+
+    def record(self, timing):
+        self.timings.append(timing)
+
+
+class TestInstrumentation(object):
+
+    def setup(self):
+        instrumentation.reset()
+        RecordingSink.timings = []
+
+    def teardown(self):
+        instrumentation.reset()
+
+    def test_nothing_is_timed_without_sinks(self):
+        eq_(instrumentation.start_action('package_list'), None)
+
+    @helpers.change_config('ckan.instrumentation.sinks',
+                           'ckan.new_tests.lib.test_instrumentation:'
+                           'RecordingSink')
+    def test_nested_actions_are_timed_with_their_depth(self):
+        outer = instrumentation.start_action('outer')
+        inner = instrumentation.start_action('inner')
+        instrumentation.finish_action(inner)
+        instrumentation.finish_action(outer)
+
+        eq_([(timing.action_name, timing.depth)
+             for timing in RecordingSink.timings],
+            [('inner', 1), ('outer', 0)])
+
+    @helpers.change_config('ckan.instrumentation.sinks',
+                           'ckan.new_tests.lib.test_instrumentation:'
+                           'RecordingSink')
+    def test_sql_statements_are_counted(self):
+        helpers.call_action('package_list')
+
+        timing, = RecordingSink.timings
+        eq_(timing.action_name, 'package_list')
+        assert timing.sql_count > 0, timing.as_dict()
+        assert timing.time >= timing.sql_time, timing.as_dict()
+
+    @helpers.change_config('ckan.instrumentation.sinks',
+                           'ckan.new_tests.lib.test_instrumentation:'
+                           'RecordingSink')
+    def test_solr_requests_are_counted_in_every_running_action(self):
+        outer = instrumentation.start_action('outer')
+        inner = instrumentation.start_action('inner')
+        with instrumentation.solr_request():
+            pass
+        instrumentation.finish_action(inner)
+        with instrumentation.solr_request():
+            pass
+        instrumentation.finish_action(outer)
+
+        eq_(inner.solr_count, 1)
+        eq_(outer.solr_count, 2)
+
+    @helpers.change_config('ckan.instrumentation.sinks', 'memory')
+    def test_memory_sink_histograms(self):
+        helpers.call_action('package_list')
+        helpers.call_action('package_list')
+
+        metrics = helpers.call_action('status_metrics')
+
+        eq_(metrics['buckets'], instrumentation.HISTOGRAM_BUCKETS)
+        package_list = metrics['actions']['package_list']
+        eq_(package_list['count'], 2)
+        eq_(sum(package_list['histogram']), 2)
+
+    def test_status_metrics_without_memory_sink(self):
+        nose.tools.assert_raises(logic.NotFound, helpers.call_action,
+                                 'status_metrics')
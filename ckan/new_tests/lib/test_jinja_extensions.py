@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+
+import nose
+from jinja2 import bccache
+
+import ckan.lib.jinja_extensions as jinja_extensions
+
+eq_ = nose.tools.eq_
+
+
+class TestTemplateNames(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, filename, source='{{ 1 }}'):
+        filename = os.path.join(self.directory, filename)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            f.write(source)
+        return filename
+
+    def test_hidden_templates_get_their_ckan_extends_names(self):
+        extension = os.path.join(self.directory, 'extension')
+        core = os.path.join(self.directory, 'core')
+        self._write('extension/page.html', '{% ckan_extends %}')
+        self._write('core/page.html')
+        self._write('core/snippets/tag.html')
+        self._write('core/notes.txt')
+
+        names = jinja_extensions.template_names([extension, core])
+
+        eq_([name for name, filename in names],
+            ['page.html', '*0*page.html', 'snippets/tag.html'])
+
+    def test_genshi_templates_are_skipped(self):
+        self._write('legacy.html',
+                    '<html xmlns:py="http://genshi.edgewall.org/"></html>')
+
+        eq_(jinja_extensions.template_names([self.directory]), [])
+
+
+class TestBytecodeCache(object):
+
+    def test_no_cache_by_default(self):
+        eq_(jinja_extensions.get_bytecode_cache({}), None)
+
+    def test_filesystem_cache(self):
+        directory = os.path.join(tempfile.mkdtemp(), 'jinja2')
+        try:
+            cache = jinja_extensions.get_bytecode_cache({
+                'ckan.jinja2.bytecode_cache': 'filesystem',
+                'ckan.jinja2.bytecode_cache_dir': directory})
+
+            assert isinstance(cache, bccache.FileSystemBytecodeCache)
+            assert os.path.isdir(directory)
+        finally:
+            shutil.rmtree(os.path.dirname(directory))
+
+    def test_filesystem_cache_in_an_existing_cache_dir(self):
+        directory = tempfile.mkdtemp()
+        config = {'ckan.jinja2.bytecode_cache': 'filesystem',
+                  'cache_dir': directory}
+        try:
+            jinja_extensions.get_bytecode_cache(config)
+            cache = jinja_extensions.get_bytecode_cache(config)
+
+            assert isinstance(cache, bccache.FileSystemBytecodeCache)
+            assert os.path.isdir(os.path.join(directory, 'jinja2'))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_filesystem_cache_directory_writable_by_others_is_refused(self):
+        directory = tempfile.mkdtemp()
+        os.chmod(directory, 0777)
+        try:
+            nose.tools.assert_raises(
+                Exception, jinja_extensions.get_bytecode_cache,
+                {'ckan.jinja2.bytecode_cache': 'filesystem',
+                 'ckan.jinja2.bytecode_cache_dir': directory})
+        finally:
+            shutil.rmtree(directory)
+
+    @nose.tools.raises(Exception)
+    def test_filesystem_cache_needs_a_directory(self):
+        jinja_extensions.get_bytecode_cache({
+            'ckan.jinja2.bytecode_cache': 'filesystem'})
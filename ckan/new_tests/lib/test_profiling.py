@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+
+import nose
+
+import ckan.lib.profiling as profiling
+
+eq_ = nose.tools.eq_
+
+
+def hello_app(environ, start_response):
+    profiling.record_template('hello.html', 0.002)
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return ['Hello']
+
+
+class TestProfiling(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def _call(self, app, url='/dataset'):
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': url,
+                   'QUERY_STRING': 'q=census'}
+        app_iter = app(environ, lambda status, headers, exc_info=None: None)
+        body = ''.join(app_iter)
+        app_iter.close()
+        return body
+
+    def _middleware(self, **config):
+        config['ckan.profiling.directory'] = self.directory
+        return profiling.ProfilingMiddleware(hello_app, config)
+
+    def test_sampled_request_is_profiled(self):
+        app = self._middleware(**{'ckan.profiling.sample_rate': '1'})
+
+        eq_(self._call(app), 'Hello')
+
+        profile, = app.store.list()
+        eq_(profile['url'], '/dataset?q=census')
+        eq_(profile['status'], '200 OK')
+        eq_(profile['reason'], 'sampled')
+        eq_(profile['templates'], [{'template': 'hello.html', 'time': 2.0}])
+        assert app.store.stats_path(profile['id'])
+
+    def test_fast_requests_are_not_kept(self):
+        app = self._middleware(**{'ckan.profiling.slow_threshold': '10000'})
+
+        eq_(self._call(app), 'Hello')
+
+        eq_(app.store.list(), [])
+
+    def test_store_keeps_the_most_recent_profiles(self):
+        app = self._middleware(**{'ckan.profiling.sample_rate': '1',
+                                  'ckan.profiling.max_profiles': '2'})
+
+        for url in ('/first', '/second', '/third'):
+            self._call(app, url)
+
+        eq_([profile['url'] for profile in app.store.list()],
+            ['/third?q=census', '/second?q=census'])
+
+    def test_store_needs_a_directory(self):
+        nose.tools.assert_raises(Exception, profiling.get_store, {})
+
+    def test_store_directory_is_private(self):
+        directory = os.path.join(self.directory, 'profiles')
+
+        profiling.get_store({'ckan.profiling.directory': directory})
+
+        eq_(os.stat(directory).st_mode & 0777, 0700)
@@ -0,0 +1,24 @@
+import nose
+
+import ckan.lib.raw_json as raw_json
+from ckan.common import json
+
+eq_ = nose.tools.eq_
+
+
+class TestDumps(object):
+
+    def test_raw_json_is_not_encoded_again(self):
+        value = {'records': raw_json.RawJSON('[{"a": 1}, {"a": 2}]'),
+                 'total': 2}
+
+        eq_(json.loads(raw_json.dumps(value)),
+            {'records': [{'a': 1}, {'a': 2}], 'total': 2})
+
+    def test_several_raw_json_values(self):
+        value = [raw_json.RawJSON(str(i)) for i in range(12)]
+
+        eq_(raw_json.dumps(value), json.dumps(range(12)))
+
+    def test_other_values_are_not_serializable(self):
+        nose.tools.assert_raises(TypeError, raw_json.dumps, object())
@@ -0,0 +1,51 @@
+import threading
+
+import nose
+
+import ckan.lib.startup as startup
+import ckan.logic as logic
+
+eq_ = nose.tools.eq_
+
+
+class TestStartup(object):
+
+    def setup(self):
+        startup.reset()
+
+    def teardown(self):
+        startup.reset()
+
+    def test_phases_are_timed(self):
+        with startup.phase('first'):
+            pass
+        with startup.phase('second'):
+            pass
+
+        eq_([name for name, time in startup.get_timings()],
+            ['first', 'second'])
+
+    def test_background_steps_do_not_raise(self):
+        ran = threading.Event()
+
+        def step():
+            ran.set()
+            raise Exception('Solr is down')
+
+        startup.in_background('test', step).join()
+
+        assert ran.is_set()
+
+
+class TestGetAction(object):
+
+    def test_actions_are_wrapped_once(self):
+        logic.clear_actions_cache()
+
+        package_show = logic.get_action('package_show')
+
+        assert logic.get_action('package_show') is package_show
+        assert 'package_list' not in logic._wrapped_actions
+
+    def test_unknown_actions(self):
+        nose.tools.assert_raises(KeyError, logic.get_action, 'no_such_action')
@@ -9,6 +9,8 @@ import ckan.new_tests.helpers as helpers
 import ckan.new_tests.factories as factories
 import ckan.model as model
 import ckan.logic as logic
+import ckan.logic.schema as schema
+import ckan.plugins as plugins
 
 assert_equals = nose.tools.assert_equals
 assert_raises = nose.tools.assert_raises
@@ -163,6 +165,130 @@ class TestResourceViewCreate(object):
         return default_attributes
 
 
+class TestResourceViewCreateMany(object):
+
+    @classmethod
+    def setup_class(cls):
+        plugins.load('image_view', 'webpage_view')
+
+    @classmethod
+    def teardown_class(cls):
+        plugins.unload('image_view', 'webpage_view')
+
+    def setup(self):
+        helpers.reset_db()
+
+    def _create_many(self, resource_ids, **kwargs):
+        params = {
+            'resource_ids': resource_ids,
+            'view_type': 'image',
+            'title': 'View',
+            'description': 'A nice view',
+        }
+        params.update(kwargs)
+        return helpers.call_action('resource_view_create_many', **params)
+
+    def test_creates_a_view_for_each_resource(self):
+        resource_ids = [factories.Resource()['id'] for i in range(3)]
+
+        result = self._create_many(resource_ids)
+
+        assert_equals(sorted(result), sorted(resource_ids))
+        for resource_id in resource_ids:
+            views = helpers.call_action('resource_view_list', id=resource_id)
+            assert_equals(len(views), 1)
+            assert_equals(views[0]['title'], 'View')
+            assert_equals(views[0]['description'], 'A nice view')
+            assert_equals(views[0]['view_type'], 'image')
+
+    def test_views_come_after_existing_views(self):
+        resource_id = factories.Resource()['id']
+        helpers.call_action('resource_view_create', resource_id=resource_id,
+                            view_type='webpage', title='Web Page View')
+
+        self._create_many([resource_id])
+
+        views = helpers.call_action('resource_view_list', id=resource_id)
+        assert_equals([view['view_type'] for view in views],
+                      ['webpage', 'image'])
+
+    def test_skips_resources_that_have_a_view_of_the_type(self):
+        resource_ids = [factories.Resource()['id'] for i in range(2)]
+        self._create_many(resource_ids[:1])
+
+        result = self._create_many(resource_ids)
+
+        assert_equals(result, resource_ids[1:])
+        views = helpers.call_action('resource_view_list', id=resource_ids[0])
+        assert_equals(len(views), 1)
+
+    def test_requires_title(self):
+        assert_raises(logic.ValidationError, self._create_many,
+                      [factories.Resource()['id']], title='')
+
+    def test_raises_if_couldnt_find_resource(self):
+        assert_raises(logic.ValidationError, self._create_many,
+                      [factories.Resource()['id'], 'unknown'])
+
+    def test_doesnt_change_the_schema_in_the_context(self):
+        view_schema = schema.default_create_resource_view_schema()
+        keys = sorted(view_schema)
+
+        self._create_many([factories.Resource()['id']],
+                          context={'schema': view_schema})
+
+        assert_equals(sorted(view_schema), keys)
+
+
+class TestPackageCreateMany(object):
+
+    def setup(self):
+        helpers.reset_db()
+
+    def test_creates_the_datasets_in_one_revision(self):
+        results = helpers.call_action('package_create_many', datasets=[
+            {'name': 'first-dataset'}, {'name': 'second-dataset'}])
+
+        assert_equals([result['success'] for result in results],
+                      [True, True])
+        first = model.Package.get(results[0]['result'])
+        second = model.Package.get(results[1]['result'])
+        assert_equals(first.name, 'first-dataset')
+        assert_equals(first.revision_id, second.revision_id)
+
+    def test_returns_errors_without_aborting_the_batch(self):
+        results = helpers.call_action('package_create_many', datasets=[
+            {'name': 'first-dataset'}, {'name': 'x'},
+            {'name': 'third-dataset'}])
+
+        assert_equals([result['success'] for result in results],
+                      [True, False, True])
+        assert 'name' in results[1]['error'], results[1]['error']
+        assert_equals(results[1]['error']['__type'], 'Validation Error')
+        assert model.Package.get('first-dataset')
+        assert model.Package.get('third-dataset')
+
+    def test_returns_the_datasets_if_return_id_only_is_false(self):
+        results = helpers.call_action(
+            'package_create_many', context={'return_id_only': False},
+            datasets=[{'name': 'first-dataset'}])
+
+        assert_equals(results[0]['result']['name'], 'first-dataset')
+
+    def test_indexes_the_datasets(self):
+        helpers.call_action('package_create_many', datasets=[
+            {'name': 'first-dataset'}, {'name': 'second-dataset'}])
+
+        result = helpers.call_action('package_search', q='*:*')
+        assert_equals(sorted(dataset['name']
+                             for dataset in result['results']),
+                      ['first-dataset', 'second-dataset'])
+
+    def test_datasets_must_be_a_list(self):
+        assert_raises(logic.ValidationError, helpers.call_action,
+                      'package_create_many', datasets={'name': 'dataset'})
+
+
 class TestResourceCreate(object):
 
     @classmethod
@@ -181,3 +307,51 @@ class TestResourceCreate(object):
 
         assert_raises(logic.ValidationError, helpers.call_action,
                       'resource_create', **data_dict)
+
+    def test_adds_the_resource_after_the_others(self):
+        dataset = factories.Dataset()
+        first = helpers.call_action('resource_create',
+                                    package_id=dataset['id'],
+                                    url='http://example.com/1.csv')
+        second = helpers.call_action('resource_create',
+                                     package_id=dataset['id'],
+                                     url='http://example.com/2.csv')
+
+        dataset = helpers.call_action('package_show', id=dataset['id'])
+
+        assert_equals([resource['id'] for resource in dataset['resources']],
+                      [first['id'], second['id']])
+        assert_equals(second['position'], 1)
+        assert_equals(second['format'], 'CSV')
+
+    def test_returns_the_errors_of_the_resource(self):
+        dataset = factories.Dataset()
+
+        try:
+            helpers.call_action('resource_create', package_id=dataset['id'],
+                                url='http://example.com', size='big')
+        except logic.ValidationError, e:
+            assert 'size' in e.error_dict, e.error_dict
+        else:
+            assert False, 'ValidationError not raised'
+
+    def test_updates_the_dataset_modification_time(self):
+        dataset = factories.Dataset()
+
+        helpers.call_action('resource_create', package_id=dataset['id'],
+                            url='http://example.com')
+
+        updated = helpers.call_action('package_show', id=dataset['id'])
+        assert updated['metadata_modified'] > dataset['metadata_modified']
+
+    def test_cant_take_the_id_of_another_datasets_resource(self):
+        other = factories.Resource(url='http://example.com/other.csv')
+        dataset = factories.Dataset()
+
+        assert_raises(logic.ValidationError, helpers.call_action,
+                      'resource_create', package_id=dataset['id'],
+                      id=other['id'], url='http://example.com/mine.csv')
+
+        other_after = helpers.call_action('resource_show', id=other['id'])
+        assert_equals(other_after['url'], 'http://example.com/other.csv')
+        assert_equals(other_after['package_id'], other['package_id'])
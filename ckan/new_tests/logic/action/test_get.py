@@ -1,6 +1,7 @@
 import nose.tools
 
 import ckan.logic as logic
+import ckan.model as model
 import ckan.lib.search as search
 import ckan.new_tests.helpers as helpers
 import ckan.new_tests.factories as factories
@@ -51,6 +52,36 @@ class TestGet(object):
 
         eq(group_list, ['bb', 'aa'])
 
+    def test_group_list_limit_and_offset(self):
+
+        factories.Group(name='aa')
+        factories.Group(name='bb')
+        factories.Group(name='cc')
+
+        group_list = helpers.call_action('group_list', limit=1, offset=1)
+
+        eq(group_list, ['bb'])
+
+    def test_group_list_limit_sort_by_package_count(self):
+
+        factories.Group(name='aa')
+        factories.Group(name='bb')
+        factories.Group(name='cc')
+        factories.Dataset(groups=[{'name': 'bb'}, {'name': 'cc'}])
+        factories.Dataset(groups=[{'name': 'bb'}])
+
+        group_list = helpers.call_action('group_list', sort='package_count',
+                                         limit=2, all_fields=True)
+
+        eq([g['name'] for g in group_list], ['bb', 'cc'])
+        eq([g['package_count'] for g in group_list], [2, 1])
+
+    def test_group_list_invalid_limit(self):
+
+        nose.tools.assert_raises(
+            logic.ValidationError,
+            helpers.call_action, 'group_list', limit=-1)
+
     def test_group_list_all_fields(self):
 
         group = factories.Group()
@@ -180,6 +211,17 @@ class TestGet(object):
         assert (sorted(org_list) ==
                 sorted([g['name'] for g in [org1, org2]]))
 
+    def test_organization_list_limit_and_offset(self):
+
+        factories.Organization(name='aa')
+        factories.Organization(name='bb')
+        factories.Organization(name='cc')
+
+        org_list = helpers.call_action('organization_list', sort='name desc',
+                                       limit=2, offset=1)
+
+        eq(org_list, ['bb', 'aa'])
+
     def test_organization_show(self):
 
         org = factories.Organization()
@@ -247,6 +289,47 @@ class TestGet(object):
         assert org_dict['packages'][0]['name'] == 'dataset_1'
         assert org_dict['package_count'] == 1
 
+    def test_user_list_number_of_edits(self):
+
+        user = factories.User()
+        factories.User()
+        factories.Dataset(user=user)
+
+        user_list = helpers.call_action('user_list', order_by='edits')
+
+        eq(user_list[0]['name'], user['name'])
+        eq(user_list[0]['number_of_edits'], 1)
+        eq(user_list[1]['number_of_edits'], 0)
+
+    def test_user_list_limit_and_offset(self):
+
+        factories.User(name='aa', fullname=None)
+        factories.User(name='bb', fullname=None)
+        factories.User(name='cc', fullname=None)
+
+        user_list = helpers.call_action('user_list', q='', limit=1, offset=1)
+
+        eq([u['name'] for u in user_list], ['bb'])
+
+    def test_tag_list_limit_and_offset(self):
+
+        factories.Dataset(tags=[{'name': 'aa'}, {'name': 'bb'},
+                                {'name': 'cc'}])
+
+        tag_list = helpers.call_action('tag_list', limit=1, offset=1)
+
+        eq(tag_list, ['bb'])
+
+    def test_tag_autocomplete_ranks_prefix_matches_by_popularity(self):
+
+        factories.Dataset(tags=[{'name': 'economy'}, {'name': 'ecology'},
+                                {'name': 'recession'}])
+        factories.Dataset(tags=[{'name': 'ecology'}])
+
+        tag_names = helpers.call_action('tag_autocomplete', q='ec', limit=10)
+
+        eq(tag_names, ['ecology', 'economy', 'recession'])
+
     def test_user_get(self):
 
         user = factories.User()
@@ -424,6 +507,82 @@ class TestGet(object):
                                            q='some')
         eq(len(package_list), 1)
 
+    def test_package_autocomplete_sees_new_datasets(self):
+
+        factories.Dataset(name='river-levels')
+        eq(len(helpers.call_action('package_autocomplete', q='riv')), 1)
+
+        factories.Dataset(name='river-quality')
+        package_list = helpers.call_action('package_autocomplete', q='riv')
+
+        eq([p['name'] for p in package_list],
+           ['river-levels', 'river-quality'])
+
+    def test_format_autocomplete_ignores_case(self):
+
+        factories.Resource(format='CSV')
+        factories.Resource(format='csv')
+        factories.Resource(format='JSON')
+
+        formats = helpers.call_action('format_autocomplete', q='s')
+
+        eq(formats, ['csv', 'json'])
+
+    def test_site_statistics(self):
+
+        factories.Resource()
+        factories.Group()
+        factories.Organization()
+
+        stats = helpers.call_action('site_statistics')
+
+        eq((stats['dataset_count'], stats['resource_count'],
+            stats['group_count'], stats['organization_count']),
+           (1, 1, 1, 1))
+
+    def test_site_statistics_are_a_snapshot(self):
+
+        helpers.call_action('site_statistics')
+        factories.Group()
+
+        stats = helpers.call_action('site_statistics')
+
+        eq(stats['group_count'], 0)
+
+    def test_site_statistics_dont_commit_the_session(self):
+
+        model.Session.add(model.SystemInfo('pending', 'value'))
+
+        helpers.call_action('site_statistics')
+        model.Session.rollback()
+
+        eq(model.get_system_info('pending'), None)
+        assert model.get_system_info('ckan.site_statistics')
+
+    def test_revision_list_pages_after_since_id(self):
+
+        factories.Dataset()
+        factories.Dataset()
+        revisions = helpers.call_action('revision_list')
+
+        page = helpers.call_action('revision_list', since_id=revisions[-2],
+                                   limit=5)
+
+        eq(page, revisions[-1:])
+
+    def test_package_revision_list_pages_before_before_id(self):
+
+        dataset = factories.Dataset()
+        factories.Resource(package_id=dataset['id'])
+        factories.Resource(package_id=dataset['id'])
+        revisions = helpers.call_action('package_revision_list',
+                                        id=dataset['id'])
+
+        page = helpers.call_action('package_revision_list', id=dataset['id'],
+                                   before_id=revisions[0]['id'], limit=1)
+
+        eq([revision['id'] for revision in page], [revisions[1]['id']])
+
 
 class TestBadLimitQueryParameters(object):
     '''test class for #1258 non-int query parameters cause 500 errors
@@ -425,6 +425,72 @@ class TestUpdate(object):
                                            "http://a.html"]
 
 
+class TestPackageUpdateMany(object):
+
+    def setup(self):
+        helpers.reset_db()
+
+    def test_updates_the_datasets(self):
+        first = factories.Dataset()
+        second = factories.Dataset()
+
+        results = helpers.call_action('package_update_many', datasets=[
+            dict(first, title='New first title'),
+            dict(second, title='New second title')])
+
+        assert_equals(results, [{'success': True, 'result': first['id']},
+                                {'success': True, 'result': second['id']}])
+        first = helpers.call_action('package_show', id=first['id'])
+        second = helpers.call_action('package_show', id=second['id'])
+        assert_equals(first['title'], 'New first title')
+        assert_equals(second['title'], 'New second title')
+        assert_equals(first['revision_id'], second['revision_id'])
+
+    def test_returns_errors_without_aborting_the_batch(self):
+        dataset = factories.Dataset()
+
+        results = helpers.call_action('package_update_many', datasets=[
+            {'id': 'does-not-exist'},
+            dict(dataset, title='New title')])
+
+        assert_equals(results[0]['success'], False)
+        assert_equals(results[0]['error']['__type'], 'Not Found Error')
+        assert_equals(results[1]['success'], True)
+        dataset = helpers.call_action('package_show', id=dataset['id'])
+        assert_equals(dataset['title'], 'New title')
+
+
+class TestResourceUpdate(object):
+
+    def setup(self):
+        helpers.reset_db()
+
+    def test_updates_only_the_given_resource(self):
+        dataset = factories.Dataset()
+        first = factories.Resource(package_id=dataset['id'])
+        second = factories.Resource(package_id=dataset['id'])
+
+        updated = helpers.call_action('resource_update', id=first['id'],
+                                      url='http://example.com/new.csv',
+                                      name='New name')
+
+        assert_equals(updated['url'], 'http://example.com/new.csv')
+        assert_equals(updated['name'], 'New name')
+        dataset = helpers.call_action('package_show', id=dataset['id'])
+        assert_equals([resource['id'] for resource in dataset['resources']],
+                      [first['id'], second['id']])
+        assert_equals(dataset['resources'][1]['revision_id'],
+                      second['revision_id'])
+
+    def test_deleted_resources_cannot_be_updated(self):
+        dataset = factories.Dataset()
+        resource = factories.Resource(package_id=dataset['id'])
+        helpers.call_action('resource_delete', id=resource['id'])
+
+        assert_raises(logic.NotFound, helpers.call_action, 'resource_update',
+                      id=resource['id'], url='http://example.com')
+
+
 class TestUpdateSendEmailNotifications(object):
     @classmethod
     def setup_class(cls):
@@ -105,3 +105,20 @@ class TestCreate(object):
         gmc.return_value = {'success': True}
         result = helpers.call_auth('user_invite', context=context, **data_dict)
         assert result is True
+
+    def test_resource_view_create_many_needs_all_packages_updated(self):
+        user = factories.User()
+        org = factories.Organization(user=user)
+        own = factories.Resource(package_id=factories.Dataset(
+            owner_org=org['id'], user=user)['id'])
+        other = factories.Resource(package_id=factories.Dataset(
+            owner_org=factories.Organization()['id'])['id'])
+        context = {'user': user['name'], 'model': core_model}
+
+        result = helpers.call_auth('resource_view_create_many',
+                                   context=context,
+                                   resource_ids=[own['id']])
+        assert result is True
+        nose.tools.assert_raises(logic.NotAuthorized, helpers.call_auth,
+                                 'resource_view_create_many', context=context,
+                                 resource_ids=[own['id'], other['id']])
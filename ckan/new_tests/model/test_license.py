@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import urllib2
+
+import mock
+import nose
+
+import ckan.model.license as license
+import ckan.new_tests.helpers as helpers
+
+eq_ = nose.tools.eq_
+
+LICENSES_PATH = os.path.join(tempfile.gettempdir(), 'ckan-test-licenses.json')
+LICENSES_URL = 'file://' + LICENSES_PATH
+LICENSES = [{'id': 'open-license', 'title': 'An open license',
+             'is_okd_compliant': True, 'is_osi_compliant': False}]
+
+
+def _write_licenses(licenses):
+    with open(LICENSES_PATH, 'w') as f:
+        json.dump(licenses, f)
+
+
+class TestLicenseRegister(object):
+
+    def setup(self):
+        _write_licenses(LICENSES)
+
+    def teardown(self):
+        os.remove(LICENSES_PATH)
+
+    def test_licenses_are_looked_up_by_id(self):
+        register = license.LicenseRegister()
+
+        eq_(register['cc-by'].id, 'cc-by')
+        eq_(register.get('no-such-license'), None)
+        nose.tools.assert_raises(KeyError, lambda: register['no-license'])
+
+    def test_open_license_ids(self):
+        register = license.LicenseRegister()
+
+        assert 'cc-by' in register.open_license_ids
+        assert 'other-closed' not in register.open_license_ids
+
+    def test_default_licenses_are_never_stale(self):
+        register = license.LicenseRegister()
+        register.loaded = 0
+
+        assert not register.is_stale()
+
+    @helpers.change_config('licenses_group_url', LICENSES_URL)
+    def test_changed_licenses_make_a_new_register(self):
+        register = license.LicenseRegister()
+        _write_licenses(LICENSES + [{'id': 'closed-license',
+                                     'title': 'A closed license'}])
+
+        refreshed = register.refreshed()
+
+        eq_(register.keys(), ['open-license'])
+        eq_(refreshed.keys(), ['open-license', 'closed-license'])
+
+    @helpers.change_config('licenses_group_url', LICENSES_URL)
+    def test_unchanged_licenses_keep_the_register(self):
+        register = license.LicenseRegister()
+        register.etag = '"1"'
+
+        with mock.patch('urllib2.urlopen') as urlopen:
+            urlopen.side_effect = urllib2.HTTPError(
+                LICENSES_URL, 304, 'Not Modified', {}, None)
+            refreshed = register.refreshed()
+
+        assert refreshed is register
+        request = urlopen.call_args[0][0]
+        eq_(request.get_header('If-none-match'), '"1"')
@@ -0,0 +1,46 @@
+import nose.tools
+
+import ckan.new_tests.helpers as helpers
+import ckan.new_tests.factories as factories
+import ckan.model as model
+
+eq = nose.tools.eq_
+
+
+class TestRevisionPackageChanges(object):
+
+    def setup(self):
+        helpers.reset_db()
+
+    def _changes(self, dataset):
+        revision_ids = [revision['id'] for revision in helpers.call_action(
+            'package_revision_list', id=dataset['id'])]
+        revision_ids.reverse()
+        changes = model.revision_package_changes(revision_ids)
+        return [[(package.name, change) for package, change
+                 in changes[revision_id]] for revision_id in revision_ids]
+
+    def test_datasets_are_created_updated_and_deleted(self):
+        dataset = factories.Dataset(name='changed')
+        factories.Resource(package_id=dataset['id'])
+        helpers.call_action('package_delete', id=dataset['id'])
+
+        changes = self._changes(dataset)
+
+        eq(changes[0], [('changed', 'created')])
+        assert changes[-2][0][1].startswith('updated:resources'), changes
+        eq(changes[-1], [('changed', 'deleted')])
+
+    def test_each_revision_lists_its_datasets(self):
+        dataset = factories.Dataset(name='first')
+        factories.Dataset(name='second')
+        revision_id = helpers.call_action(
+            'package_revision_list', id=dataset['id'])[0]['id']
+        other_id = helpers.call_action('revision_list')[-1]
+
+        changes = model.revision_package_changes([revision_id, other_id])
+
+        eq([package.name for package, change in changes[revision_id]],
+           ['first'])
+        eq([package.name for package, change in changes[other_id]],
+           ['second'])
@@ -0,0 +1,36 @@
+import nose.tools
+
+import ckan.new_tests.helpers as helpers
+import ckan.new_tests.factories as factories
+import ckan.model as model
+
+eq = nose.tools.eq_
+
+
+class TestUserStats(object):
+
+    def setup(self):
+        helpers.reset_db()
+
+    def test_new_users_get_a_stats_row(self):
+        user = factories.User()
+
+        stats = model.Session.query(model.UserStats).get(user['id'])
+        eq(stats.number_of_edits, 0)
+        eq(stats.number_administered_packages, 0)
+
+    def test_edits_are_counted(self):
+        user = factories.User()
+
+        factories.Dataset(user=user)
+
+        eq(model.UserStats.get(user['id'], 'number_of_edits'), 1)
+
+    def test_a_missing_stats_row_is_created(self):
+        user = factories.User()
+        model.Session.execute(model.user_stats_table.delete())
+        model.Session.commit()
+
+        factories.Dataset(user=user)
+
+        eq(model.UserStats.get(user['id'], 'number_of_edits'), 1)
@@ -44,6 +44,111 @@ def _permissions_sql(context):
     return template.format(**context)
 
 
+def _benchmark_search(args):
+    import time
+    import pylons
+    import ckan.lib.raw_json as raw_json
+    import ckanext.datastore.db as db
+
+    def timed(func, repeat=3):
+        timings = []
+        for i in range(repeat):
+            start = time.time()
+            func()
+            timings.append((time.time() - start) * 1000)
+        return sorted(timings)[len(timings) // 2]
+
+    resource_id = u'datastore-benchmark'
+    write_url = pylons.config['ckan.datastore.write_url']
+    fields = [{'id': 'name', 'type': 'text'},
+              {'id': 'amount', 'type': 'numeric'},
+              {'id': 'count', 'type': 'int'},
+              {'id': 'date', 'type': 'timestamp'},
+              {'id': 'details', 'type': 'json'}]
+    rows = max(args.rows)
+    print('Loading {0} rows...'.format(rows))
+    db.create({}, {
+        'resource_id': resource_id,
+        'connection_url': write_url,
+        'fields': fields,
+        'records': [{'name': u'Row {0}'.format(i),
+                     'amount': i * 1.5,
+                     'count': i,
+                     'date': '2014-01-01T12:00:00',
+                     'details': {'index': i, 'tags': [u'a', u'b']}}
+                    for i in range(rows)],
+    })
+    try:
+        for limit in sorted(args.rows):
+            for records_format in ('objects', 'json'):
+                def search():
+                    result = db.search({}, {
+                        'resource_id': resource_id,
+                        'connection_url': write_url,
+                        'limit': limit,
+                        'records_format': records_format,
+                    })
+                    # as the API would send it
+                    raw_json.dumps(result)
+                print('{0:>8} rows, {1:<8} {2:10.1f} ms'.format(
+                    limit, records_format, timed(search)))
+    finally:
+        db.delete({}, {'resource_id': resource_id,
+                       'connection_url': write_url})
+
+
+def _benchmark_load(args):
+    import time
+    import pylons
+    import ckanext.datastore.db as db
+
+    resource_id = u'datastore-benchmark'
+    write_url = pylons.config['ckan.datastore.write_url']
+    fields = [{'id': u'text{0}'.format(i), 'type': 'text'}
+              for i in range(args.columns)]
+    records = [dict((field['id'], u'Row {0} of column {1}'.format(i, j))
+                    for j, field in enumerate(fields))
+               for i in range(args.rows)]
+
+    def load(defer_indexes, fts_index_method):
+        db.create({}, {
+            'resource_id': resource_id,
+            'connection_url': write_url,
+            'fields': fields,
+            'defer_indexes': defer_indexes,
+            'fts_index_method': fts_index_method,
+        })
+        for i in range(0, len(records), args.batch):
+            # as DataPusher loads a file
+            db.upsert({}, {
+                'resource_id': resource_id,
+                'connection_url': write_url,
+                'records': records[i:i + args.batch],
+                'method': 'insert',
+            })
+        if defer_indexes:
+            db.finalize({}, {
+                'resource_id': resource_id,
+                'connection_url': write_url,
+                'fts_index_method': fts_index_method,
+            })
+
+    print('Loading {0} rows of {1} text columns, {2} rows at a time'.format(
+        args.rows, args.columns, args.batch))
+    for fts_index_method in ('gist', 'gin'):
+        for defer_indexes in (False, True):
+            start = time.time()
+            try:
+                load(defer_indexes, fts_index_method)
+            finally:
+                db.delete({}, {'resource_id': resource_id,
+                               'connection_url': write_url})
+            print('{0:<5} {1:<9} {2:10.1f} ms'.format(
+                fts_index_method,
+                'deferred' if defer_indexes else 'immediate',
+                (time.time() - start) * 1000))
+
+
 parser = argparse.ArgumentParser(
     prog='paster datastore',
     description='Perform commands to set up the datastore',
@@ -62,6 +167,35 @@ parser_set_perms = subparsers.add_parser(
            'don\'t."')
 parser_set_perms.set_defaults(func=_set_permissions)
 
+parser_benchmark = subparsers.add_parser(
+    'benchmark-search',
+    description='Time datastore_search with each records_format.',
+    help='Load a table into the datastore and time searching it, with the '
+         'records converted in Python and rendered as JSON by PostgreSQL. '
+         'Only run it against a scratch database.')
+parser_benchmark.add_argument(
+    'rows', type=int, nargs='*', default=[1000, 10000, 100000],
+    help='the numbers of rows to return (default: 1000 10000 100000)')
+parser_benchmark.set_defaults(func=_benchmark_search)
+
+parser_benchmark_load = subparsers.add_parser(
+    'benchmark-load',
+    description='Time loading a table with and without deferred indexes.',
+    help='Load a table of text columns into the datastore in batches, with '
+         'its indexes built before the load and with them deferred to '
+         'datastore_finalize, using GiST and GIN full-text search indexes. '
+         'Only run it against a scratch database.')
+parser_benchmark_load.add_argument(
+    '--rows', type=int, default=100000,
+    help='the number of rows to load (default: 100000)')
+parser_benchmark_load.add_argument(
+    '--columns', type=int, default=20,
+    help='the number of text columns (default: 20)')
+parser_benchmark_load.add_argument(
+    '--batch', type=int, default=250,
+    help='the number of rows loaded at a time (default: 250)')
+parser_benchmark_load.set_defaults(func=_benchmark_load)
+
 
 class SetupDatastoreCommand(cli.CkanCommand):
     summary = parser.description
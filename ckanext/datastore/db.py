@@ -14,12 +14,16 @@ import distutils.version
 import sqlalchemy
 from sqlalchemy.exc import (ProgrammingError, IntegrityError,
                             DBAPIError, DataError)
+import psycopg2.extensions
 import psycopg2.extras
 import ckan.lib.cli as cli
+import ckan.lib.engines as engines
+import ckan.lib.raw_json as raw_json
 import ckan.plugins as p
 import ckan.plugins.toolkit as toolkit
 import ckanext.datastore.interfaces as interfaces
 import ckanext.datastore.helpers as datastore_helpers
+import ckanext.datastore.search_cache as search_cache
 from ckan.common import OrderedDict
 
 log = logging.getLogger(__name__)
@@ -35,7 +39,10 @@ else:
 
 _pg_types = {}
 _type_names = set()
-_engines = {}
+# whether the database at each URL can render JSON
+_native_json = {}
+# the fields and unique key of each table, by resource id
+_table_metadata = {}
 
 _TIMEOUT = 60000  # milliseconds
 
@@ -50,6 +57,20 @@ _PG_ERR_CODE = {
     'duplicate_alias': '42712',
 }
 
+# Changes whenever a table's columns or unique indexes change: adding a
+# column changes relnatts, recreating a table changes its oid and
+# relfilenode, and creating or dropping an index changes the list of indexes.
+_TABLE_STAMP_SQL = u'''
+    SELECT c.oid, c.relfilenode, c.relnatts,
+           array(SELECT idx.indexrelid FROM pg_index idx
+                 WHERE idx.indrelid = c.oid
+                 AND idx.indisunique = true
+                 AND idx.indisprimary = false
+                 ORDER BY idx.indexrelid)
+    FROM pg_class c
+    WHERE c.relname = %s AND c.relkind IN ('r', 'v')
+    '''
+
 _DATE_FORMATS = ['%Y-%m-%d',
                  '%Y-%m-%d %H:%M:%S',
                  '%Y-%m-%dT%H:%M:%S',
@@ -59,6 +80,33 @@ _DATE_FORMATS = ['%Y-%m-%d',
                  '%d-%m-%Y',
                  '%m-%d-%Y']
 
+# the datastore_create parameters that datastore_finalize builds indexes from
+_DEFERRED_INDEX_KEYS = ('indexes', 'lang', 'fts_index_method')
+
+# the keys of a search's results, which the search cache keeps
+_RESULT_KEYS = ('total', 'records', 'fields')
+
+_AGGREGATE_FUNCTIONS = ('count', 'sum', 'avg', 'min', 'max')
+_INTEGER_TYPES = ('int', 'int2', 'int4', 'int8')
+_NUMERIC_TYPES = _INTEGER_TYPES + ('float4', 'float8', 'numeric')
+_TIMESTAMP_TYPES = ('timestamp', 'timestamptz', 'date')
+_HISTOGRAM_INTERVALS = ('year', 'quarter', 'month', 'week', 'day', 'hour',
+                        'minute')
+
+# the types whose values row_to_json() renders as convert() returns them
+_JSON_NATIVE_TYPES = ('int2', 'int4', 'float4', 'float8', 'bool', 'text',
+                      'varchar', 'bpchar', 'name')
+# the types that convert() returns as strings that are the same as ::text
+_JSON_TEXT_TYPES = ('int8', 'numeric', 'tsvector', 'date', 'uuid')
+# datetime.isoformat(), which drops the microseconds when they're 0
+_ISOFORMAT_SQL = (u"replace(to_char({0}, 'YYYY-MM-DD\"T\"HH24:MI:SS.US'), "
+                  u"'.000000', '')")
+# the offset of a timestamptz, as datetime.isoformat() adds it
+_ISOFORMAT_OFFSET_SQL = (
+    u"CASE WHEN extract(timezone FROM {0}) < 0 THEN '-' ELSE '+' END || "
+    u"to_char(abs(extract(timezone FROM {0})) * interval '1 second', "
+    u"'HH24:MI')")
+
 _INSERT = 'insert'
 _UPSERT = 'upsert'
 _UPDATE = 'update'
@@ -87,12 +135,12 @@ def _is_valid_table_name(name):
 def _get_engine(data_dict):
     '''Get either read or write engine.'''
     connection_url = data_dict['connection_url']
-    engine = _engines.get(connection_url)
-
-    if not engine:
-        engine = sqlalchemy.create_engine(connection_url)
-        _engines[connection_url] = engine
-    return engine
+    # the pools of the configured URLs are configured by the options that
+    # start like the URL's option, e.g. ckan.datastore.write_pool_size
+    for prefix in ('ckan.datastore.write_', 'ckan.datastore.read_'):
+        if pylons.config.get(prefix + 'url') == connection_url:
+            return engines.engine_from_config(pylons.config, prefix)
+    return engines.engine_from_config({'url': connection_url}, '')
 
 
 def _cache_types(context):
@@ -209,10 +257,50 @@ def _guess_type(field):
     return 'text'
 
 
-def _get_fields(context, data_dict):
+def _get_table_metadata(context, resource_id):
+    '''Return the fields and unique key of a table, or None if there is no
+    table (or view) called `resource_id`.
+
+    They are kept for the life of the process and looked up again only when
+    the table's stamp changes, which costs one query on pg_class per action
+    rather than one query for each time they are needed.
+
+    '''
+    # the tables checked since the action connected to the database
+    connection = context['connection']
+    if context.get('table_metadata_connection') is not connection:
+        context['table_metadata_connection'] = connection
+        context['table_metadata'] = {}
+    checked = context['table_metadata']
+    if resource_id in checked:
+        return checked[resource_id]
+
+    row = connection.execute(_TABLE_STAMP_SQL, resource_id).fetchone()
+    if row is None:
+        return None
+    stamp = tuple(row)
+    metadata = _table_metadata.get(resource_id)
+    if metadata is None or metadata['stamp'] != stamp:
+        metadata = {
+            'stamp': stamp,
+            'fields': _query_fields(context, resource_id),
+            'unique_key': _query_unique_key(context, resource_id),
+        }
+        _table_metadata[resource_id] = metadata
+    checked[resource_id] = metadata
+    return metadata
+
+
+def _clear_table_metadata(context, resource_id):
+    '''Forget a table's fields and unique key after changing them.'''
+    context.get('table_metadata', {}).pop(resource_id, None)
+    _table_metadata.pop(resource_id, None)
+
+
+def _query_fields(context, resource_id):
     fields = []
     all_fields = context['connection'].execute(
-        u'SELECT * FROM "{0}" LIMIT 1'.format(data_dict['resource_id'])
+        u'SELECT * FROM "{0}" LIMIT 1'.format(resource_id)
     )
     for field in all_fields.cursor.description:
         if not field[0].startswith('_'):
@@ -223,6 +311,14 @@ def _get_fields(context, data_dict):
     return fields
 
 
+def _get_fields(context, data_dict):
+    metadata = _get_table_metadata(context, data_dict['resource_id'])
+    if metadata is None:
+        # let the query fail as it would for any other missing table
+        return _query_fields(context, data_dict['resource_id'])
+    return [dict(field) for field in metadata['fields']]
+
+
 def _get_fields_types(context, data_dict):
     all_fields = _get_fields(context, data_dict)
     all_fields.insert(0, {'id': '_id', 'type': 'int'})
@@ -379,14 +475,21 @@ def create_alias(context, data_dict):
                 })
 
 
-def create_indexes(context, data_dict):
+def create_indexes(context, data_dict, concurrently=False, full_text=True):
+    '''Create the table's full-text search indexes, unless `full_text` is
+    False, and the indexes and primary key in `data_dict`.
+
+    With `concurrently` the indexes are built with CREATE INDEX CONCURRENTLY,
+    which has to be run outside a transaction.
+    '''
     connection = context['connection']
     indexes = datastore_helpers.get_list(data_dict.get('indexes'))
     # primary key is not a real primary key
     # it's just a unique key
     primary_key = datastore_helpers.get_list(data_dict.get('primary_key'))
 
-    sql_index_tmpl = u'CREATE {unique} INDEX "{name}" ON "{res_id}"'
+    sql_index_tmpl = u'CREATE {unique} INDEX ' + (
+        u'CONCURRENTLY ' if concurrently else u'') + u'"{name}" ON "{res_id}"'
     sql_index_string_method = sql_index_tmpl + u' USING {method}({fields})'
     sql_index_string = sql_index_tmpl + u' ({fields})'
     sql_index_strings = []
@@ -395,11 +498,12 @@ def create_indexes(context, data_dict):
     field_ids = _pluck('id', fields)
     json_fields = [x['id'] for x in fields if x['type'] == 'nested']
 
-    fts_indexes = _build_fts_indexes(connection,
-                                     data_dict,
-                                     sql_index_string_method,
-                                     fields)
-    sql_index_strings = sql_index_strings + fts_indexes
+    if full_text:
+        fts_indexes = _build_fts_indexes(connection,
+                                         data_dict,
+                                         sql_index_string_method,
+                                         fields)
+        sql_index_strings = sql_index_strings + fts_indexes
 
     if indexes is not None:
         _drop_indexes(context, data_dict, False)
@@ -450,6 +554,8 @@ def _build_fts_indexes(connection, data_dict, sql_index_str_method, fields):
     if default_fts_lang is None:
         default_fts_lang = u'english'
     fts_lang = data_dict.get('lang', default_fts_lang)
+    fts_method = data_dict.get('fts_index_method') or pylons.config.get(
+        'ckan.datastore.default_fts_index_method', u'gist')
 
     # create full-text search indexes
     to_tsvector = lambda x: u"to_tsvector('{0}', '{1}')".format(fts_lang, x)
@@ -461,7 +567,7 @@ def _build_fts_indexes(connection, data_dict, sql_index_str_method, fields):
             res_id=resource_id,
             unique='',
             name=_generate_index_name(resource_id, text_field),
-            method='gist', fields=text_field))
+            method=fts_method, fields=text_field))
 
     return fts_indexes
 
@@ -489,6 +595,67 @@ def _get_index_names(connection, resource_id):
     return [result[0] for result in results]
 
 
+def _drop_invalid_indexes(connection, resource_id):
+    '''Drop the indexes left behind by CREATE INDEX CONCURRENTLY failing.'''
+    sql = u"""
+        SELECT
+            i.relname AS index_name
+        FROM
+            pg_class t,
+            pg_class i,
+            pg_index idx
+        WHERE
+            t.oid = idx.indrelid
+            AND i.oid = idx.indexrelid
+            AND t.relkind = 'r'
+            AND idx.indisvalid = false
+            AND t.relname = %s
+        """
+    for index in connection.execute(sql, resource_id).fetchall():
+        connection.execute(
+            u'DROP INDEX "{0}"'.format(index[0]).replace('%', '%%'))
+
+
+def _get_deferred_indexes(context, resource_id):
+    '''Return the index parameters that create() deferred building for
+    the table, or None if there aren't any.
+
+    They are kept in the table's comment until finalize() builds them.
+    '''
+    comment = context['connection'].execute(
+        u"SELECT obj_description(%s::regclass, 'pg_class')",
+        u'"{0}"'.format(resource_id)).scalar()
+    try:
+        return json.loads(comment)['deferred_indexes']
+    except (TypeError, ValueError, KeyError):
+        return None
+
+
+def _set_deferred_indexes(context, resource_id, deferred):
+    if deferred is None:
+        comment = None
+    else:
+        comment = json.dumps({'deferred_indexes': deferred})
+    context['connection'].execute(
+        u'COMMENT ON TABLE "{0}" IS %s'.format(resource_id), comment)
+
+
+def _defer_indexes(context, data_dict):
+    '''Create the table's primary key, which upserts need, and record the
+    rest of its indexes for finalize() to build after the records have been
+    loaded.'''
+    resource_id = data_dict['resource_id']
+    deferred = _get_deferred_indexes(context, resource_id) or {}
+    for key in _DEFERRED_INDEX_KEYS:
+        if key in data_dict:
+            deferred[key] = data_dict[key]
+    _set_deferred_indexes(context, resource_id, deferred)
+    if 'primary_key' in data_dict:
+        create_indexes(context, {'resource_id': resource_id,
+                                 'primary_key': data_dict['primary_key']},
+                       full_text=False)
+
+
 def _drop_indexes(context, data_dict, unique=False):
     sql_drop_index = u'DROP INDEX "{0}" CASCADE'
     sql_get_index_string = u"""
@@ -709,6 +876,13 @@ def upsert_data(context, data_dict):
 
 
 def _get_unique_key(context, data_dict):
+    metadata = _get_table_metadata(context, data_dict['resource_id'])
+    if metadata is None:
+        return _query_unique_key(context, data_dict['resource_id'])
+    return list(metadata['unique_key'])
+
+
+def _query_unique_key(context, resource_id):
     sql_get_unique_key = '''
     SELECT
         a.attname AS column_names
@@ -726,7 +900,7 @@ def _get_unique_key(context, data_dict):
         AND t.relname = %s
     '''
     key_parts = context['connection'].execute(sql_get_unique_key,
-                                              data_dict['resource_id'])
+                                              resource_id)
     return [x[0] for x in key_parts]
 
 
@@ -865,6 +1039,7 @@ def validate(context, data_dict):
     del data_dict_copy['connection_url']
     del data_dict_copy['resource_id']
     data_dict_copy.pop('id', None)
+    data_dict_copy.pop('records_format', None)
 
     for key, values in data_dict_copy.iteritems():
         if not values:
@@ -931,10 +1106,231 @@ def search_data(context, data_dict):
         limit=limit,
         offset=offset)
 
-    results = _execute_single_statement(context, sql_string, where_values)
-
     _insert_links(data_dict, limit, offset)
-    return format_results(context, results, data_dict)
+
+    def search():
+        if _records_as_json(context, data_dict):
+            if not datastore_helpers.is_single_statement(sql_string):
+                raise ValidationError({
+                    'query': ['Query is not a single statement.']
+                })
+            return format_results_as_json(context, sql_string,
+                                          [where_values], data_dict)
+
+        results = _execute_single_statement(context, sql_string, where_values)
+        return format_results(context, results, data_dict)
+
+    return _cached_search(data_dict, [data_dict['resource_id']],
+                          (sql_string, where_values), search)
+
+
+def _cached_search(data_dict, resource_ids, key, search):
+    '''Add the results of ``search()``, which reads the tables
+    `resource_ids` (all of them if None), to `data_dict`, from the search
+    cache if they are cached there under `key`.'''
+    def results():
+        searched = search()
+        return dict((result_key, searched[result_key])
+                    for result_key in _RESULT_KEYS if result_key in searched)
+    key = (data_dict['connection_url'], data_dict.get('records_format')) + key
+    data_dict.update(search_cache.get_or_search(resource_ids, key, results))
+    return data_dict
+
+
+def _aggregate_column(aggregate, fields_types):
+    '''Return the id and the SQL of the result column of `aggregate`, e.g.
+    ``count`` or ``sum amount``, and the type (int or float) that its values
+    are numbers of, or None if they aren't numbers.'''
+    function, _, field = aggregate.strip().partition(u' ')
+    field = field.strip() or None
+    if function not in _AGGREGATE_FUNCTIONS:
+        raise ValidationError({'aggregates': [
+            u'"{0}" is not one of {1}'.format(
+                function, u', '.join(_AGGREGATE_FUNCTIONS))]})
+    if field is None and function == 'count':
+        column = u'count(*)'
+        number = int
+    elif field not in fields_types:
+        raise ValidationError({'aggregates': [
+            u'field "{0}" not in table'.format(field)]})
+    else:
+        field_type = fields_types[field]
+        if function in ('sum', 'avg'):
+            allowed = _NUMERIC_TYPES
+        elif function in ('min', 'max'):
+            allowed = _NUMERIC_TYPES + _TIMESTAMP_TYPES + ('text',)
+        else:
+            allowed = None
+        if allowed is not None and field_type not in allowed:
+            raise ValidationError({'aggregates': [
+                u'{0} can\'t be used on field "{1}" of type {2}'.format(
+                    function, field, field_type)]})
+        column = u'{0}("{1}")'.format(function, field.replace('%', '%%'))
+        if function == 'avg' and field_type != 'numeric':
+            column += u'::float8'
+        if function == 'count' or (function != 'avg' and
+                                   field_type in _INTEGER_TYPES):
+            number = int
+        elif field_type in _NUMERIC_TYPES:
+            number = float
+        else:
+            number = None
+    column_id = function if field is None else u'{0} {1}'.format(function,
+                                                                 field)
+    return column_id, column, number
+
+
+def _histogram_column(context, histogram, fields_types, from_where,
+                      where_values):
+    '''Return the id of the column of the histogram's buckets, the SQL of
+    the lower bound of each value's bucket, and its parameters.'''
+    field = histogram.get('field')
+    if field not in fields_types:
+        raise ValidationError({'histogram': [
+            u'field "{0}" not in table'.format(field)]})
+    column = u'"{0}"'.format(field.replace('%', '%%'))
+    field_type = fields_types[field]
+
+    if field_type in _TIMESTAMP_TYPES:
+        interval = histogram.get('interval', 'day')
+        if interval not in _HISTOGRAM_INTERVALS:
+            raise ValidationError({'histogram': [
+                u'interval must be one of {0}'.format(
+                    u', '.join(_HISTOGRAM_INTERVALS))]})
+        return field, u'date_trunc(%s, {0})'.format(column), [interval]
+
+    if field_type not in _NUMERIC_TYPES:
+        raise ValidationError({'histogram': [
+            u'field "{0}" is not numeric or a timestamp'.format(field)]})
+    try:
+        buckets = int(histogram.get('buckets', 10))
+    except (TypeError, ValueError):
+        buckets = 0
+    if buckets < 1:
+        raise ValidationError({'histogram': [
+            u'buckets must be a positive integer']})
+    low, high = histogram.get('min'), histogram.get('max')
+    if low is None or high is None:
+        sql = u'SELECT min({0}), max({0}) {1}'.format(column, from_where)
+        bounds = context['connection'].execute(sql, [where_values]).fetchone()
+        low = bounds[0] if low is None else low
+        high = bounds[1] if high is None else high
+        # the maximum is in the last bucket rather than one of its own
+        capped = histogram.get('max') is None
+    else:
+        capped = False
+    if low is None or high is None or low == high:
+        return field, u'%s', [low]
+
+    bucket = u'width_bucket({0}::numeric, %s, %s, %s)'.format(column)
+    params = [low, high, buckets]
+    if capped:
+        bucket = u'least({0}, %s)'.format(bucket)
+        params.append(buckets)
+    # the lower bound of the bucket
+    sql = u'%s + ({0} - 1) * (%s - %s)::numeric / %s'.format(bucket)
+    return field, sql, [low] + params + [high, low, buckets]
+
+
+def aggregate_data(context, data_dict):
+    '''Group the records that match the ``filters`` and ``q`` of
+    `data_dict` and return their aggregates.
+
+    The records are filtered by the WHERE clauses and full-text search
+    queries that the IDatastore plugins build for a datastore_search with
+    the same parameters.
+    '''
+    fields_types = _get_fields_types(context, data_dict)
+
+    search_dict = dict((key, data_dict[key]) for key in
+                       ('resource_id', 'connection_url', 'filters', 'q',
+                        'plain', 'language') if key in data_dict)
+    validate(context, search_dict)
+    query_dict = {
+        'select': [],
+        'sort': [],
+        'where': []
+    }
+    for plugin in p.PluginImplementations(interfaces.IDatastore):
+        query_dict = plugin.datastore_search(context, search_dict,
+                                             fields_types, query_dict)
+    where_clause, where_values = _where(query_dict['where'])
+    from_where = u'FROM "{0}" {1} {2}'.format(
+        data_dict['resource_id'].replace('%', '%%'),
+        query_dict.get('ts_query', u'').replace('%', '%%'),
+        where_clause)
+
+    columns = []
+    params = []
+    group_by = datastore_helpers.get_list(data_dict.get('group_by')) or []
+    for field in group_by:
+        if field not in fields_types:
+            raise ValidationError({'group_by': [
+                u'field "{0}" not in table'.format(field)]})
+        columns.append((field, u'"{0}"'.format(field.replace('%', '%%'))))
+    if data_dict.get('histogram'):
+        field, column, column_params = _histogram_column(
+            context, data_dict['histogram'], fields_types, from_where,
+            where_values)
+        if field in group_by:
+            raise ValidationError({'histogram': [
+                u'field "{0}" is also in group_by'.format(field)]})
+        columns.append((field, column))
+        params += column_params
+    groups = len(columns)
+    aggregates = datastore_helpers.get_list(data_dict.get('aggregates'))
+    numbers = {}
+    for aggregate in aggregates or [u'count']:
+        column_id, column, number = _aggregate_column(aggregate,
+                                                      fields_types)
+        columns.append((column_id, column))
+        if number is not None:
+            numbers[column_id] = number
+
+    ids = [column_id for column_id, column in columns]
+    if len(set(ids)) < len(ids):
+        raise ValidationError({'aggregates': [
+            u'the result columns must have different names, not {0}'.format(
+                u', '.join(ids))]})
+
+    sort = []
+    for clause in datastore_helpers.get_list(data_dict.get('sort'),
+                                             False) or []:
+        column_id, _, order = clause.strip().rpartition(u' ')
+        if order.lower() not in (u'asc', u'desc'):
+            column_id, order = clause.strip(), u'asc'
+        if column_id not in ids:
+            raise ValidationError({'sort': [
+                u'"{0}" is not a result column'.format(column_id)]})
+        sort.append(u'{0} {1}'.format(ids.index(column_id) + 1, order))
+    # the groups in order by default
+    sort = sort or [unicode(i + 1) for i in range(groups)]
+
+    sql_string = u'''SELECT {columns} {from_where}
+                    {group_by} {sort} LIMIT {limit}'''.format(
+        columns=u', '.join(u'{0} AS "{1}"'.format(
+            column, column_id.replace('"', '""').replace('%', '%%'))
+            for column_id, column in columns),
+        from_where=from_where,
+        group_by=u'GROUP BY ' + u', '.join(
+            unicode(i + 1) for i in range(groups)) if groups else u'',
+        sort=u'ORDER BY ' + u', '.join(sort) if sort else u'',
+        limit=int(data_dict.get('limit', 1000)))
+    params += where_values
+
+    def search():
+        results = _execute_single_statement(context, sql_string, params)
+        result = format_results(context, results, data_dict)
+        # counts and sums are bigints or numerics, which convert() returns
+        # as strings, but the aggregates should be numbers
+        for record in result['records']:
+            for column_id, number in numbers.iteritems():
+                if record[column_id] is not None:
+                    record[column_id] = number(record[column_id])
+        return result
+
+    return _cached_search(data_dict, [data_dict['resource_id']],
+                          (sql_string, params), search)
 
 
 def _execute_single_statement(context, sql_string, where_values):
@@ -973,6 +1369,110 @@ def format_results(context, results, data_dict):
     return _unrename_json_field(data_dict)
 
 
+def _records_as_json(context, data_dict):
+    '''Return True if the records should be rendered by PostgreSQL, which
+    needs row_to_json() from version 9.2.'''
+    if data_dict.get('records_format') != 'json':
+        return False
+    url = data_dict['connection_url']
+    if url not in _native_json:
+        _native_json[url] = _pg_version_is_at_least(context['connection'],
+                                                    '9.2')
+    return _native_json[url]
+
+
+def _json_value(value, type_name):
+    '''Return the SQL that row_to_json() renders as convert() would convert
+    `value`, of the type `type_name`, or None if there isn't any.'''
+    if type_name in _JSON_NATIVE_TYPES:
+        return value
+    if type_name == 'nested':
+        return u'({0}).json::json'.format(value)
+    if type_name == 'timestamp':
+        return _ISOFORMAT_SQL.format(value)
+    if type_name == 'timestamptz':
+        return u'{0} || {1}'.format(_ISOFORMAT_SQL.format(value),
+                                    _ISOFORMAT_OFFSET_SQL.format(value))
+    if type_name in _JSON_TEXT_TYPES:
+        return u'{0}::text'.format(value)
+    if type_name.startswith('_') and type_name[1:] != 'nested':
+        item = _json_value(u'"_item"', type_name[1:])
+        if item is None:
+            return None
+        if item == u'"_item"':
+            return value
+        return (u'CASE WHEN {0} IS NULL THEN NULL ELSE ARRAY('
+                u'SELECT {1} FROM unnest({0}) AS "_item") END'.format(
+                    value, item))
+    return None
+
+
+def _json_column(field):
+    '''Return the SQL for a column of a query's results that row_to_json()
+    renders as convert() would, or None if there isn't any.'''
+    column = _json_value(
+        u'q."{0}"'.format(field['id'].replace('"', '""')), field['type'])
+    if column is None:
+        return None
+    return u'{0} AS "{1}"'.format(column, field['id'].replace('"', '""'))
+
+
+def format_results_as_json(context, sql_string, params, data_dict):
+    '''Run the query `sql_string` with `params` (passed to execute() as
+    they are) and return the same results as format_results(), except that
+    PostgreSQL renders the records as JSON, which is returned as a RawJSON
+    rather than a list of dicts.
+
+    This saves converting each value and building a dict for each row in
+    Python, and the API puts the JSON into its response as it is.
+
+    '''
+    connection = context['connection']
+    sql_string = sql_string.strip().rstrip(';')
+    # get the result's columns without running the query
+    description = connection.execute(
+        u'SELECT * FROM ({0}) AS q LIMIT 0'.format(sql_string),
+        params).cursor.description
+    result_fields = []
+    for field in description:
+        result_fields.append({
+            'id': field[0].decode('utf-8'),
+            'type': _get_type(context, field[1])
+        })
+    full_count = (len(result_fields) and
+                  result_fields[-1]['id'] == '_full_count')
+    if full_count:
+        result_fields.pop()  # remove _full_count
+
+    columns = [_json_column(field) for field in result_fields]
+    if None in columns:
+        # e.g. intervals, which convert() renders as Python does
+        format_results(context, connection.execute(sql_string, params),
+                       data_dict)
+        data_dict['records'] = raw_json.RawJSON(
+            json.dumps(data_dict['records']))
+        return data_dict
+
+    columns = u', '.join(columns)
+    sql_json = u'''SELECT max(t."_full_count"),
+                          array_to_json(array_agg(t."_record"))::text
+                   FROM (SELECT {full_count} AS "_full_count",
+                                row_to_json((SELECT r FROM
+                                    (SELECT {columns}) AS r)) AS "_record"
+                         FROM ({query}) AS q) AS t'''.format(
+        full_count=u'q."_full_count"' if full_count else u'NULL::bigint',
+        columns=columns.replace('%', '%%'),
+        query=sql_string)
+    total, records = connection.execute(sql_json, params).fetchone()
+
+    if total is not None:
+        data_dict['total'] = total
+    data_dict['records'] = raw_json.RawJSON(records or u'[]')
+    data_dict['fields'] = result_fields
+
+    return _unrename_json_field(data_dict)
+
+
 def create(context, data_dict):
     '''
     The first row will be used to guess types not in the fields and the
@@ -1014,12 +1514,21 @@ def create(context, data_dict):
             create_table(context, data_dict)
         else:
             alter_table(context, data_dict)
+        _clear_table_metadata(context, data_dict['resource_id'])
         insert_data(context, data_dict)
-        create_indexes(context, data_dict)
+        if data_dict.get('defer_indexes'):
+            _defer_indexes(context, data_dict)
+        else:
+            create_indexes(context, data_dict)
+            # finalize() would otherwise rebuild the indexes of an earlier
+            # create() that deferred them, instead of these
+            _set_deferred_indexes(context, data_dict['resource_id'], None)
         create_alias(context, data_dict)
+        _clear_table_metadata(context, data_dict['resource_id'])
         if data_dict.get('private'):
             _change_privilege(context, data_dict, 'REVOKE')
         trans.commit()
+        search_cache.bump([data_dict['resource_id'], u'_table_metadata'])
         return _unrename_json_field(data_dict)
     except IntegrityError, e:
         if e.orig.pgcode == _PG_ERR_CODE['unique_violation']:
@@ -1070,6 +1579,7 @@ def upsert(context, data_dict):
             u'SET LOCAL statement_timeout TO {0}'.format(timeout))
         upsert_data(context, data_dict)
         trans.commit()
+        search_cache.bump([data_dict['resource_id']])
         return _unrename_json_field(data_dict)
     except IntegrityError, e:
         if e.orig.pgcode == _PG_ERR_CODE['unique_violation']:
@@ -1101,6 +1611,61 @@ def upsert(context, data_dict):
         context['connection'].close()
 
 
+def finalize(context, data_dict):
+    '''Build the indexes that create() deferred building, and the
+    full-text search indexes, then update the table's statistics.
+
+    Unless ``concurrently`` is False the indexes are built with CREATE INDEX
+    CONCURRENTLY, which lets the table be searched and written to while
+    they are built. It can't be run in a transaction, so the statement
+    timeout doesn't apply to it.
+    '''
+    engine = _get_engine(data_dict)
+    context['connection'] = engine.connect()
+    timeout = context.get('query_timeout', _TIMEOUT)
+    _cache_types(context)
+    resource_id = data_dict['resource_id']
+    concurrently = data_dict.get('concurrently', True)
+
+    raw_connection = context['connection'].connection
+    isolation_level = raw_connection.isolation_level
+    trans = None
+    try:
+        if concurrently:
+            raw_connection.set_isolation_level(
+                psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        else:
+            trans = context['connection'].begin()
+            context['connection'].execute(
+                u'SET LOCAL statement_timeout TO {0}'.format(timeout))
+        indexes = _get_deferred_indexes(context, resource_id) or {}
+        for key in _DEFERRED_INDEX_KEYS:
+            if key in data_dict:
+                indexes[key] = data_dict[key]
+        indexes['resource_id'] = resource_id
+        _drop_invalid_indexes(context['connection'], resource_id)
+        create_indexes(context, indexes, concurrently=concurrently)
+        _set_deferred_indexes(context, resource_id, None)
+        context['connection'].execute(u'ANALYZE "{0}"'.format(resource_id))
+        if trans is not None:
+            trans.commit()
+        return data_dict
+    except Exception, e:
+        if trans is not None:
+            trans.rollback()
+        else:
+            _drop_invalid_indexes(context['connection'], resource_id)
+        if (isinstance(e, DBAPIError) and
+                e.orig.pgcode == _PG_ERR_CODE['query_canceled']):
+            raise ValidationError({
+                'query': ['Query took too long']
+            })
+        raise
+    finally:
+        raw_connection.set_isolation_level(isolation_level)
+        context['connection'].close()
+
+
 def delete(context, data_dict):
     engine = _get_engine(data_dict)
     context['connection'] = engine.connect()
@@ -1113,10 +1678,12 @@ def delete(context, data_dict):
             context['connection'].execute(
                 u'DROP TABLE "{0}" CASCADE'.format(data_dict['resource_id'])
             )
+            _clear_table_metadata(context, data_dict['resource_id'])
         else:
             delete_data(context, data_dict)
 
         trans.commit()
+        search_cache.bump([data_dict['resource_id'], u'_table_metadata'])
         return _unrename_json_field(data_dict)
     except Exception:
         trans.rollback()
@@ -1152,6 +1719,33 @@ def search(context, data_dict):
         context['connection'].close()
 
 
+def aggregate(context, data_dict):
+    engine = _get_engine(data_dict)
+    context['connection'] = engine.connect()
+    timeout = context.get('query_timeout', _TIMEOUT)
+    _cache_types(context)
+
+    try:
+        context['connection'].execute(
+            u'SET LOCAL statement_timeout TO {0}'.format(timeout))
+        return aggregate_data(context, data_dict)
+    except DBAPIError, e:
+        if e.orig.pgcode == _PG_ERR_CODE['query_canceled']:
+            raise ValidationError({
+                'query': ['Search took too long']
+            })
+        raise ValidationError({
+            'query': ['Invalid query'],
+            'info': {
+                'statement': [e.statement],
+                'params': [e.params],
+                'orig': [str(e.orig)]
+            }
+        })
+    finally:
+        context['connection'].close()
+
+
 def search_sql(context, data_dict):
     engine = _get_engine(data_dict)
     context['connection'] = engine.connect()
@@ -1161,10 +1755,19 @@ def search_sql(context, data_dict):
     try:
         context['connection'].execute(
             u'SET LOCAL statement_timeout TO {0}'.format(timeout))
-        results = context['connection'].execute(
-            data_dict['sql'].replace('%', '%%')
-        )
-        return format_results(context, results, data_dict)
+
+        def search():
+            if _records_as_json(context, data_dict):
+                return format_results_as_json(
+                    context, data_dict['sql'].replace('%', '%%'), [],
+                    data_dict)
+            results = context['connection'].execute(
+                data_dict['sql'].replace('%', '%%')
+            )
+            return format_results(context, results, data_dict)
+
+        # the tables that the SQL reads aren't known
+        return _cached_search(data_dict, None, (data_dict['sql'],), search)
 
     except ProgrammingError, e:
         if e.orig.pgcode == _PG_ERR_CODE['permission_denied']:
@@ -1231,6 +1834,8 @@ def make_private(context, data_dict):
     try:
         _change_privilege(context, data_dict, 'REVOKE')
         trans.commit()
+        # searches with SQL may be able to read different tables now
+        search_cache.bump([data_dict['resource_id']])
     finally:
         context['connection'].close()
 
@@ -1244,5 +1849,7 @@ def make_public(context, data_dict):
     try:
         _change_privilege(context, data_dict, 'GRANT')
         trans.commit()
+        # searches with SQL may be able to read different tables now
+        search_cache.bump([data_dict['resource_id']])
     finally:
         context['connection'].close()
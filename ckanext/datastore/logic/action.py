@@ -9,6 +9,7 @@ import ckan.plugins as p
 import ckanext.datastore.db as db
 import ckanext.datastore.logic.schema as dsschema
 import ckanext.datastore.helpers as datastore_helpers
+import ckanext.datastore.search_cache as search_cache
 
 log = logging.getLogger(__name__)
 _get_or_bust = logic.get_or_bust
@@ -52,6 +53,18 @@ def datastore_create(context, data_dict):
     :type primary_key: list or comma separated string
     :param indexes: indexes on table (optional)
     :type indexes: list or comma separated string
+    :param fts_index_method: the index method of the full-text search
+        indexes, ``gist`` or ``gin``. GIN indexes are faster to search but
+        slower to build and update. (optional, default:
+        ``ckan.datastore.default_fts_index_method``, or ``gist``)
+    :type fts_index_method: string
+    :param defer_indexes: create the table and insert the records without
+        building the full-text search indexes and ``indexes``, so that
+        loading more records with :meth:`datastore_upsert` doesn't have to
+        update them. Call :meth:`datastore_finalize` to build them when the
+        load has finished. The ``primary_key`` is still created straight
+        away. (optional, default: False)
+    :type defer_indexes: bool
 
     Please note that setting the ``aliases``, ``indexes`` or ``primary_key`` replaces the exising
     aliases or constraints. Setting ``records`` appends the provided records to the resource.
@@ -211,6 +224,64 @@ def datastore_upsert(context, data_dict):
     return result
 
 
+def datastore_finalize(context, data_dict):
+    '''Builds the indexes of a DataStore table after loading it.
+
+    Builds the indexes that :meth:`datastore_create` was asked to defer with
+    ``defer_indexes``, and the full-text search indexes, then updates the
+    statistics that PostgreSQL plans searches of the table with. Call it
+    once all the records of a load have been inserted.
+
+    :param resource_id: resource id of the table.
+    :type resource_id: string
+    :param force: set to True to edit a read-only resource
+    :type force: bool (optional, default: False)
+    :param indexes: indexes on table, replacing the deferred ones (optional)
+    :type indexes: list or comma separated string
+    :param fts_index_method: the index method of the full-text search
+        indexes, ``gist`` or ``gin`` (optional)
+    :type fts_index_method: string
+    :param concurrently: build the indexes with ``CREATE INDEX
+        CONCURRENTLY``, which doesn't stop the table being searched and
+        written to while they are built. (optional, default: True)
+    :type concurrently: bool
+
+    **Results:**
+
+    :returns: The finalized data object.
+    :rtype: dictionary
+
+    '''
+    schema = context.get('schema', dsschema.datastore_finalize_schema())
+    data_dict, errors = _validate(data_dict, schema, context)
+    if errors:
+        raise p.toolkit.ValidationError(errors)
+
+    p.toolkit.check_access('datastore_finalize', context, data_dict)
+
+    if not data_dict.pop('force', False):
+        resource_id = data_dict['resource_id']
+        _check_read_only(context, resource_id)
+
+    data_dict['connection_url'] = pylons.config['ckan.datastore.write_url']
+
+    res_id = data_dict['resource_id']
+    resources_sql = sqlalchemy.text(u'''SELECT 1 FROM "_table_metadata"
+                                        WHERE name = :id AND alias_of IS NULL''')
+    results = db._get_engine(data_dict).execute(resources_sql, id=res_id)
+    res_exists = results.rowcount > 0
+
+    if not res_exists:
+        raise p.toolkit.ObjectNotFound(p.toolkit._(
+            u'Resource "{0}" was not found.'.format(res_id)
+        ))
+
+    result = db.finalize(context, data_dict)
+    result.pop('id', None)
+    result.pop('connection_url')
+    return result
+
+
 def datastore_delete(context, data_dict):
     '''Deletes a table or a set of records from the DataStore.
 
@@ -293,6 +364,14 @@ def datastore_search(context, data_dict):
     :param sort: comma separated field names with ordering
                  e.g.: "fieldname1, fieldname2 desc"
     :type sort: string
+    :param records_format: ``objects`` to convert the records to dicts in
+        Python, or ``json`` to have PostgreSQL render them as JSON. The API
+        returns the same records either way, but ``json`` is much faster for
+        large pages of results. Called from Python, it returns the records
+        as a ``ckan.lib.raw_json.RawJSON``. ``json`` needs PostgreSQL 9.2;
+        with older versions the records are converted in Python.
+        (optional, default: ``objects``)
+    :type records_format: string
 
     Setting the ``plain`` flag to false enables the entire PostgreSQL `full text search query language`_.
 
@@ -353,6 +432,102 @@ def datastore_search(context, data_dict):
     return result
 
 
+@logic.side_effect_free
+def datastore_aggregate(context, data_dict):
+    '''Aggregate the data of a DataStore resource.
+
+    The datastore_aggregate action groups the records that match the
+    ``filters`` and ``q`` (which work as in :meth:`datastore_search`) by the
+    values of the ``group_by`` fields and by the bucket of the ``histogram``
+    field, and returns the ``aggregates`` of each group. The aggregation is
+    done by the database, so only the groups are returned.
+
+    :param resource_id: id or alias of the resource to be aggregated
+    :type resource_id: string
+    :param filters: matching conditions to select, e.g
+                    {"key1": "a", "key2": "b"} (optional)
+    :type filters: dictionary
+    :param q: full text query. If it's a string, it'll search on all fields
+              on each row. If it's a dictionary as {"key1": "a", "key2": "b"},
+              it'll search on each specific field (optional)
+    :type q: string or dictionary
+    :param plain: treat as plain text query (optional, default: true)
+    :type plain: bool
+    :param language: language of the full text query
+                     (optional, default: english)
+    :type language: string
+    :param group_by: fields to group the records by (optional)
+    :type group_by: list or comma separated string
+    :param aggregates: the aggregates of each group, each one of ``count``,
+        ``count <field>``, ``sum <field>``, ``avg <field>``,
+        ``min <field>`` or ``max <field>``. ``sum`` and ``avg`` need a
+        numeric field. The result column of each aggregate is named after
+        it, e.g. ``sum amount``. Counts, and the sums, minimums and maximums
+        of integer fields, are integers; the other aggregates of numeric
+        fields, including those of ``numeric`` fields, are floats.
+        (optional, default: ``count``)
+    :type aggregates: list or comma separated string
+    :param histogram: a field to group the records by ranges of, e.g.
+        ``{"field": "amount", "buckets": 10}`` splits the range of a numeric
+        field into 10 buckets (the default) between its minimum and maximum,
+        which can be given as ``min`` and ``max``, and
+        ``{"field": "date", "interval": "month"}`` groups a timestamp field
+        by ``year``, ``quarter``, ``month``, ``week``, ``day`` (the
+        default), ``hour`` or ``minute``. Its result column has the lower
+        bound of each group's range. (optional)
+    :type histogram: dictionary
+    :param sort: result columns to sort by, each optionally followed by
+        ``asc`` or ``desc``, e.g. ``"count desc"``
+        (optional, default: the groups in order)
+    :type sort: list or comma separated string
+    :param limit: maximum number of groups to return
+        (optional, default: 1000)
+    :type limit: int
+
+    **Results:**
+
+    The result of this action is a dictionary with the following keys:
+
+    :rtype: A dictionary with the following keys
+    :param fields: the result columns: the ``group_by`` fields, the
+        ``histogram`` field and the aggregates, and their types
+    :type fields: list of dictionaries
+    :param records: one dictionary for each group
+    :type records: list of dictionaries
+
+    '''
+    schema = context.get('schema', dsschema.datastore_aggregate_schema())
+    data_dict, errors = _validate(data_dict, schema, context)
+    if errors:
+        raise p.toolkit.ValidationError(errors)
+
+    res_id = data_dict['resource_id']
+    data_dict['connection_url'] = pylons.config['ckan.datastore.write_url']
+
+    resources_sql = sqlalchemy.text(u'''SELECT alias_of FROM "_table_metadata"
+                                        WHERE name = :id''')
+    results = db._get_engine(data_dict).execute(resources_sql, id=res_id)
+
+    # Resource only has to exist in the datastore (because it could be an alias)
+    if not results.rowcount > 0:
+        raise p.toolkit.ObjectNotFound(p.toolkit._(
+            'Resource "{0}" was not found.'.format(res_id)
+        ))
+
+    if not data_dict['resource_id'] in WHITELISTED_RESOURCES:
+        # Replace potential alias with real id to simplify access checks
+        resource_id = results.fetchone()[0]
+        if resource_id:
+            data_dict['resource_id'] = resource_id
+
+        p.toolkit.check_access('datastore_aggregate', context, data_dict)
+
+    result = db.aggregate(context, data_dict)
+    result.pop('id', None)
+    result.pop('connection_url')
+    return result
+
+
 @logic.side_effect_free
 def datastore_search_sql(context, data_dict):
     '''Execute SQL queries on the DataStore.
@@ -370,6 +545,10 @@ def datastore_search_sql(context, data_dict):
 
     :param sql: a single SQL select statement
     :type sql: string
+    :param records_format: ``objects`` or ``json``, as for
+        :meth:`~ckanext.datastore.logic.action.datastore_search`
+        (optional, default: ``objects``)
+    :type records_format: string
 
     **Results:**
 
@@ -389,6 +568,11 @@ def datastore_search_sql(context, data_dict):
             'query': ['Query is not a single statement.']
         })
 
+    if data_dict.get('records_format', 'objects') not in ('objects', 'json'):
+        raise p.toolkit.ValidationError({
+            'records_format': ['Must be "objects" or "json".']
+        })
+
     p.toolkit.check_access('datastore_search_sql', context, data_dict)
 
     data_dict['connection_url'] = pylons.config['ckan.datastore.read_url']
@@ -399,6 +583,29 @@ def datastore_search_sql(context, data_dict):
     return result
 
 
+@logic.side_effect_free
+def datastore_search_cache_statistics(context, data_dict):
+    '''Return the numbers of hits and misses of this CKAN process's cache of
+    search results, see ``ckan.datastore.search_cache.enabled``.
+
+    Only available to sysadmins.
+
+    :returns: the numbers of ``hits``, ``misses``, ``evictions`` and
+        ``entries``, the ``memory`` that the entries take up and the
+        ``max_memory`` that they may take up (in bytes), and the
+        ``backend``
+    :rtype: dictionary
+
+    '''
+    p.toolkit.check_access('datastore_search_cache_statistics', context,
+                           data_dict)
+    statistics = search_cache.statistics()
+    if statistics is None:
+        raise p.toolkit.ObjectNotFound(p.toolkit._(
+            u'The DataStore search cache is not enabled'))
+    return statistics
+
+
 def datastore_make_private(context, data_dict):
     ''' Deny access to the DataStore table through
     :meth:`~ckanext.datastore.logic.action.datastore_search_sql`.
@@ -34,6 +34,10 @@ def datastore_upsert(context, data_dict):
     return datastore_auth(context, data_dict)
 
 
+def datastore_finalize(context, data_dict):
+    return datastore_auth(context, data_dict)
+
+
 def datastore_delete(context, data_dict):
     return datastore_auth(context, data_dict)
 
@@ -43,10 +47,20 @@ def datastore_search(context, data_dict):
     return datastore_auth(context, data_dict, 'resource_show')
 
 
+@p.toolkit.auth_allow_anonymous_access
+def datastore_aggregate(context, data_dict):
+    return datastore_auth(context, data_dict, 'resource_show')
+
+
 @p.toolkit.auth_allow_anonymous_access
 def datastore_search_sql(context, data_dict):
     return {'success': True}
 
 
+def datastore_search_cache_statistics(context, data_dict):
+    # only sysadmins
+    return {'success': False}
+
+
 def datastore_change_permissions(context, data_dict):
     return datastore_auth(context, data_dict)
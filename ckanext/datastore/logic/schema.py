@@ -86,6 +86,8 @@ def datastore_create_schema():
         },
         'primary_key': [ignore_missing, list_of_strings_or_string],
         'indexes': [ignore_missing, list_of_strings_or_string],
+        'fts_index_method': [ignore_missing, unicode, OneOf(['gist', 'gin'])],
+        'defer_indexes': [ignore_missing, boolean_validator],
         '__junk': [empty],
         '__before': [rename('id', 'resource_id')]
     }
@@ -105,6 +107,20 @@ def datastore_upsert_schema():
     return schema
 
 
+def datastore_finalize_schema():
+    schema = {
+        'resource_id': [not_missing, not_empty, unicode],
+        'force': [ignore_missing, boolean_validator],
+        'id': [ignore_missing],
+        'indexes': [ignore_missing, list_of_strings_or_string],
+        'fts_index_method': [ignore_missing, unicode, OneOf(['gist', 'gin'])],
+        'concurrently': [ignore_missing, boolean_validator],
+        '__junk': [empty],
+        '__before': [rename('id', 'resource_id')]
+    }
+    return schema
+
+
 def datastore_delete_schema():
     schema = {
         'resource_id': [not_missing, not_empty, unicode],
@@ -129,6 +145,27 @@ def datastore_search_schema():
         'fields': [ignore_missing, list_of_strings_or_string],
         'sort': [ignore_missing, list_of_strings_or_string],
         'distinct': [ignore_missing, boolean_validator],
+        'records_format': [ignore_missing, unicode, OneOf(
+            ['objects', 'json'])],
+        '__junk': [empty],
+        '__before': [rename('id', 'resource_id')]
+    }
+    return schema
+
+
+def datastore_aggregate_schema():
+    schema = {
+        'resource_id': [not_missing, not_empty, unicode],
+        'id': [ignore_missing],
+        'q': [ignore_missing, unicode_or_json_validator],
+        'plain': [ignore_missing, boolean_validator],
+        'filters': [ignore_missing, json_validator],
+        'language': [ignore_missing, unicode],
+        'group_by': [ignore_missing, list_of_strings_or_string],
+        'aggregates': [ignore_missing, list_of_strings_or_string],
+        'histogram': [ignore_missing, json_validator],
+        'sort': [ignore_missing, list_of_strings_or_string],
+        'limit': [ignore_missing, int_validator],
         '__junk': [empty],
         '__before': [rename('id', 'resource_id')]
     }
@@ -13,6 +13,7 @@ import ckanext.datastore.logic.auth as auth
 import ckanext.datastore.db as db
 import ckanext.datastore.interfaces as interfaces
 import ckanext.datastore.helpers as datastore_helpers
+import ckanext.datastore.search_cache as search_cache
 
 
 log = logging.getLogger(__name__)
@@ -64,6 +65,8 @@ class DatastorePlugin(p.SingletonPlugin):
         # datastore runs on PG prior to 9.0 (for example 8.4).
         self.legacy_mode = 'ckan.datastore.read_url' not in self.config
 
+        search_cache.reset()
+
         datapusher_formats = config.get('datapusher.formats', '').split()
         self.datapusher_formats = datapusher_formats or DEFAULT_FORMATS
 
@@ -224,8 +227,12 @@ class DatastorePlugin(p.SingletonPlugin):
     def get_actions(self):
         actions = {'datastore_create': action.datastore_create,
                    'datastore_upsert': action.datastore_upsert,
+                   'datastore_finalize': action.datastore_finalize,
                    'datastore_delete': action.datastore_delete,
                    'datastore_search': action.datastore_search,
+                   'datastore_aggregate': action.datastore_aggregate,
+                   'datastore_search_cache_statistics':
+                   action.datastore_search_cache_statistics,
                   }
         if not self.legacy_mode:
             actions.update({
@@ -237,9 +244,13 @@ class DatastorePlugin(p.SingletonPlugin):
     def get_auth_functions(self):
         return {'datastore_create': auth.datastore_create,
                 'datastore_upsert': auth.datastore_upsert,
+                'datastore_finalize': auth.datastore_finalize,
                 'datastore_delete': auth.datastore_delete,
                 'datastore_search': auth.datastore_search,
+                'datastore_aggregate': auth.datastore_aggregate,
                 'datastore_search_sql': auth.datastore_search_sql,
+                'datastore_search_cache_statistics':
+                auth.datastore_search_cache_statistics,
                 'datastore_change_permissions': auth.datastore_change_permissions}
 
     def before_map(self, m):
@@ -0,0 +1,247 @@
+'''A cache of the results of DataStore searches.
+
+``datastore_search`` and ``datastore_search_sql`` keep their results here
+if ``ckan.datastore.search_cache.enabled`` is set. A result is cached under
+the SQL that produced it and the data version of the table that it searched
+(of every table, for ``datastore_search_sql``). ``datastore_create``,
+``datastore_upsert`` and ``datastore_delete`` bump the versions of the
+tables that they change, so searches never get results from before a
+change.
+
+The results are kept pickled in an LRU cache in each process, of at most
+``ckan.datastore.search_cache.memory`` megabytes. If
+``ckan.datastore.search_cache.backend`` is ``redis`` they are also kept in
+Redis, along with the data versions, so that they are shared by all of the
+site's processes. Otherwise a process only knows about the changes that it
+made itself, and may return results up to ``ckan.datastore.search_cache.ttl``
+seconds old.
+
+'''
+import cPickle as pickle
+import hashlib
+import logging
+import threading
+import time
+
+from paste.deploy.converters import asbool
+from pylons import config
+
+from ckan.common import OrderedDict
+
+log = logging.getLogger(__name__)
+
+# the version that changes when any table changes
+ALL_TABLES = u'_all'
+
+# no result may take more than this fraction of the cache's memory, so that
+# one big result doesn't push out all of the others
+MAX_ENTRY_FRACTION = 0.1
+
+
+class RedisBackend(object):
+    '''Keeps the data versions and the cached results in Redis.'''
+
+    def __init__(self, url, prefix):
+        import redis
+        self.redis = redis.StrictRedis.from_url(url)
+        self.errors = redis.exceptions.RedisError
+        self.prefix = prefix
+
+    def get_versions(self, names):
+        keys = [self.prefix + 'version:' + name for name in names]
+        return [int(version or 0) for version in self.redis.mget(keys)]
+
+    def bump(self, names):
+        pipe = self.redis.pipeline()
+        for name in names:
+            pipe.incr(self.prefix + 'version:' + name)
+        pipe.execute()
+
+    def get(self, key):
+        return self.redis.get(self.prefix + key)
+
+    def put(self, key, value, ttl):
+        self.redis.setex(self.prefix + key, ttl, value)
+
+
+class SearchCache(object):
+    '''An LRU cache of pickled results taking up to `memory` bytes and
+    expiring after `ttl` seconds, in front of an optional shared
+    `backend`.'''
+
+    def __init__(self, memory, ttl, backend=None):
+        self.memory = memory
+        self.ttl = ttl
+        self.backend = backend
+        self.used = 0
+        # key: (expiry time, pickled result), least recently used first
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_versions(self, names):
+        backend = self.backend
+        if backend is not None:
+            try:
+                return backend.get_versions(names)
+            except backend.errors, e:
+                log.warning('Could not read the DataStore data versions: %s',
+                            e)
+                return None
+        with self.lock:
+            return [self.versions.get(name, 0) for name in names]
+
+    def bump(self, resource_ids):
+        names = list(resource_ids) + [ALL_TABLES]
+        with self.lock:
+            for name in names:
+                self.versions[name] = self.versions.get(name, 0) + 1
+        if self.backend is not None:
+            try:
+                self.backend.bump(names)
+            except self.backend.errors, e:
+                log.warning('Could not bump the DataStore data versions: %s',
+                            e)
+
+    def _get_local(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                self.used -= len(value)
+                return None
+            # most recently used last
+            self.entries[key] = entry
+            return value
+
+    def _put_local(self, key, value, ttl):
+        if len(value) > self.memory * MAX_ENTRY_FRACTION:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.used -= len(old[1])
+            self.entries[key] = (time.time() + ttl, value)
+            self.used += len(value)
+            while self.used > self.memory:
+                oldest = next(iter(self.entries))
+                self.used -= len(self.entries.pop(oldest)[1])
+                self.evictions += 1
+
+    def get_or_search(self, resource_ids, key, search):
+        names = list(resource_ids or []) or [ALL_TABLES]
+        versions = self._get_versions(names)
+        if versions is None:
+            return search()
+        key = hashlib.sha1(repr((key, names, versions))).hexdigest()
+
+        value = self._get_local(key)
+        backend = self.backend
+        if value is None and backend is not None:
+            try:
+                value = backend.get(key)
+            except backend.errors, e:
+                log.warning('Could not read the DataStore search cache: %s',
+                            e)
+                backend = None
+            if value is not None:
+                self._put_local(key, value, self.ttl)
+
+        if value is not None:
+            self.hits += 1
+            return pickle.loads(value)
+
+        self.misses += 1
+        result = search()
+        value = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        self._put_local(key, value, self.ttl)
+        if backend is not None:
+            try:
+                backend.put(key, value, self.ttl)
+            except backend.errors, e:
+                log.warning('Could not write to the DataStore search cache: '
+                            '%s', e)
+        return result
+
+    def statistics(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'memory': self.used,
+                'max_memory': self.memory,
+                'backend': 'redis' if self.backend is not None else 'memory',
+            }
+
+
+_cache = None
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        if not asbool(config.get('ckan.datastore.search_cache.enabled',
+                                 False)):
+            return None
+        backend = None
+        if config.get('ckan.datastore.search_cache.backend',
+                      'memory') == 'redis':
+            backend = RedisBackend(
+                config.get('ckan.datastore.search_cache.redis_url',
+                           'redis://localhost:6379/0'),
+                'ckan:%s:datastore_search:' % config.get('ckan.site_id', ''))
+        _cache = SearchCache(
+            int(config.get('ckan.datastore.search_cache.memory', 64)) *
+            1024 * 1024,
+            int(config.get('ckan.datastore.search_cache.ttl', 300)),
+            backend)
+    return _cache
+
+
+def get_or_search(resource_ids, key, search):
+    '''Return the cached result of the search identified by `key`, calling
+    `search()` to get (and cache) it if it isn't cached.
+
+    :param resource_ids: the tables that the search reads, or None if they
+        aren't known
+    :type resource_ids: list
+    :param key: the parts of the key, e.g. the SQL and its parameters. Its
+        ``repr()`` must identify the result.
+    :type key: tuple
+
+    '''
+    cache = _get_cache()
+    if cache is None:
+        return search()
+    return cache.get_or_search(resource_ids, key, search)
+
+
+def bump(resource_ids):
+    '''Mark the data of the tables `resource_ids` as changed, so that the
+    results of earlier searches of them aren't returned any more.'''
+    cache = _get_cache()
+    if cache is not None:
+        cache.bump(resource_ids)
+
+
+def statistics():
+    '''Return the cache's numbers of hits, misses, evictions and entries,
+    the memory that its entries take up and its limit (in bytes) and its
+    backend, or None if the cache isn't enabled.'''
+    cache = _get_cache()
+    if cache is None:
+        return None
+    return cache.statistics()
+
+
+def reset():
+    '''Forget the cache, so that it is created again from the config.'''
+    global _cache
+    _cache = None
@@ -0,0 +1,99 @@
+import nose
+
+import ckan.plugins as p
+import ckan.new_tests.helpers as helpers
+import ckan.new_tests.factories as factories
+
+assert_equals = nose.tools.assert_equals
+assert_raises = nose.tools.assert_raises
+
+
+class TestDatastoreAggregate(object):
+    @classmethod
+    def setup_class(cls):
+        p.load('datastore')
+        resource = factories.Resource()
+        cls.resource_id = resource['id']
+        helpers.call_action('datastore_create', **{
+            'resource_id': cls.resource_id,
+            'force': True,
+            'fields': [{'id': 'country', 'type': 'text'},
+                       {'id': 'amount', 'type': 'int'},
+                       {'id': 'date', 'type': 'timestamp'},
+                       {'id': 'big', 'type': 'int8'},
+                       {'id': 'price', 'type': 'numeric'}],
+            'records': [
+                {'country': 'Brazil', 'amount': 1, 'date': '2014-01-05',
+                 'big': 10000000000, 'price': 1.25},
+                {'country': 'Brazil', 'amount': 3, 'date': '2014-02-05',
+                 'big': 20000000000, 'price': 2.5},
+                {'country': 'Italy', 'amount': 10, 'date': '2014-02-06',
+                 'big': None, 'price': None},
+            ],
+        })
+
+    @classmethod
+    def teardown_class(cls):
+        p.unload('datastore')
+        helpers.reset_db()
+
+    def _aggregate(self, **kwargs):
+        return helpers.call_action('datastore_aggregate',
+                                   resource_id=self.resource_id, **kwargs)
+
+    def test_count_is_the_default(self):
+        result = self._aggregate()
+
+        assert_equals(result['records'], [{'count': 3}])
+
+    def test_group_by(self):
+        result = self._aggregate(group_by='country',
+                                 aggregates='count,sum amount,max amount')
+
+        assert_equals([f['id'] for f in result['fields']],
+                      ['country', 'count', 'sum amount', 'max amount'])
+        assert_equals(result['records'], [
+            {'country': 'Brazil', 'count': 2, 'sum amount': 4,
+             'max amount': 3},
+            {'country': 'Italy', 'count': 1, 'sum amount': 10,
+             'max amount': 10},
+        ])
+
+    def test_sums_of_bigints_and_numerics_are_numbers(self):
+        result = self._aggregate(group_by='country',
+                                 aggregates='sum big,sum price,avg big,'
+                                            'min price')
+
+        assert_equals(result['records'], [
+            {'country': 'Brazil', 'sum big': 30000000000, 'sum price': 3.75,
+             'avg big': 15000000000.0, 'min price': 1.25},
+            {'country': 'Italy', 'sum big': None, 'sum price': None,
+             'avg big': None, 'min price': None},
+        ])
+        assert isinstance(result['records'][0]['sum big'], (int, long))
+        assert isinstance(result['records'][0]['sum price'], float)
+
+    def test_filters_and_sort(self):
+        result = self._aggregate(group_by='country', sort='count desc',
+                                 filters={'country': ['Italy', 'Brazil']})
+
+        assert_equals([r['country'] for r in result['records']],
+                      ['Brazil', 'Italy'])
+
+    def test_numeric_histogram(self):
+        result = self._aggregate(histogram={'field': 'amount',
+                                            'buckets': 3})
+
+        assert_equals([(float(r['amount']), r['count'])
+                       for r in result['records']], [(1.0, 2), (7.0, 1)])
+
+    def test_timestamp_histogram(self):
+        result = self._aggregate(histogram={'field': 'date',
+                                            'interval': 'month'})
+
+        assert_equals([(r['date'], r['count']) for r in result['records']],
+                      [('2014-01-01T00:00:00', 1), ('2014-02-01T00:00:00', 2)])
+
+    def test_sum_of_text_is_invalid(self):
+        assert_raises(p.toolkit.ValidationError, self._aggregate,
+                      aggregates='sum country')
@@ -140,6 +140,55 @@ class TestDatastoreCreateNewTests(object):
         current_index_names = self._get_index_names(resource['id'])
         assert_equal(previous_index_names, current_index_names)
 
+    def test_deferred_indexes_are_built_by_finalize(self):
+        resource = factories.Resource()
+        for books in (['war and peace'], ['war and peace', 'resurrection']):
+            helpers.call_action('datastore_create',
+                                resource_id=resource['id'],
+                                force=True,
+                                fields=[{'id': 'book', 'type': 'text'},
+                                        {'id': 'author', 'type': 'text'}],
+                                primary_key='book',
+                                indexes='author',
+                                defer_indexes=True)
+            helpers.call_action('datastore_upsert',
+                                resource_id=resource['id'],
+                                force=True,
+                                method='upsert',
+                                records=[{'book': book, 'author': 'tolstoy'}
+                                         for book in books])
+            helpers.call_action('datastore_finalize',
+                                resource_id=resource['id'],
+                                force=True)
+
+            assert self._has_index_on_field(resource['id'], '"author"')
+            assert self._has_index_on_field(resource['id'], '_full_text')
+            assert_equal(self._get_comment(resource['id']), None)
+
+        result = helpers.call_action('datastore_search',
+                                     resource_id=resource['id'])
+        assert_equal(result['total'], 2)
+
+    def test_indexes_built_by_create_replace_deferred_ones(self):
+        resource = factories.Resource()
+        helpers.call_action('datastore_create',
+                            resource_id=resource['id'],
+                            force=True,
+                            fields=[{'id': 'book', 'type': 'text'},
+                                    {'id': 'author', 'type': 'text'}],
+                            indexes='author',
+                            defer_indexes=True)
+        helpers.call_action('datastore_create',
+                            resource_id=resource['id'],
+                            force=True,
+                            indexes='book')
+        helpers.call_action('datastore_finalize',
+                            resource_id=resource['id'],
+                            force=True)
+
+        assert self._has_index_on_field(resource['id'], '"book"')
+        assert not self._has_index_on_field(resource['id'], '"author"')
+
     def _has_index_on_field(self, resource_id, field):
         sql = u"""
             SELECT
@@ -170,6 +219,10 @@ class TestDatastoreCreateNewTests(object):
         results = self._execute_sql(sql, resource_id).fetchall()
         return [result[0] for result in results]
 
+    def _get_comment(self, resource_id):
+        sql = u"SELECT obj_description(%s::regclass, 'pg_class')"
+        return self._execute_sql(sql, u'"{0}"'.format(resource_id)).scalar()
+
     def _execute_sql(self, sql, *args):
         engine = db._get_engine(
             {'connection_url': pylons.config['ckan.datastore.write_url']})
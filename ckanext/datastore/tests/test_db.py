@@ -1,3 +1,5 @@
+import json
+
 import mock
 import nose
 
@@ -84,15 +86,134 @@ class TestCreateIndexes(object):
 
         self._assert_created_index_on('foo', connection, resource_id, 'french')
 
-    def _assert_created_index_on(self, field, connection, resource_id, lang=None):
+    def test_creates_fts_index_with_fts_index_method(self):
+        connection = mock.MagicMock()
+        context = {
+            'connection': connection
+        }
+        resource_id = 'resource_id'
+        data_dict = {
+            'resource_id': resource_id,
+            'fts_index_method': 'gin',
+        }
+
+        db.create_indexes(context, data_dict)
+
+        self._assert_created_index_on('_full_text', connection, resource_id,
+                                      method='gin')
+
+    def test_creates_indexes_concurrently(self):
+        connection = mock.MagicMock()
+        context = {
+            'connection': connection
+        }
+        data_dict = {
+            'resource_id': 'resource_id',
+        }
+
+        db.create_indexes(context, data_dict, concurrently=True)
+
+        sql = connection.execute.call_args_list[-1][0][0]
+        assert sql.startswith(u'CREATE  INDEX CONCURRENTLY '), sql
+
+    @mock.patch('ckanext.datastore.db._get_fields')
+    def test_deferring_indexes_only_creates_the_primary_key(self,
+                                                            _get_fields):
+        _get_fields.return_value = [
+            {'id': 'foo', 'type': 'text'},
+            {'id': 'bar', 'type': 'int'}
+        ]
+        connection = mock.MagicMock()
+        connection.execute.return_value.scalar.return_value = None
+        connection.execute.return_value.fetchall.return_value = []
+        context = {
+            'connection': connection
+        }
+        data_dict = {
+            'resource_id': 'resource_id',
+            'indexes': ['foo'],
+            'primary_key': ['bar'],
+            'fts_index_method': 'gin',
+        }
+
+        db._defer_indexes(context, data_dict)
+
+        calls = [call[0] for call in connection.execute.call_args_list]
+        created = [call[0] for call in calls if u'INDEX' in call[0]]
+        assert_equal(len(created), 1)
+        assert created[0].startswith(u'CREATE unique INDEX'), created
+        comment = [call for call in calls if call[0].startswith(u'COMMENT')]
+        assert_equal(json.loads(comment[0][1]), {'deferred_indexes': {
+            'indexes': ['foo'], 'fts_index_method': 'gin'}})
+
+    def _assert_created_index_on(self, field, connection, resource_id,
+                                 lang=None, method='gist'):
         if lang is not None:
-            sql_str = u'ON "resource_id" USING gist(to_tsvector(\'{lang}\', \'{field}\'))'
-            sql_str = sql_str.format(lang=lang, field=field)
+            sql_str = u'ON "resource_id" USING {method}(to_tsvector(\'{lang}\', \'{field}\'))'
+            sql_str = sql_str.format(lang=lang, field=field, method=method)
         else:
-            sql_str = u'USING gist({field})'.format(field=field)
+            sql_str = u'USING {method}({field})'.format(field=field,
+                                                        method=method)
 
         calls = connection.execute.call_args_list
         was_called = [call for call in calls if call[0][0].find(sql_str) != -1]
 
         assert was_called, ("Expected 'connection.execute' to have been ",
                             "called with a string containing '%s'" % sql_str)
+
+
+class TestTableMetadata(object):
+    def setup(self):
+        db._table_metadata.clear()
+
+    def teardown(self):
+        db._table_metadata.clear()
+
+    def _connection(self, stamp):
+        connection = mock.MagicMock()
+        connection.execute.return_value.fetchone.return_value = stamp
+        return connection
+
+    @mock.patch('ckanext.datastore.db._query_unique_key')
+    @mock.patch('ckanext.datastore.db._query_fields')
+    def test_fields_are_looked_up_once(self, _query_fields,
+                                       _query_unique_key):
+        _query_fields.return_value = [{'id': 'foo', 'type': 'text'}]
+        data_dict = {'resource_id': 'resource_id'}
+
+        db._get_fields({'connection': self._connection((1, 1, 3, []))},
+                       data_dict)
+        fields = db._get_fields(
+            {'connection': self._connection((1, 1, 3, []))}, data_dict)
+
+        assert_equal(fields, [{'id': 'foo', 'type': 'text'}])
+        assert_equal(_query_fields.call_count, 1)
+
+    @mock.patch('ckanext.datastore.db._query_unique_key')
+    @mock.patch('ckanext.datastore.db._query_fields')
+    def test_changed_tables_are_looked_up_again(self, _query_fields,
+                                                _query_unique_key):
+        _query_fields.return_value = [{'id': 'foo', 'type': 'text'}]
+        data_dict = {'resource_id': 'resource_id'}
+
+        db._get_fields({'connection': self._connection((1, 1, 3, []))},
+                       data_dict)
+        db._get_fields({'connection': self._connection((1, 1, 4, []))},
+                       data_dict)
+
+        assert_equal(_query_fields.call_count, 2)
+
+    @mock.patch('ckanext.datastore.db._query_unique_key')
+    @mock.patch('ckanext.datastore.db._query_fields')
+    def test_tables_are_checked_once_per_connection(self, _query_fields,
+                                                    _query_unique_key):
+        _query_unique_key.return_value = ['foo']
+        connection = self._connection((1, 1, 3, [2]))
+        context = {'connection': connection}
+        data_dict = {'resource_id': 'resource_id'}
+
+        db._get_fields(context, data_dict)
+        unique_key = db._get_unique_key(context, data_dict)
+
+        assert_equal(unique_key, ['foo'])
+        assert_equal(connection.execute.call_count, 1)
@@ -11,6 +11,7 @@ import ckan.model as model
 import ckan.tests as tests
 
 import ckanext.datastore.db as db
+import ckanext.datastore.search_cache as search_cache
 from ckanext.datastore.tests.helpers import extract, rebuild_all_dbs
 
 import ckan.new_tests.helpers as helpers
@@ -53,6 +54,109 @@ class TestDatastoreSearchNewTest(object):
         assert_equals(len(result['records']), 2)
         assert_equals(len(set(ranks)), 1)
 
+    def test_records_rendered_as_json_are_the_same_as_objects(self):
+        resource = factories.Resource()
+        helpers.call_action('datastore_create', **{
+            'resource_id': resource['id'],
+            'force': True,
+            'fields': [{'id': 'name', 'type': 'text'},
+                       {'id': 'amount', 'type': 'numeric'},
+                       {'id': 'count', 'type': 'int'},
+                       {'id': 'big', 'type': 'int8'},
+                       {'id': 'amounts', 'type': '_numeric'},
+                       {'id': 'date', 'type': 'timestamp'},
+                       {'id': 'details', 'type': 'json'}],
+            'records': [
+                {'name': u'caf\xe9 "1"', 'amount': 1.5, 'count': 1,
+                 'big': 10000000000, 'amounts': [1.5, 2],
+                 'date': '2014-01-01T12:00:00',
+                 'details': {'tags': ['a', 'b']}},
+                {'name': 'two', 'amount': 2, 'count': None, 'big': None,
+                 'amounts': None, 'date': '2014-01-02T12:00:00.250000',
+                 'details': None},
+            ],
+        })
+        search_data = {'resource_id': resource['id'], 'sort': 'count'}
+
+        objects = helpers.call_action('datastore_search', **search_data)
+        as_json = helpers.call_action('datastore_search',
+                                      records_format='json', **search_data)
+
+        assert_equals(as_json['records'].loads(), objects['records'])
+        assert_equals(as_json['fields'], objects['fields'])
+        assert_equals(as_json['total'], objects['total'])
+
+        sql = u'SELECT count(*), sum("big") FROM "{0}"'.format(
+            resource['id'])
+        objects = helpers.call_action('datastore_search_sql', sql=sql)
+        as_json = helpers.call_action('datastore_search_sql', sql=sql,
+                                      records_format='json')
+
+        assert_equals(as_json['records'].loads(), objects['records'])
+        assert_equals(as_json['fields'], objects['fields'])
+
+        timestamps = u'''SELECT "date"::timestamptz AS "zoned",
+                                ARRAY["date", NULL] AS "dates",
+                                ARRAY["date"::timestamptz] AS "zoned dates",
+                                "date"::date AS "day"
+                         FROM "{0}" ORDER BY "date"'''.format(resource['id'])
+        # intervals are converted in Python either way
+        intervals = u'''SELECT "date" - timestamp '2013-12-31' AS "age",
+                               "date"::timestamptz AS "zoned"
+                        FROM "{0}" ORDER BY "date"'''.format(resource['id'])
+        for sql in (timestamps, intervals):
+            objects = helpers.call_action('datastore_search_sql', sql=sql)
+            as_json = helpers.call_action('datastore_search_sql', sql=sql,
+                                          records_format='json')
+
+            assert_equals(as_json['records'].loads(), objects['records'])
+            assert_equals(as_json['fields'], objects['fields'])
+
+    @helpers.change_config('ckan.datastore.search_cache.enabled', 'true')
+    def test_cached_results_change_with_the_data(self):
+        search_cache.reset()
+        try:
+            resource = factories.Resource()
+            helpers.call_action('datastore_create', **{
+                'resource_id': resource['id'],
+                'force': True,
+                'records': [{'name': 'one'}],
+            })
+            search_data = {'resource_id': resource['id'], 'sort': 'name'}
+
+            helpers.call_action('datastore_search', **search_data)
+            cached = helpers.call_action('datastore_search', **search_data)
+            helpers.call_action('datastore_upsert', **{
+                'resource_id': resource['id'],
+                'force': True,
+                'method': 'insert',
+                'records': [{'name': 'two'}],
+            })
+            changed = helpers.call_action('datastore_search', **search_data)
+
+            assert_equals([r['name'] for r in cached['records']], ['one'])
+            assert_equals([r['name'] for r in changed['records']],
+                          ['one', 'two'])
+            statistics = search_cache.statistics()
+            assert_equals((statistics['hits'], statistics['misses']), (1, 2))
+        finally:
+            search_cache.reset()
+
+    def test_no_records_rendered_as_json(self):
+        resource = factories.Resource()
+        helpers.call_action('datastore_create', **{
+            'resource_id': resource['id'],
+            'force': True,
+            'records': [{'name': 'one'}],
+        })
+
+        result = helpers.call_action('datastore_search',
+                                     resource_id=resource['id'],
+                                     filters={'name': 'two'},
+                                     records_format='json')
+
+        assert_equals(result['records'].loads(), [])
+
 
 class TestDatastoreSearch(tests.WsgiAppCase):
     sysadmin_user = None
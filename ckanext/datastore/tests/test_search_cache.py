@@ -0,0 +1,69 @@
+import nose
+
+import ckanext.datastore.search_cache as search_cache
+
+assert_equal = nose.tools.assert_equal
+
+
+class Search(object):
+    '''A search returning `result`, counting its calls.'''
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.result
+
+
+class TestSearchCache(object):
+
+    def test_results_are_cached(self):
+        cache = search_cache.SearchCache(100000, 60)
+        search = Search({'records': [1, 2]})
+
+        cache.get_or_search(['a'], ('sql',), search)
+        result = cache.get_or_search(['a'], ('sql',), search)
+
+        assert_equal(result, {'records': [1, 2]})
+        assert_equal(search.calls, 1)
+        statistics = cache.statistics()
+        assert_equal((statistics['hits'], statistics['misses']), (1, 1))
+
+    def test_bumping_a_table_only_expires_its_results(self):
+        cache = search_cache.SearchCache(100000, 60)
+        search_a = Search({'records': []})
+        search_b = Search({'records': []})
+        cache.get_or_search(['a'], ('sql',), search_a)
+        cache.get_or_search(['b'], ('sql',), search_b)
+
+        cache.bump(['a'])
+        cache.get_or_search(['a'], ('sql',), search_a)
+        cache.get_or_search(['b'], ('sql',), search_b)
+
+        assert_equal(search_a.calls, 2)
+        assert_equal(search_b.calls, 1)
+
+    def test_bumping_any_table_expires_searches_of_all_tables(self):
+        cache = search_cache.SearchCache(100000, 60)
+        search = Search({'records': []})
+        cache.get_or_search(None, ('sql',), search)
+
+        cache.bump(['a'])
+        cache.get_or_search(None, ('sql',), search)
+
+        assert_equal(search.calls, 2)
+
+    def test_least_recently_used_results_are_evicted(self):
+        result = {'records': ['x' * 1000]}
+        cache = search_cache.SearchCache(25000, 60)
+        searches = [Search(result) for i in range(30)]
+        for i, search in enumerate(searches):
+            cache.get_or_search(['a'], ('sql', i), search)
+            # keep using the first result
+            cache.get_or_search(['a'], ('sql', 0), searches[0])
+
+        assert cache.used <= 25000, cache.used
+        assert_equal(searches[0].calls, 1)
+        cache.get_or_search(['a'], ('sql', 1), searches[1])
+        assert_equal(searches[1].calls, 2)
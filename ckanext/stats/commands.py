@@ -0,0 +1,37 @@
+import sys
+
+import ckan.lib.cli as cli
+
+
+class StatsCommand(cli.CkanCommand):
+    '''Update the statistics shown by the stats extension
+
+    Usage:
+      stats update      - count the revisions made since the last update
+                          and compute the top lists again
+      stats rebuild     - count all of the revisions again
+
+    Run "stats update" regularly (e.g. hourly, from cron) when
+    ckanext.stats.materialized is set.
+    '''
+
+    summary = __doc__.split('\n')[0]
+    usage = __doc__
+    max_args = 1
+    min_args = 1
+    light_environment = True
+
+    def command(self):
+        self._load_config()
+        import ckanext.stats.materialized as materialized
+
+        cmd = self.args[0]
+        if cmd == 'update':
+            materialized.update()
+        elif cmd == 'rebuild':
+            materialized.rebuild()
+        else:
+            print self.__class__.__doc__
+            sys.exit(1)
+        if self.verbose:
+            print 'Statistics updated to %s' % materialized.updated()
@@ -1,23 +1,38 @@
 import ckan.plugins as p
 from ckan.lib.base import BaseController, config
 import stats as stats_lib
+import materialized
 import ckan.lib.helpers as h
 
 class StatsController(BaseController):
 
     def index(self):
         c = p.toolkit.c
-        stats = stats_lib.Stats()
-        rev_stats = stats_lib.RevisionStats()
-        c.top_rated_packages = stats.top_rated_packages()
-        c.most_edited_packages = stats.most_edited_packages()
-        c.largest_groups = stats.largest_groups()
-        c.top_tags = stats.top_tags()
-        c.top_package_owners = stats.top_package_owners()
-        c.new_packages_by_week = rev_stats.get_by_week('new_packages')
-        c.deleted_packages_by_week = rev_stats.get_by_week('deleted_packages')
-        c.num_packages_by_week = rev_stats.get_num_packages_by_week()
-        c.package_revisions_by_week = rev_stats.get_by_week('package_revisions')
+        if materialized.enabled():
+            for name in ('top_rated_packages', 'most_edited_packages',
+                         'largest_groups', 'top_tags', 'top_package_owners'):
+                setattr(c, name, materialized.top_objects(name))
+            c.num_packages_by_week = materialized.num_packages_by_week()
+            package_revisions_by_week = materialized.by_week(
+                'package_revisions')
+            new_packages_by_week = materialized.by_week('new_packages')
+        else:
+            stats = stats_lib.Stats()
+            rev_stats = stats_lib.RevisionStats()
+            c.top_rated_packages = stats.top_rated_packages()
+            c.most_edited_packages = stats.most_edited_packages()
+            c.largest_groups = stats.largest_groups()
+            c.top_tags = stats.top_tags()
+            c.top_package_owners = stats.top_package_owners()
+            c.new_packages_by_week = rev_stats.get_by_week('new_packages')
+            c.deleted_packages_by_week = rev_stats.get_by_week('deleted_packages')
+            c.num_packages_by_week = rev_stats.get_num_packages_by_week()
+            c.package_revisions_by_week = rev_stats.get_by_week('package_revisions')
+            # (week, ids, count, cumulative count) to (week, count, cumulative count)
+            package_revisions_by_week = [(week, num, cumulative) for week, ids, num, cumulative
+                                         in c.package_revisions_by_week]
+            new_packages_by_week = [(week, num, cumulative) for week, ids, num, cumulative
+                                    in c.new_packages_by_week]
 
         # Used in the legacy CKAN templates.
         c.packages_by_week = []
@@ -30,13 +45,13 @@ class StatsController(BaseController):
 
         c.all_package_revisions = []
         c.raw_all_package_revisions = []
-        for week_date, revs, num_revisions, cumulative_num_revisions in c.package_revisions_by_week:
+        for week_date, num_revisions, cumulative_num_revisions in package_revisions_by_week:
             c.all_package_revisions.append('[new Date(%s), %s]' % (week_date.replace('-', ','), num_revisions))
             c.raw_all_package_revisions.append({'date': h.date_str_to_datetime(week_date), 'total_revisions': num_revisions})
 
         c.new_datasets = []
         c.raw_new_datasets = []
-        for week_date, pkgs, num_packages, cumulative_num_packages in c.new_packages_by_week:
+        for week_date, num_packages, cumulative_num_packages in new_packages_by_week:
             c.new_datasets.append('[new Date(%s), %s]' % (week_date.replace('-', ','), num_packages))
             c.raw_new_datasets.append({'date': h.date_str_to_datetime(week_date), 'new_packages': num_packages})
 
@@ -0,0 +1,38 @@
+import ckan.plugins as p
+
+import ckanext.stats.materialized as materialized
+
+
+@p.toolkit.side_effect_free
+def stats_show(context, data_dict):
+    '''Return the site's statistics, as of the last ``paster stats update``.
+
+    :returns: the time up to which the revisions have been counted
+        (``updated``, or None if the statistics have never been updated);
+        the ``top_rated_packages``, ``most_edited_packages``,
+        ``largest_groups``, ``top_tags`` and ``top_package_owners``, each a
+        list of the ``id``, ``name``, ``title`` and ``count`` of up to ten
+        objects; and the ``new_packages_by_week``,
+        ``deleted_packages_by_week``, ``package_revisions_by_week`` and
+        ``num_packages_by_week``, each a list of the ``week_commences``,
+        ``count`` and ``cumulative_count`` of every week
+    :rtype: dictionary
+
+    '''
+    p.toolkit.check_access('stats_show', context, data_dict)
+
+    updated = materialized.updated()
+    result = {'updated': updated.isoformat() if updated else None}
+    for name in ('top_rated_packages', 'most_edited_packages',
+                 'largest_groups', 'top_tags', 'top_package_owners'):
+        result[name] = materialized.top(name)
+
+    weekly = [(name, materialized.by_week(name)) for name in
+              ('new_packages', 'deleted_packages', 'package_revisions')]
+    weekly.append(('num_packages', materialized.num_packages_by_week()))
+    for name, weeks in weekly:
+        result[name + '_by_week'] = [
+            {'week_commences': week_commences, 'count': count,
+             'cumulative_count': cumulative_count}
+            for week_commences, count, cumulative_count in weeks]
+    return result
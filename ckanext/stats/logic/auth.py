@@ -0,0 +1,7 @@
+import ckan.plugins as p
+
+
+@p.toolkit.auth_allow_anonymous_access
+def stats_show(context, data_dict):
+    # the statistics are on the public stats page anyway
+    return {'success': True}
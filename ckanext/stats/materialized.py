@@ -0,0 +1,296 @@
+'''Statistics kept in tables of their own by ``paster stats update``.
+
+The weekly counts of new datasets, deleted datasets and dataset revisions
+are brought up to date from the revisions made since the last update, and
+the top ten lists are computed again, with the names and titles that the
+stats page shows. The stats page (with ``ckanext.stats.materialized =
+true``) and the ``stats_show`` action then read them with a few indexed
+queries, rather than going through all of the revisions on each request.
+
+'''
+import datetime
+
+from pylons import config
+from sqlalchemy import MetaData, Table, Column, types, select, and_, func
+
+import ckan.plugins as p
+import ckan.model as model
+
+DATE_FORMAT = '%Y-%m-%d'
+
+# the length of the top lists
+TOP_LIMIT = 10
+
+# revisions newer than this may be in transactions that haven't been
+# committed yet, so they are left for the next update
+UPDATE_MARGIN = datetime.timedelta(minutes=10)
+
+# the update counts the revisions after this
+_NO_REVISIONS = datetime.datetime(1970, 1, 1)
+
+metadata = MetaData()
+
+week_table = Table(
+    'stats_week', metadata,
+    Column('name', types.UnicodeText, primary_key=True),
+    Column('week_commences', types.Date, primary_key=True),
+    Column('count', types.Integer, nullable=False),
+)
+
+top_table = Table(
+    'stats_top', metadata,
+    Column('name', types.UnicodeText, primary_key=True),
+    Column('rank', types.Integer, primary_key=True),
+    Column('object_id', types.UnicodeText, nullable=False),
+    Column('object_name', types.UnicodeText),
+    Column('object_title', types.UnicodeText),
+    Column('average', types.Float),
+    Column('count', types.Integer, nullable=False),
+)
+
+state_table = Table(
+    'stats_state', metadata,
+    Column('name', types.UnicodeText, primary_key=True),
+    Column('value', types.DateTime),
+)
+
+# the count of each week's new rows, for the revisions in (since, until]
+_WEEKLY_SQL = {
+    'package_revisions': '''
+        SELECT date_trunc('week', r.timestamp)::date, count(*)
+        FROM package_revision pr JOIN revision r ON r.id = pr.revision_id
+        WHERE r.timestamp > :since AND r.timestamp <= :until
+        GROUP BY 1''',
+    # a dataset is new in the week of its first revision, and deleted in
+    # the week of its first deleted revision
+    'new_packages': '''
+        SELECT date_trunc('week', first_revisions.timestamp)::date, count(*)
+        FROM (SELECT pr.id, min(r.timestamp) AS timestamp
+              FROM package_revision pr JOIN revision r ON r.id = pr.revision_id
+              WHERE pr.id IN (
+                  SELECT pr.id
+                  FROM package_revision pr
+                  JOIN revision r ON r.id = pr.revision_id
+                  WHERE r.timestamp > :since AND r.timestamp <= :until)
+              GROUP BY pr.id) first_revisions
+        WHERE first_revisions.timestamp > :since
+            AND first_revisions.timestamp <= :until
+        GROUP BY 1''',
+    'deleted_packages': '''
+        SELECT date_trunc('week', first_revisions.timestamp)::date, count(*)
+        FROM (SELECT pr.id, min(r.timestamp) AS timestamp
+              FROM package_revision pr JOIN revision r ON r.id = pr.revision_id
+              WHERE pr.state = 'deleted' AND pr.id IN (
+                  SELECT pr.id
+                  FROM package_revision pr
+                  JOIN revision r ON r.id = pr.revision_id
+                  WHERE pr.state = 'deleted'
+                      AND r.timestamp > :since AND r.timestamp <= :until)
+              GROUP BY pr.id) first_revisions
+        WHERE first_revisions.timestamp > :since
+            AND first_revisions.timestamp <= :until
+        GROUP BY 1''',
+}
+
+# the top lists, as (id, name, title, average, count) rows. These are the
+# same as the lists of Stats in stats.py.
+_TOP_SQL = {
+    'top_rated_packages': '''
+        SELECT p.id, p.name, p.title, avg(r.rating), count(r.rating)
+        FROM package p JOIN rating r ON r.package_id = p.id
+        GROUP BY p.id, p.name, p.title
+        ORDER BY avg(r.rating) DESC, count(r.rating) DESC
+        LIMIT :limit''',
+    'most_edited_packages': '''
+        SELECT p.id, p.name, p.title, NULL, count(pr.revision_id)
+        FROM package_revision pr JOIN package p ON p.id = pr.id
+        GROUP BY p.id, p.name, p.title
+        ORDER BY count(pr.revision_id) DESC
+        LIMIT :limit''',
+    'largest_groups': '''
+        SELECT g.id, g.name, g.title, NULL, count(m.table_id)
+        FROM member m JOIN "group" g ON g.id = m.group_id
+        WHERE m.table_name = 'package'
+        GROUP BY g.id, g.name, g.title
+        ORDER BY count(m.table_id) DESC
+        LIMIT :limit''',
+    'top_tags': '''
+        SELECT t.id, t.name, t.name, NULL, count(pt.package_id)
+        FROM package_tag pt JOIN tag t ON t.id = pt.tag_id
+        GROUP BY t.id, t.name
+        ORDER BY count(pt.package_id) DESC
+        LIMIT :limit''',
+    'top_package_owners': '''
+        SELECT u.id, u.name, u.fullname, NULL, count(uor.role)
+        FROM user_object_role uor
+        JOIN package_role pr ON pr.user_object_role_id = uor.id
+        JOIN "user" u ON u.id = uor.user_id
+        WHERE uor.role = :admin
+        GROUP BY u.id, u.name, u.fullname
+        ORDER BY count(uor.role) DESC
+        LIMIT :limit''',
+}
+
+# the classes of the objects in the top lists
+_TOP_CLASSES = {
+    'top_rated_packages': 'Package',
+    'most_edited_packages': 'Package',
+    'largest_groups': 'Group',
+    'top_tags': 'Tag',
+    'top_package_owners': 'User',
+}
+
+
+def enabled():
+    return p.toolkit.asbool(config.get('ckanext.stats.materialized', False))
+
+
+def setup():
+    '''Create the statistics tables, if they don't exist yet.'''
+    metadata.create_all(model.meta.engine)
+
+
+def update(margin=UPDATE_MARGIN):
+    '''Add the revisions made since the last update to the weekly counts and
+    compute the top lists again.
+
+    Revisions made less than `margin` ago are left for the next update.
+
+    '''
+    setup()
+    session = model.Session
+    since = _get_updated() or _NO_REVISIONS
+    until = datetime.datetime.utcnow() - margin
+    if until > since:
+        for name, sql in _WEEKLY_SQL.items():
+            rows = session.execute(sql, {'since': since, 'until': until})
+            for week_commences, count in rows.fetchall():
+                _add_to_week(name, week_commences, count)
+        _set_updated(until)
+
+    session.execute(top_table.delete())
+    for name, sql in _TOP_SQL.items():
+        rows = session.execute(sql, {'limit': TOP_LIMIT,
+                                     'admin': model.authz.Role.ADMIN})
+        for rank, (id_, name_, title, average, count) in enumerate(rows):
+            session.execute(top_table.insert().values(
+                name=name, rank=rank, object_id=id_, object_name=name_,
+                object_title=title, average=average, count=count))
+    session.commit()
+
+
+def rebuild(margin=UPDATE_MARGIN):
+    '''Forget the statistics and count them again from all of the
+    revisions.'''
+    setup()
+    model.Session.execute(week_table.delete())
+    model.Session.execute(state_table.delete())
+    update(margin)
+
+
+def _add_to_week(name, week_commences, count):
+    where = and_(week_table.c.name == name,
+                 week_table.c.week_commences == week_commences)
+    result = model.Session.execute(week_table.update().where(where).values(
+        count=week_table.c.count + count))
+    if not result.rowcount:
+        model.Session.execute(week_table.insert().values(
+            name=name, week_commences=week_commences, count=count))
+
+
+def _get_updated():
+    return model.Session.execute(
+        select([state_table.c.value]).where(
+            state_table.c.name == u'revisions_until')).scalar()
+
+
+def _set_updated(until):
+    if _get_updated() is None:
+        model.Session.execute(state_table.insert().values(
+            name=u'revisions_until', value=until))
+    else:
+        model.Session.execute(state_table.update().where(
+            state_table.c.name == u'revisions_until').values(value=until))
+
+
+def updated():
+    '''Return the time up to which the revisions have been counted, or None
+    if the statistics have never been updated.'''
+    return _get_updated()
+
+
+def by_week(name):
+    '''Return the count of `name` (``new_packages``, ``deleted_packages`` or
+    ``package_revisions``) for every week from the first counted one to
+    this one, as ``[(week_commences, count, cumulative_count), ...]``.'''
+    first_week = model.Session.execute(
+        select([func.min(week_table.c.week_commences)])).scalar()
+    if first_week is None:
+        return []
+    counts = dict(model.Session.execute(
+        select([week_table.c.week_commences, week_table.c.count]).where(
+            week_table.c.name == name)).fetchall())
+
+    weeks = []
+    cumulative_count = 0
+    week_commences = first_week
+    today = datetime.date.today()
+    while week_commences <= today:
+        count = counts.get(week_commences, 0)
+        cumulative_count += count
+        weeks.append((week_commences.strftime(DATE_FORMAT), count,
+                      cumulative_count))
+        week_commences += datetime.timedelta(days=7)
+    return weeks
+
+
+def num_packages_by_week():
+    '''Return the change in the number of datasets in each week, as
+    ``[(week_commences, change, number_of_datasets), ...]``.'''
+    weeks = []
+    for new, deleted in zip(by_week('new_packages'),
+                            by_week('deleted_packages')):
+        weeks.append((new[0], new[1] - deleted[1], new[2] - deleted[2]))
+    return weeks
+
+
+def top(name):
+    '''Return the top list `name` (one of the lists of ``Stats``) as
+    dictionaries of the ``id``, ``name``, ``title`` and ``count`` of each
+    object, and the ``average`` rating for ``top_rated_packages``.'''
+    rows = model.Session.execute(
+        select([top_table]).where(top_table.c.name == name).order_by(
+            top_table.c.rank)).fetchall()
+    top_list = []
+    for row in rows:
+        item = {'id': row.object_id, 'name': row.object_name,
+                'title': row.object_title, 'count': row.count}
+        if name == 'top_rated_packages':
+            item['average'] = row.average
+        top_list.append(item)
+    return top_list
+
+
+def top_objects(name):
+    '''Return the top list `name` with the objects themselves, in the same
+    form as the list of the same name of ``Stats``, loading the objects in
+    one query.'''
+    top_list = top(name)
+    class_ = getattr(model, _TOP_CLASSES[name])
+    ids = [item['id'] for item in top_list]
+    objects = {}
+    if ids:
+        for obj in model.Session.query(class_).filter(class_.id.in_(ids)):
+            objects[obj.id] = obj
+
+    rows = []
+    for item in top_list:
+        obj = objects.get(item['id'])
+        if obj is None:
+            # deleted since the last update
+            continue
+        if name == 'top_rated_packages':
+            rows.append((obj, item['average'], item['count']))
+        else:
+            rows.append((obj, item['count']))
+    return rows
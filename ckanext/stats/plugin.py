@@ -2,6 +2,10 @@ from logging import getLogger
 
 import ckan.plugins as p
 
+import ckanext.stats.logic.action as action
+import ckanext.stats.logic.auth as auth
+import ckanext.stats.materialized as materialized
+
 log = getLogger(__name__)
 
 class StatsPlugin(p.SingletonPlugin):
@@ -9,6 +13,9 @@ class StatsPlugin(p.SingletonPlugin):
 
     p.implements(p.IRoutes, inherit=True)
     p.implements(p.IConfigurer, inherit=True)
+    p.implements(p.IConfigurable, inherit=True)
+    p.implements(p.IActions)
+    p.implements(p.IAuthFunctions)
 
     def after_map(self, map):
         map.connect('stats', '/stats',
@@ -25,3 +32,13 @@ class StatsPlugin(p.SingletonPlugin):
         p.toolkit.add_template_directory(config, templates)
         p.toolkit.add_public_directory(config, 'public')
         p.toolkit.add_resource('public/ckanext/stats', 'ckanext_stats')
+
+    def configure(self, config):
+        if materialized.enabled():
+            materialized.setup()
+
+    def get_actions(self):
+        return {'stats_show': action.stats_show}
+
+    def get_auth_functions(self):
+        return {'stats_show': auth.stats_show}
@@ -0,0 +1,69 @@
+import datetime
+from nose.tools import assert_equal
+
+from ckan.lib.create_test_data import CreateTestData
+from ckan import model
+import ckan.new_tests.helpers as helpers
+
+from ckanext.stats.stats import Stats
+import ckanext.stats.materialized as materialized
+from ckanext.stats.tests import StatsFixture
+
+
+class TestMaterializedStats(StatsFixture):
+    @classmethod
+    def setup_class(cls):
+        super(TestMaterializedStats, cls).setup_class()
+
+        CreateTestData.create_arbitrary([
+            {'name': 'test1', 'groups': ['grp1'], 'tags': ['tag1']},
+            {'name': 'test2', 'groups': ['grp1', 'grp2'], 'tags': ['tag1']},
+            {'name': 'test3', 'groups': ['grp1', 'grp2'],
+             'tags': ['tag1', 'tag2']},
+        ], extra_user_names=['bob'], admins=['bob'])
+        week1 = datetime.datetime(2011, 1, 5)
+        for rev in model.Session.query(model.Revision):
+            rev.timestamp = week1 + datetime.timedelta(seconds=1)
+        model.repo.commit_and_remove()
+
+        materialized.rebuild(margin=datetime.timedelta(0))
+
+        # week 2, counted by an update
+        rev = model.repo.new_revision()
+        rev.timestamp = datetime.datetime(2011, 1, 12)
+        model.Package.by_name(u'test2').delete()
+        model.repo.commit_and_remove()
+        materialized._set_updated(datetime.datetime(2011, 1, 6))
+        materialized.update(margin=datetime.timedelta(0))
+
+    @classmethod
+    def teardown_class(cls):
+        materialized.metadata.drop_all(model.meta.engine)
+        CreateTestData.delete()
+
+    def test_top_lists_match_the_live_ones(self):
+        for name in ('most_edited_packages', 'largest_groups', 'top_tags',
+                     'top_package_owners'):
+            assert_equal(set(materialized.top_objects(name)),
+                         set(getattr(Stats, name)()))
+
+    def test_weeks_are_counted_incrementally(self):
+        assert_equal(materialized.by_week('new_packages')[:3],
+                     [('2011-01-03', 3, 3),
+                      ('2011-01-10', 0, 3),
+                      ('2011-01-17', 0, 3)])
+        assert_equal(materialized.num_packages_by_week()[:2],
+                     [('2011-01-03', 3, 3),
+                      ('2011-01-10', -1, 2)])
+        revisions = materialized.by_week('package_revisions')
+        num_setup_revs = revisions[0][1]
+        assert_equal(revisions[1], ('2011-01-10', 1, num_setup_revs + 1))
+
+    def test_stats_show(self):
+        result = helpers.call_action('stats_show')
+
+        assert_equal(result['largest_groups'][0]['name'], 'grp1')
+        assert_equal(result['largest_groups'][0]['count'], 3)
+        assert_equal(result['deleted_packages_by_week'][1],
+                     {'week_commences': '2011-01-10', 'count': 1,
+                      'cumulative_count': 1})
@@ -32,13 +32,17 @@ entry_points = {
         'tracking = ckan.lib.cli:Tracking',
         'plugin-info = ckan.lib.cli:PluginInfo',
         'profile = ckan.lib.cli:Profile',
+        'profiling = ckan.lib.cli:ProfilingCommand',
+        'benchmark = ckan.lib.cli:BenchmarkCommand',
         'color = ckan.lib.cli:CreateColorSchemeCommand',
         'check-po-files = ckan.i18n.check_po_files:CheckPoFiles',
         'trans = ckan.lib.cli:TranslationsCommand',
         'minify = ckan.lib.cli:MinifyCommand',
         'less = ckan.lib.cli:LessCommand',
         'datastore = ckanext.datastore.commands:SetupDatastoreCommand',
+        'stats = ckanext.stats.commands:StatsCommand',
         'front-end-build = ckan.lib.cli:FrontEndBuildCommand',
+        'templates = ckan.lib.cli:TemplatesCommand',
         'views = ckan.lib.cli:ViewsCommand',
     ],
     'console_scripts': [